@@ -0,0 +1,706 @@
+"""
+Benchmarks das fases do compilador sobre programas Portugol gerados.
+
+Uso: python ./compilador/bench.py <experimento> [--rotinas N] [--comandos N]
+     python ./compilador/bench.py aninhamento [--profundidade N]
+     python ./compilador/bench.py ordem [--rotinas N]
+     python ./compilador/bench.py incremental [--rotinas N] [--comandos N]
+     python ./compilador/bench.py tabela
+"""
+
+import argparse
+import gc
+import os
+import random
+import resource
+import time
+import tracemalloc
+
+from src.ast_nodes import (
+    Assign,
+    CallStmt,
+    FuncDecl,
+    If,
+    ProcDecl,
+    Return,
+    VarDecl,
+    While,
+    Write,
+)
+from src.cache_ast import desserializar, serializar
+from src.lexer import Lexer
+from src.lexer_incremental import DocumentoLexico
+from src.parser import Parser
+from src.semantico import AnalisadorSemantico
+from src.semantico_incremental import AnaliseIncremental
+from src.tabela_simbolos import SimboloVar, TabelaDeSimbolos
+from src.gerador_c import GeradorC
+from src.gerador_c_ir import GeradorCIR
+from src.ssa import construir_ssa
+from src.traducao_ir import TradutorIR
+from src.otimizador import PASSES, otimizar
+from src.visitante import Visitante
+
+
+def gerar_programa(n_rotinas: int, n_comandos: int, seed: int = 1) -> str:
+    rnd = random.Random(seed)
+    out: list[str] = []
+
+    for i in range(n_rotinas):
+        out.append(
+            f"funcao f{i}(inteiro a, real b)\n"
+            "inicio\n"
+            f"  retorne a * {rnd.randint(1, 9)} + b / 2.5;\n"
+            "fim\n"
+        )
+        out.append(
+            f"procedimento p{i}(inteiro a)\n"
+            "inicio\n"
+            f"  escreva(a + {i}); // comentario {i}\n"
+            "fim\n"
+        )
+
+    out.append('inteiro x;\nreal y;\ncadeia s;\nx = 0;\ny = 0.5;\ns = "texto";\n')
+
+    for _ in range(n_comandos):
+        k = rnd.randint(0, 4)
+        i = rnd.randrange(n_rotinas)
+        if k == 0:
+            out.append(f"x = x + {rnd.randint(0, 99)} * (x - 3) / 7;\n")
+        elif k == 1:
+            out.append(f"y = y * 1.25 + f{i}(x, y) - 0.5;\n")
+        elif k == 2:
+            out.append(
+                f"se (x > {rnd.randint(0, 50)}) entao\n"
+                "  x = x - 1;\n"
+                f"  p{i}(x);\n"
+                "senao\n"
+                "  escreva(s);\n"
+                "fimse\n"
+            )
+        elif k == 3:
+            out.append(
+                f"enquanto (x < {rnd.randint(0, 9)}) faca\n"
+                "  x = x + 1;\n"
+                "fimenquanto\n"
+            )
+        else:
+            out.append("escreva(y);\n")
+
+    return "".join(out)
+
+
+def medir(funcao, *args):
+    """Executa funcao(*args) e devolve (resultado, segundos, pico de memória em bytes)."""
+    gc.collect()
+    tracemalloc.start()
+    resultado = funcao(*args)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    gc.collect()
+    inicio = time.perf_counter()
+    funcao(*args)
+    segundos = time.perf_counter() - inicio
+
+    return resultado, segundos, pico
+
+
+def bench_tokens(codigo: str) -> None:
+    lexer = Lexer()
+
+    for nome, funcao in (
+        ("list[Token]", lexer.tokenizar),
+        ("TokensCompactos", lexer.tokenizar_compacto),
+    ):
+        tokens, segundos, pico = medir(funcao, codigo)
+        gc.collect()
+        inicio = time.perf_counter()
+        gc.collect()
+        segundos_gc = time.perf_counter() - inicio
+        print(
+            f"{nome:16} {len(tokens):>9} tokens  {segundos:7.3f}s  "
+            f"pico {pico / 1e6:7.1f} MB  gc completo {segundos_gc * 1e3:6.1f} ms"
+        )
+        del tokens
+
+
+def bench_lexer(codigo: str) -> None:
+    for backend in Lexer.BACKENDS:
+        inicio = time.perf_counter()
+        lexer = Lexer(backend)
+        carga = time.perf_counter() - inicio
+
+        tokens, segundos, _ = medir(lexer.tokenizar_compacto, codigo)
+        print(
+            f"{backend:6} {len(tokens) / segundos:>12,.0f} tokens/s  "
+            f"({segundos:.3f}s, construção do backend {carga * 1e3:.1f} ms)"
+        )
+
+
+def bench_relex(codigo: str) -> None:
+    rnd = random.Random(2)
+    edicoes = 200
+
+    for fator in (1, 4):
+        fonte = codigo * fator
+        doc = DocumentoLexico(fonte)
+
+        # digitação: edições perto de um cursor que anda devagar (sempre num
+        # espaço, para não quebrar um literal real ao meio)
+        cursor = len(fonte) // 2
+        inicio = time.perf_counter()
+        for _ in range(edicoes):
+            cursor = doc.codigo.find(" ", cursor + rnd.randint(-40, 60))
+            doc.editar(cursor, 0, "x ")
+        por_edicao = (time.perf_counter() - inicio) / edicoes
+
+        inicio = time.perf_counter()
+        Lexer().tokenizar(doc.codigo)
+        completo = time.perf_counter() - inicio
+
+        print(
+            f"{len(fonte) / 1e6:5.1f} MB  edição incremental {por_edicao * 1e3:7.3f} ms  "
+            f"tokenizar completo {completo * 1e3:8.1f} ms"
+        )
+
+
+def bench_parser(codigo: str) -> None:
+    lexer = Lexer()
+    tokens = lexer.tokenizar(codigo)
+
+    melhor = float("inf")
+    for _ in range(3):
+        gc.collect()
+        inicio = time.perf_counter()
+        Parser(tokens, lexer.indice).parse()
+        melhor = min(melhor, time.perf_counter() - inicio)
+
+    print(f"parse: {len(tokens) / melhor:>12,.0f} tokens/s  ({melhor:.3f}s)")
+
+
+def bench_esboco(codigo: str) -> None:
+    lexer = Lexer()
+
+    for nome, tokens in (
+        ("list[Token]", lexer.tokenizar(codigo)),
+        ("TokensCompactos", lexer.tokenizar_compacto(codigo)),
+    ):
+        for modo, funcao in (
+            ("parse completo", lambda: Parser(tokens).parse()),
+            ("esbocar", lambda: Parser(tokens).esbocar()),
+        ):
+            _, segundos, pico = medir(funcao)
+            print(f"{nome:16} {modo:15} {segundos * 1e3:8.1f} ms  pico {pico / 1e6:6.1f} MB")
+
+    # assinaturas + registro na tabela, sem o parse dos corpos
+    tokens = lexer.tokenizar_compacto(codigo)
+    inicio = time.perf_counter()
+    rotinas = Parser(tokens).esbocar()
+    AnalisadorSemantico().registrar_rotinas(rotinas)
+    segundos = time.perf_counter() - inicio
+    print(f"\n{len(rotinas)} rotinas registradas em {segundos * 1e3:.1f} ms")
+
+
+def bench_memoria(codigo: str) -> None:
+    """Memória que fica retida pela AST e pelos resultados da semântica."""
+    lexer = Lexer()
+    tokens = lexer.tokenizar(codigo)
+
+    gc.collect()
+    tracemalloc.start()
+    arvore = Parser(tokens).parse()
+    ast, _ = tracemalloc.get_traced_memory()
+    semantica = AnalisadorSemantico()
+    semantica.analisar(arvore)
+    total, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    n = arvore.n_nos
+    print(f"{n:,} nós")
+    print(f"AST        {ast / 1e6:7.1f} MB  ({ast / n:5.1f} B/nó)")
+    print(f"semântica  {(total - ast) / 1e6:7.1f} MB  ({(total - ast) / n:5.1f} B/nó)")
+
+
+def bench_cache(codigo: str) -> None:
+    """Ler a AST do cache contra refazer a análise léxica e o parse."""
+    lexer = Lexer()
+
+    def analisar():
+        return Parser(lexer.tokenizar_compacto(codigo)).parse()
+
+    arvore, parse, _ = medir(analisar)
+    dados, gravacao, _ = medir(serializar, arvore)
+    _, carga, pico = medir(desserializar, dados)
+
+    print(f"léxico + parse   {parse * 1e3:8.1f} ms")
+    print(f"serializar       {gravacao * 1e3:8.1f} ms  ({len(dados) / 1e6:.1f} MB)")
+    print(f"desserializar    {carga * 1e3:8.1f} ms  ({parse / carga:.1f}x mais rápido)")
+
+
+def bench_compartilhamento(codigo: str) -> None:
+    """AST com e sem subexpressões compartilhadas (Parser(compartilhar=True))."""
+    tokens = Lexer().tokenizar(codigo)
+
+    for compartilhar in (False, True):
+        arvore, parse, ast = medir(
+            lambda: Parser(tokens, compartilhar=compartilhar).parse()
+        )
+
+        melhor = float("inf")
+        for _ in range(3):
+            gc.collect()
+            inicio = time.perf_counter()
+            AnalisadorSemantico().analisar(arvore)
+            melhor = min(melhor, time.perf_counter() - inicio)
+
+        print(
+            f"compartilhar={compartilhar!s:5}  {arvore.n_nos:>9,} nós  "
+            f"parse {parse * 1e3:7.1f} ms  pico {ast / 1e6:6.1f} MB  "
+            f"semântica {melhor * 1e3:7.1f} ms"
+        )
+        del arvore
+
+
+def bench_otimizacao(codigo: str) -> None:
+    """
+    Tempo dos passes de cada nível de -O e tamanho do C gerado. Com poucos
+    comandos para muitas rotinas (--comandos pequeno), boa parte das
+    rotinas nunca é chamada e sai no -O1.
+    """
+    lexer = Lexer()
+    arvore = Parser(lexer.tokenizar_compacto(codigo)).parse()
+    semantica = AnalisadorSemantico()
+    semantica.analisar(arvore)
+
+    for nivel in sorted(PASSES):
+        otimizada, tempo, _ = medir(
+            otimizar, arvore, semantica.simbolos, semantica.tipos_expr, nivel
+        )
+        rotinas = sum(isinstance(s, (ProcDecl, FuncDecl)) for s in otimizada.comandos)
+        codigo_c = GeradorC(semantica.simbolos, semantica.tipos_expr).gerar(otimizada)
+        print(
+            f"-O{nivel}  passes {tempo * 1e3:7.1f} ms  {rotinas:>6,} rotinas  "
+            f"C {len(codigo_c) / 1e6:5.2f} MB"
+        )
+
+
+def bench_ir(codigo: str) -> None:
+    """
+    Geração de C direto da AST e passando pela IR de três endereços, com e
+    sem SSA: tempo de cada etapa, blocos e instruções da IR e tamanho do C.
+    """
+    lexer = Lexer()
+    arvore = Parser(lexer.tokenizar_compacto(codigo)).parse()
+    semantica = AnalisadorSemantico()
+    semantica.analisar(arvore)
+    arvore = otimizar(arvore, semantica.simbolos, semantica.tipos_expr)
+
+    codigo_c, tempo, _ = medir(
+        GeradorC(semantica.simbolos, semantica.tipos_expr).gerar, arvore
+    )
+    print(f"AST -> C       {tempo * 1e3:8.1f} ms  C {len(codigo_c) / 1e6:5.2f} MB")
+
+    for ssa in (False, True):
+        gc.collect()
+        inicio = time.perf_counter()
+        programa = TradutorIR(semantica.simbolos, semantica.tipos_expr).traduzir(arvore)
+        traducao = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        if ssa:
+            construir_ssa(programa)
+        construcao = time.perf_counter() - inicio
+
+        funcoes = programa.rotinas + [programa.principal]
+        blocos = sum(len(f.blocos) for f in funcoes)
+        instrs = sum(len(b.instrs) for f in funcoes for b in f.blocos)
+        inicio = time.perf_counter()
+        codigo_c = GeradorCIR().gerar(programa)
+        geracao = time.perf_counter() - inicio
+        print(
+            f"{'AST -> SSA -> C' if ssa else 'AST -> IR -> C':14} "
+            f"{(traducao + construcao + geracao) * 1e3:8.1f} ms  C {len(codigo_c) / 1e6:5.2f} MB"
+            f"  (tradução {traducao * 1e3:.1f} ms, SSA {construcao * 1e3:.1f} ms, "
+            f"C {geracao * 1e3:.1f} ms; {blocos:,} blocos, {instrs:,} instruções)"
+        )
+
+
+def bench_paralelo(codigo: str) -> None:
+    """
+    Corpos das rotinas analisados em série e num pool de processos. Além do
+    tempo, mostra a CPU gasta pelo processo principal e pelos filhos: com
+    P núcleos livres o tempo fica perto de pai + filhos / P.
+    """
+    arvore = Parser(Lexer().tokenizar(codigo)).parse()
+    print(f"{os.cpu_count()} CPUs")
+
+    def cpu(quem: int) -> float:
+        uso = resource.getrusage(quem)
+        return uso.ru_utime + uso.ru_stime
+
+    referencia = None
+    for processos in (1, 2, 4, 8):
+        melhor = (float("inf"), 0.0, 0.0)
+        for _ in range(3):
+            semantica = AnalisadorSemantico(max_erros=20, processos=processos)
+            gc.collect()
+            pai, filhos = cpu(resource.RUSAGE_SELF), cpu(resource.RUSAGE_CHILDREN)
+            inicio = time.perf_counter()
+            semantica.analisar(arvore)
+            medida = (
+                time.perf_counter() - inicio,
+                cpu(resource.RUSAGE_SELF) - pai,
+                cpu(resource.RUSAGE_CHILDREN) - filhos,
+            )
+            melhor = min(melhor, medida)
+
+        resultado = (
+            [str(e) for e in semantica.erros],
+            semantica.tipos_expr,
+            semantica.simbolos,
+        )
+        if referencia is None:
+            referencia = resultado
+        igual = "igual" if resultado == referencia else "DIFERENTE"
+        print(
+            f"processos={processos}  {melhor[0] * 1e3:7.1f} ms  "
+            f"CPU pai {melhor[1] * 1e3:7.1f} ms  filhos {melhor[2] * 1e3:7.1f} ms  "
+            f"resultado {igual} ao serial"
+        )
+
+
+class _Contador(Visitante):
+    """Um método vazio por classe de comando, para medir só o despacho."""
+
+    def _var_decl(self, stmt): pass
+    def _assign(self, stmt): pass
+    def _write(self, stmt): pass
+    def _if(self, stmt): pass
+    def _while(self, stmt): pass
+    def _proc_decl(self, stmt): pass
+    def _func_decl(self, stmt): pass
+    def _call_stmt(self, stmt): pass
+    def _return(self, stmt): pass
+
+    def cadeia(self, stmt):
+        # o despacho que as fases faziam antes do Visitante
+        if isinstance(stmt, VarDecl):
+            return self._var_decl(stmt)
+        if isinstance(stmt, Assign):
+            return self._assign(stmt)
+        if isinstance(stmt, Write):
+            return self._write(stmt)
+        if isinstance(stmt, If):
+            return self._if(stmt)
+        if isinstance(stmt, While):
+            return self._while(stmt)
+        if isinstance(stmt, ProcDecl):
+            return self._proc_decl(stmt)
+        if isinstance(stmt, FuncDecl):
+            return self._func_decl(stmt)
+        if isinstance(stmt, CallStmt):
+            return self._call_stmt(stmt)
+        if isinstance(stmt, Return):
+            return self._return(stmt)
+        raise ValueError(type(stmt).__name__)
+
+
+def bench_despacho(codigo: str) -> None:
+    """Custo por nó de uma cadeia de isinstance contra Visitante.visitar."""
+    arvore = Parser(Lexer().tokenizar(codigo)).parse()
+
+    # todos os comandos da AST, agrupados por classe
+    por_classe: dict[type, list] = {}
+    pendentes = list(arvore.comandos)
+    while pendentes:
+        stmt = pendentes.pop()
+        por_classe.setdefault(stmt.__class__, []).append(stmt)
+        if isinstance(stmt, If):
+            pendentes += stmt.then_block + (stmt.else_block or [])
+        elif isinstance(stmt, While):
+            pendentes += stmt.block
+        elif isinstance(stmt, (ProcDecl, FuncDecl)):
+            pendentes += stmt.body
+
+    contador = _Contador()
+    print(f"{'':10} {'nós':>9} {'isinstance':>11} {'visitar':>9}")
+    totais = [0.0, 0.0]
+    for classe, stmts in sorted(por_classe.items(), key=lambda c: c[0].__name__):
+        tempos = []
+        for despachar in (contador.cadeia, contador.visitar):
+            melhor = float("inf")
+            for _ in range(5):
+                inicio = time.perf_counter()
+                for stmt in stmts:
+                    despachar(stmt)
+                melhor = min(melhor, time.perf_counter() - inicio)
+            tempos.append(melhor)
+        totais = [t + m for t, m in zip(totais, tempos)]
+        print(
+            f"{classe.__name__:10} {len(stmts):>9,} {tempos[0] / len(stmts) * 1e9:8.0f} ns "
+            f"{tempos[1] / len(stmts) * 1e9:6.0f} ns"
+        )
+
+    n = sum(len(stmts) for stmts in por_classe.values())
+    print(
+        f"{'total':10} {n:>9,} {totais[0] * 1e3:8.1f} ms {totais[1] * 1e3:6.1f} ms"
+    )
+
+
+class TabelaEmLista:
+    """A TabelaDeSimbolos anterior (lista de dicts), só para comparação."""
+
+    def __init__(self) -> None:
+        self._scopes: list[dict[str, object]] = [dict()]
+        self._niveis: list[int] = [0]
+        self._nivel = 0
+
+    def push(self) -> None:
+        self._nivel += 1
+
+    def pop(self) -> None:
+        if self._niveis[-1] == self._nivel:
+            self._scopes.pop()
+            self._niveis.pop()
+        self._nivel -= 1
+
+    def declarar_var(self, nome: str, tipo: str) -> None:
+        if self._niveis[-1] != self._nivel:
+            self._scopes.append(dict())
+            self._niveis.append(self._nivel)
+        atual = self._scopes[-1]
+        if nome in atual:
+            raise ValueError(f"Identificador '{nome}' já declarado neste escopo.")
+        atual[nome] = SimboloVar(kind="var", nome=nome, tipo=tipo)
+
+    def buscar(self, nome: str):
+        for scope in reversed(self._scopes):
+            if nome in scope:
+                return scope[nome]
+        return None
+
+
+def bench_tabela(buscas: int = 200_000) -> None:
+    """
+    buscar() de uma variável global a partir do escopo mais interno, com
+    uma declaração local em cada nível, e um ciclo push/declarar/pop.
+    """
+    print(f"{'':16} {'profundidade':>12} {'buscar':>10} {'push+pop':>10}")
+    for classe in (TabelaEmLista, TabelaDeSimbolos):
+        for profundidade in (1, 16, 256):
+            tabela = classe()
+            tabela.declarar_var("global", "inteiro")
+            for i in range(profundidade):
+                tabela.push()
+                tabela.declarar_var(f"local{i}", "real")
+
+            buscar = tabela.buscar
+            inicio = time.perf_counter()
+            for _ in range(buscas):
+                buscar("global")
+            busca = (time.perf_counter() - inicio) / buscas
+
+            inicio = time.perf_counter()
+            for _ in range(buscas // 10):
+                tabela.push()
+                tabela.declarar_var("x", "inteiro")
+                tabela.pop()
+            ciclo = (time.perf_counter() - inicio) / (buscas // 10)
+
+            print(
+                f"{classe.__name__:16} {profundidade:>12} "
+                f"{busca * 1e9:8.0f} ns {ciclo * 1e9:8.0f} ns"
+            )
+
+
+def gerar_aninhados(profundidade: int) -> dict[str, str]:
+    """Programas com uma única construção aninhada `profundidade` vezes."""
+    d = profundidade
+    return {
+        "se": "inteiro x;\nx = 0;\n"
+        + "se (x < 1) entao\n" * d
+        + "x = x + 1;\n"
+        + "fimse\n" * d,
+        "enquanto": "inteiro x;\nx = 0;\n"
+        + "enquanto (x < 1) faca\n" * d
+        + "x = x + 1;\n"
+        + "fimenquanto\n" * d,
+        "parenteses": "inteiro x;\nx = 0;\nx = " + "(" * d + "x" + ")" * d + ";\n",
+        "cadeia de ops": "inteiro x;\nx = 0;\nx = x" + " + x * 2 - x" * (d // 3) + ";\n",
+        "à direita": "inteiro x;\nx = 0;\nx = " + "1 - (" * d + "x" + ")" * d + ";\n",
+        "chamadas": "funcao f(inteiro a)\ninicio\n  retorne a + 1;\nfim\n"
+        "inteiro x;\nx = 0;\nx = " + "f(" * d + "x" + ")" * d + ";\n",
+    }
+
+
+def bench_aninhamento(profundidade: int) -> None:
+    """
+    Teste de estresse: cada fase (parser, semântica, otimização em -O1 e
+    -O2, geração de C) tem que aguentar aninhamento arbitrário sem
+    RecursionError e em tempo linear, o que se vê dobrando a profundidade.
+    """
+    lexer = Lexer()
+    print(
+        f"{'':14} {'profundidade':>12} {'parse':>8} {'semântica':>10} "
+        f"{'-O1':>8} {'-O2':>8} {'C':>8}"
+    )
+
+    for d in (profundidade // 2, profundidade):
+        for nome, codigo in gerar_aninhados(d).items():
+            tokens = lexer.tokenizar(codigo)
+
+            inicio = time.perf_counter()
+            arvore = Parser(tokens, lexer.indice).parse()
+            parse = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            semantica = AnalisadorSemantico()
+            semantica.analisar(arvore)
+            analise = time.perf_counter() - inicio
+
+            # cada nível a partir da AST analisada; os passes só acrescentam
+            # às listas da semântica
+            otimizacao = []
+            for nivel in (1, 2):
+                inicio = time.perf_counter()
+                otimizada = otimizar(
+                    arvore, semantica.simbolos, semantica.tipos_expr, nivel
+                )
+                otimizacao.append(time.perf_counter() - inicio)
+
+            inicio = time.perf_counter()
+            GeradorC(semantica.simbolos, semantica.tipos_expr).gerar(otimizada)
+            geracao = time.perf_counter() - inicio
+
+            print(
+                f"{nome:14} {d:>12,} {parse:7.2f}s {analise:9.2f}s "
+                f"{otimizacao[0]:7.2f}s {otimizacao[1]:7.2f}s {geracao:7.2f}s"
+            )
+
+
+def gerar_chamadas(n: int) -> dict[str, str]:
+    """Programas com n funções em que cada uma chama outra."""
+
+    def cadeia(i: int) -> str:
+        ret = "a" if i == 0 else f"f{i - 1}(a) + 1"
+        return f"funcao f{i}(inteiro a)\ninicio\n  retorne {ret};\nfim\n"
+
+    def anel(i: int) -> str:
+        return (
+            f"funcao f{i}(inteiro a)\ninicio\n  inteiro r;\n  r = 1;\n"
+            f"  se (a > 0) entao\n    r = f{(i + 1) % n}(a - 1) + 1;\n  fimse\n"
+            "  retorne r;\nfim\n"
+        )
+
+    return {
+        "em ordem": "".join(cadeia(i) for i in range(n)),
+        "invertida": "".join(cadeia(i) for i in reversed(range(n))),
+        "recursão mútua": "".join(anel(i) for i in range(n)),
+    }
+
+
+def bench_ordem(n_rotinas: int) -> None:
+    """
+    Inferência dos retornos com as funções declaradas antes ou depois de
+    quem as chama, e num ciclo de recursão mútua; o tempo da semântica não
+    depende da ordem e cresce linearmente com o número de funções.
+    """
+    lexer = Lexer()
+    print(f"{'':16} {'funções':>8} {'semântica':>10}")
+
+    for n in (n_rotinas // 2, n_rotinas):
+        for nome, codigo in gerar_chamadas(n).items():
+            arvore = Parser(lexer.tokenizar(codigo), lexer.indice).parse()
+
+            inicio = time.perf_counter()
+            semantica = AnalisadorSemantico()
+            semantica.analisar(arvore)
+            analise = time.perf_counter() - inicio
+
+            print(f"{nome:16} {n:>8,} {analise * 1e3:8.1f} ms")
+
+
+def bench_incremental(n_rotinas: int, n_comandos: int) -> None:
+    """
+    Semântica depois de editar uma linha no corpo de uma rotina: análise
+    completa da AST contra AnaliseIncremental (com os tokens prontos, como
+    os de DocumentoLexico). Na incremental, o que cresce com o tamanho do
+    programa é só comparar o texto e deslocar as posições das rotinas (ver
+    AnaliseIncremental._editar_corpo); a segunda linha de cada tamanho volta
+    ao texto original, que já tem os resultados guardados.
+    """
+    print(f"{'':8} {'fonte':>8} {'completa':>10} {'incremental':>12} {'analisadas':>11}")
+
+    for fator in (1, 2):
+        codigo = gerar_programa(n_rotinas * fator, n_comandos * fator)
+        lexer = Lexer()
+        incremental = AnaliseIncremental(lexer)
+        incremental.analisar(codigo)
+
+        # troca uma constante no corpo de uma rotina do meio
+        rotina = codigo.index(f"funcao f{n_rotinas * fator // 2}(")
+        editado = codigo[:rotina] + codigo[rotina:].replace("/ 2.5", "/ 3.5", 1)
+        for versao in (editado, codigo):
+            tokens = lexer.tokenizar_compacto(versao)
+            gc.collect()
+            inicio = time.perf_counter()
+            incremental.analisar(versao, tokens)
+            parcial = time.perf_counter() - inicio
+
+            arvore = Parser(tokens).parse()
+            gc.collect()
+            inicio = time.perf_counter()
+            semantica = AnalisadorSemantico()
+            semantica.analisar(arvore)
+            completa = time.perf_counter() - inicio
+
+            igual = [str(e) for e in incremental.erros] == [str(e) for e in semantica.erros]
+            print(
+                f"{'':8} {len(versao) / 1e6:6.1f} MB {completa * 1e3:7.1f} ms "
+                f"{parcial * 1e3:9.1f} ms {incremental.analisadas:>11}"
+                + ("" if igual else "  ERROS DIFERENTES")
+            )
+
+
+EXPERIMENTOS = {
+    "tokens": bench_tokens,
+    "lexer": bench_lexer,
+    "relex": bench_relex,
+    "parser": bench_parser,
+    "esboco": bench_esboco,
+    "memoria": bench_memoria,
+    "cache": bench_cache,
+    "compartilhamento": bench_compartilhamento,
+    "despacho": bench_despacho,
+    "paralelo": bench_paralelo,
+    "otimizacao": bench_otimizacao,
+    "ir": bench_ir,
+}
+
+
+if __name__ == "__main__":
+    args_parser = argparse.ArgumentParser(prog="bench")
+    args_parser.add_argument(
+        "experimento", choices=sorted([*EXPERIMENTOS, "aninhamento", "incremental", "ordem", "tabela"])
+    )
+    args_parser.add_argument("--rotinas", type=int, default=2000)
+    args_parser.add_argument("--comandos", type=int, default=40000)
+    args_parser.add_argument("--profundidade", type=int, default=200_000)
+    args = args_parser.parse_args()
+
+    if args.experimento == "aninhamento":
+        bench_aninhamento(args.profundidade)
+        raise SystemExit
+    if args.experimento == "incremental":
+        bench_incremental(args.rotinas, args.comandos)
+        raise SystemExit
+    if args.experimento == "ordem":
+        bench_ordem(args.rotinas)
+        raise SystemExit
+    if args.experimento == "tabela":
+        bench_tabela()
+        raise SystemExit
+
+    codigo = gerar_programa(args.rotinas, args.comandos)
+    print(f"fonte: {len(codigo) / 1e6:.1f} MB\n")
+    EXPERIMENTOS[args.experimento](codigo)
@@ -1,24 +1,24 @@
+import argparse
+import hashlib
+import io
 import sys
 from pprint import pprint
 
+from src.cache_ast import carregar_ast, gravar_ast
 from src.lexer import Lexer
 from src.parser import Parser
 from src.semantico import AnalisadorSemantico
 from src.gerador_c import GeradorC
-from src.erros import ErroCompilador
+from src.gerador_c_ir import GeradorCIR
+from src.intervalos import AnaliseIntervalos, explicar
+from src.ir import texto
+from src.ssa import construir_ssa
+from src.traducao_ir import TradutorIR
+from src.otimizador import PASSES, otimizar
+from src.erros import ErroCompilador, ErroSintatico
+from src.semantico import ErroSemantico
 
-if len(sys.argv) > 1:
-    caminho = sys.argv[1]
-
-    try:
-        with open(caminho, "r", encoding="utf-8") as f:
-            codigo = f.read()
-    except FileNotFoundError:
-        print(f'Arquivo "{caminho}" não encontrado.\n')
-        print('Tente "./ptc -h" para mais informações de uso.')
-        sys.exit(1)
-else:
-    codigo = """
+CODIGO_EXEMPLO = """
     inteiro x;
     x = 0;
 
@@ -29,31 +29,220 @@ else:
     escreva(x);
     """
 
+args_parser = argparse.ArgumentParser(prog="ptc")
+args_parser.add_argument("arquivo", nargs="?")
+args_parser.add_argument(
+    "--tokens",
+    action="store_true",
+    help="imprime a lista de tokens (desativa a leitura em streaming)",
+)
+args_parser.add_argument(
+    "--assinaturas",
+    action="store_true",
+    help="só lista as assinaturas das rotinas, sem analisar os corpos",
+)
+args_parser.add_argument(
+    "--lexer",
+    choices=Lexer.BACKENDS,
+    default="regex",
+    help="backend do analisador léxico (padrão: regex)",
+)
+args_parser.add_argument(
+    "--max-erros",
+    type=int,
+    default=20,
+    metavar="N",
+    help="para depois de N erros de sintaxe e semântica (padrão: 20)",
+)
+args_parser.add_argument(
+    "--sem-cache",
+    action="store_true",
+    help="sempre refaz o léxico e o parse, sem ler nem gravar a AST em cache",
+)
+args_parser.add_argument(
+    "--processos",
+    type=int,
+    default=1,
+    metavar="N",
+    help="analisa os corpos das rotinas em N processos (padrão: 1); só compensa "
+    "com vários núcleos livres e corpos grandes, porque iniciar os processos e "
+    "juntar os resultados custa mais que analisar corpos pequenos",
+)
+args_parser.add_argument(
+    "-O",
+    dest="otimizacao",
+    type=int,
+    choices=sorted(PASSES),
+    default=1,
+    metavar="N",
+    help="nível de otimização da AST antes de gerar o C, de 0 a 2 (padrão: 1)",
+)
+args_parser.add_argument(
+    "--ir",
+    action="store_true",
+    help="gera o C a partir da representação intermediária de três endereços, e a imprime",
+)
+args_parser.add_argument(
+    "--ssa",
+    action="store_true",
+    help="põe a representação intermediária em SSA antes de gerar o C (implica --ir)",
+)
+args_parser.add_argument(
+    "--explicar-tipos",
+    action="store_true",
+    help="imprime os intervalos achados para as variáveis e os tipos C escolhidos com eles (aplicados no -O2, sem --ir)",
+)
+args_parser.add_argument(
+    "--explicar-otimizacao",
+    action="store_true",
+    help="imprime o que os passes de otimização contam: as subexpressões comuns eliminadas em cada rotina (no -O2)",
+)
+args = args_parser.parse_args()
+if args.max_erros < 1:
+    args_parser.error("--max-erros precisa ser pelo menos 1")
+if args.processos < 1:
+    args_parser.error("--processos precisa ser pelo menos 1")
+
+if args.arquivo:
+    caminho = args.arquivo
+
+    try:
+        fonte = open(caminho, "r", encoding="utf-8")
+    except FileNotFoundError:
+        print(f'Arquivo "{caminho}" não encontrado.\n')
+        print('Tente "./ptc -h" para mais informações de uso.')
+        sys.exit(1)
+else:
+    fonte = io.StringIO(CODIGO_EXEMPLO)
+
 
 print("\npara o código:\n")
 print("=============================")
-print(codigo)
+# ecoa a fonte linha a linha, sem carregá-la inteira na memória; o resumo
+# é a chave da AST em cache
+resumo = hashlib.sha256()
+for linha in fonte:
+    print(linha, end="")
+    resumo.update(linha.encode())
+print()
 print("=============================\n")
+fonte.seek(0)
 
 try:
-    tokens = Lexer().tokenizar(codigo)
-    arvore = Parser(tokens).parse()
+    with fonte:
+        lexer = Lexer(args.lexer)
+        if args.assinaturas:
+            tokens = lexer.tokenizar_compacto(fonte.read())
+            rotinas = Parser(tokens, lexer.indice).esbocar()
+            print("------- ROTINAS -------")
+            for rotina in rotinas:
+                palavra = "procedimento" if rotina.kind == "proc" else "funcao"
+                params = ", ".join(f"{p.tipo} {p.nome}" for p in rotina.params)
+                print(f"{palavra} {rotina.nome}({params})")
+            sys.exit(0)
+
+        # com a AST em cache não há léxico nem parse (--tokens precisa deles)
+        usar_cache = not args.sem_cache and not args.tokens
+        arvore = carregar_ast(resumo.hexdigest()) if usar_cache else None
+        erros: list[ErroCompilador] = []
+
+        if arvore is None:
+            if args.tokens:
+                tokens = lexer.tokenizar(fonte.read())
+            else:
+                tokens = lexer.tokenizar_stream(fonte)
+            parser = Parser(tokens, lexer.indice, max_erros=args.max_erros)
+            try:
+                arvore = parser.parse()
+            except ErroSintatico:
+                arvore = None  # limite de erros atingido
+            erros += parser.erros
+
+            if usar_cache and not erros:
+                gravar_ast(resumo.hexdigest(), arvore)
+
+    # a análise semântica roda sobre o que foi possível ler, com o que sobrou
+    # do limite de erros
+    if arvore is not None:
+        semantica = AnalisadorSemantico(
+            max_erros=args.max_erros - len(erros), processos=args.processos
+        )
+        try:
+            semantica.analisar(arvore)
+        except ErroSemantico:
+            pass
+        erros += semantica.erros
 
-    semantica = AnalisadorSemantico()
-    semantica.analisar(arvore)
+    if erros:
+        for erro in erros:
+            print(erro)
+        if len(erros) >= args.max_erros:
+            print(f"(limite de {args.max_erros} erros atingido)")
+        sys.exit(1)
+
+    relatorio_otimizacao: list[str] = []
+    arvore = otimizar(
+        arvore,
+        semantica.simbolos,
+        semantica.tipos_expr,
+        args.otimizacao,
+        relatorio_otimizacao,
+    )
+    # no -O2 os tipos C das variáveis saem da análise de intervalos (só o
+    # GeradorC os usa; com a IR a análise roda para --explicar-tipos)
+    tipos = None
+    if args.explicar_tipos or (args.otimizacao >= 2 and not (args.ir or args.ssa)):
+        tipos = AnaliseIntervalos(semantica.simbolos, semantica.tipos_expr).analisar(arvore)
+
+    programa_ir = None
+    if args.ir or args.ssa:
+        programa_ir = TradutorIR(semantica.simbolos, semantica.tipos_expr).traduzir(arvore)
+        if args.ssa:
+            construir_ssa(programa_ir)
+        # o gerador tira o programa da SSA, então o texto vem antes
+        texto_ir = texto(programa_ir)
+        codigo_c = GeradorCIR().gerar(programa_ir)
+    else:
+        gerador = GeradorC(
+            semantica.simbolos,
+            semantica.tipos_expr,
+            tipos if args.otimizacao >= 2 else None,
+        )
+        codigo_c = gerador.gerar(arvore)
+
+    if args.tokens:
+        print("------- TOKENS -------")
+        for token in tokens:
+            pos = lexer.indice.posicao(token.inicio)
+            print(f"{token}  [linha {pos.linha}, coluna {pos.coluna}]")
+        print()
+
+    print("------- AST -------")
+    try:
+        pprint(arvore)
+    except RecursionError:
+        # as fases não têm limite de aninhamento, mas o pprint é recursivo
+        print("(AST aninhada demais para ser impressa)")
 
-    gerador = GeradorC(semantica.tabela, semantica.tipos_expr)
-    codigo_c = gerador.gerar(arvore)
+    if args.explicar_otimizacao:
+        print("\n------- OTIMIZAÇÃO -------")
+        print("\n".join(relatorio_otimizacao) or "(nenhum passe com relatório neste nível)")
 
-    print("------- TOKENS -------")
-    for token in tokens:
-        print(token)
+    if args.explicar_tipos:
+        print("\n------- TIPOS -------")
+        print(explicar(tipos))
+        if programa_ir is not None:
+            print("(o backend da IR ignora estes tipos)")
+        elif args.otimizacao < 2:
+            print("(só aplicados com -O2)")
 
-    print("\n------- AST -------")
-    pprint(arvore)
+    if programa_ir is not None:
+        print("\n------- IR -------")
+        print(texto_ir)
 
     print("\n------- C -------")
     print(codigo_c)
 
 except ErroCompilador as e:
     print(e)
+    sys.exit(1)
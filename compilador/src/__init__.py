@@ -0,0 +1 @@
+VERSAO = "1.0"  # a mesma do ./ptc
@@ -1,96 +1,111 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from itertools import count
 
 # Tipos de Portugol (para declarações)
 TipoPortugol = str  # "inteiro" | "real" | "cadeia"
 
 
-@dataclass(frozen=True)
-class Expr:
+@dataclass(frozen=True, slots=True)
+class No:
+    """
+    Base de expressões e comandos. `nid` é o número do nó, dado pelo parser
+    em pós-ordem (os filhos antes do pai), de 0 a Program.n_nos - 1; as
+    fases guardam informação por nó em listas indexadas por ele. Não entra
+    na comparação nem no repr. Com FabricaNos, um mesmo nó de expressão
+    (e o seu nid) pode aparecer em vários lugares da árvore.
+    """
+
+    nid: int = field(kw_only=True, compare=False, repr=False)
+
+
+@dataclass(frozen=True, slots=True)
+class Expr(No):
     pass
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class NumInt(Expr):
     valor: int
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class NumReal(Expr):
     valor: float
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class StrLit(Expr):
     valor: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class VarRef(Expr):
     nome: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class BinOp(Expr):
     op: str  # '+', '-', '*', '/', etc.
     left: Expr
     right: Expr
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Compare(Expr):
     op: str  # '>', '<', '>=', '<=', '==', '!='
     left: Expr
     right: Expr
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Call(Expr):
     nome: str
     args: list[Expr]
 
 
-@dataclass(frozen=True)
-class Stmt:
+@dataclass(frozen=True, slots=True)
+class Stmt(No):
     pass
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class If(Stmt):
     cond: Expr
     then_block: list[Stmt]
     else_block: list[Stmt] | None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class While(Stmt):
     cond: Expr
     block: list[Stmt]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class VarDecl(Stmt):
     tipo: TipoPortugol
     nome: str
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Return(Stmt):
     expr: Expr
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Param:
     tipo: str
     nome: str
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ProcDecl(Stmt):
     nome: str
     params: list[Param]
     body: list[Stmt]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class FuncDecl(Stmt):
     nome: str
     params: list[Param]
@@ -98,22 +113,86 @@ class FuncDecl(Stmt):
     ret: Return
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
+class RotinaEsboco:
+    """
+    Cabeçalho de rotina lido por Parser.esbocar. O corpo não é analisado:
+    fica nos tokens [inicio, fim), e `fim` é o índice do 'fim' da rotina.
+    """
+    kind: str  # "proc" | "func"
+    nome: str
+    params: list[Param]
+    inicio: int
+    fim: int
+
+
+@dataclass(frozen=True, slots=True)
 class CallStmt(Stmt):
     call: Call
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Assign(Stmt):
     nome: str
     expr: Expr
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Write(Stmt):
     expr: Expr
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Program:
     comandos: list[Stmt]
+    n_nos: int = field(compare=False, repr=False)  # total de nids dados
+
+
+class FabricaNos:
+    """
+    Cria nós de expressão com hash-consing: pedir de novo um nó igual a um
+    já criado (mesma classe, mesmos valores, os mesmos objetos como filhos)
+    devolve o objeto existente, então subárvores repetidas são um só objeto,
+    com um só nid.
+
+    O tipo de uma variável depende das declarações visíveis, então VarRef e
+    Call só são reaproveitados dentro do mesmo `contexto`, que quem usa a
+    fábrica troca quando elas mudam (ver novo_contexto). Os outros nós
+    herdam essa restrição dos filhos. Assim um nó compartilhado tem sempre
+    o mesmo tipo, e a semântica pode guardá-lo pelo nid.
+    """
+
+    def __init__(self, nids: Iterator[int]) -> None:
+        self.contexto = 0
+        self._contextos = count(1)
+        self._nids = nids
+        self._nos: dict[tuple, Expr] = {}
+
+    def novo_contexto(self) -> None:
+        # um número nunca usado: voltar a um contexto anterior (no fim de um
+        # bloco) é atribuir `contexto` direto
+        self.contexto = next(self._contextos)
+
+    def folha(self, classe: type[Expr], valor: object) -> Expr:
+        if classe is VarRef:
+            chave = (classe, valor, self.contexto)
+        else:
+            chave = (classe, valor)
+        node = self._nos.get(chave)
+        if node is None:
+            node = self._nos[chave] = classe(valor, nid=next(self._nids))
+        return node
+
+    def binaria(self, classe: type[Expr], op: str, left: Expr, right: Expr) -> Expr:
+        chave = (classe, op, left.nid, right.nid)
+        node = self._nos.get(chave)
+        if node is None:
+            node = self._nos[chave] = classe(op, left, right, nid=next(self._nids))
+        return node
+
+    def chamada(self, nome: str, args: list[Expr]) -> Call:
+        chave = (Call, nome, self.contexto, *[arg.nid for arg in args])
+        node = self._nos.get(chave)
+        if node is None:
+            node = self._nos[chave] = Call(nome, args, nid=next(self._nids))
+        return node
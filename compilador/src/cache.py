@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from pathlib import Path
+
+
+def diretorio_cache() -> Path:
+    """
+    Diretório dos artefatos em cache do compilador. Usa $PTC_CACHE_DIR se
+    definido, senão $XDG_CACHE_HOME/ptc (ou ~/.cache/ptc).
+    """
+    if os.environ.get("PTC_CACHE_DIR"):
+        return Path(os.environ["PTC_CACHE_DIR"])
+
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(Path.home(), ".cache")
+    return Path(base) / "ptc"
+
+
+def ler_cache(nome: str) -> bytes | None:
+    try:
+        return (diretorio_cache() / nome).read_bytes()
+    except OSError:
+        return None
+
+
+def gravar_cache(nome: str, dados: bytes) -> None:
+    """
+    Grava de forma atômica (arquivo temporário + rename). Falhas de escrita
+    são ignoradas: o cache é só uma otimização.
+    """
+    destino = diretorio_cache()
+    try:
+        destino.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=destino, prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(dados)
+        os.replace(tmp, destino / nome)
+    except OSError:
+        pass
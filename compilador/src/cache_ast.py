@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import gc
+import hashlib
+import marshal
+
+from . import VERSAO
+from .ast_nodes import (
+    Assign,
+    BinOp,
+    Call,
+    CallStmt,
+    Compare,
+    FuncDecl,
+    If,
+    NumInt,
+    NumReal,
+    Param,
+    ProcDecl,
+    Program,
+    Return,
+    StrLit,
+    VarDecl,
+    VarRef,
+    While,
+    Write,
+)
+from .cache import gravar_cache, ler_cache
+
+# Muda sempre que o formato abaixo, os nós de ast_nodes ou o que o parser
+# produz para uma mesma fonte mudarem.
+VERSAO_AST = 2
+
+# Códigos dos nós no formato serializado
+(
+    NUM_INT,
+    NUM_REAL,
+    STR_LIT,
+    VAR_REF,
+    BIN_OP,
+    COMPARE,
+    CALL,
+    IF,
+    WHILE,
+    VAR_DECL,
+    RETURN,
+    PROC_DECL,
+    FUNC_DECL,
+    CALL_STMT,
+    ASSIGN,
+    WRITE,
+    REF,
+) = range(17)
+
+
+def serializar(program: Program) -> bytes:
+    """
+    Formato: marshal de (VERSAO_AST, n_comandos, dados), onde `dados` é uma
+    tupla plana com os nós em pós-ordem, cada um como o código do nó seguido
+    dos seus campos que não são nós; os filhos vêm antes, e listas de filhos
+    viram uma contagem. Como não há tuplas aninhadas, a profundidade da AST
+    não esbarra no limite de recursão do marshal. Um nó compartilhado (ver
+    FabricaNos) só é escrito na primeira vez; nas outras vira (REF, i), o
+    i-ésimo nó escrito.
+    """
+    dados: list = []
+    emitir = dados.append
+    estender = dados.extend
+
+    # nid -> posição do nó na ordem em que foram escritos
+    escritos: dict[int, int] = {}
+
+    # nós ainda por visitar; (node,) marca um nó cujos filhos já foram
+    # emitidos
+    pilha: list = list(reversed(program.comandos))
+
+    while pilha:
+        node = pilha.pop()
+        classe = node.__class__
+
+        if classe is tuple:
+            node = node[0]
+            classe = node.__class__
+            if classe is BinOp:
+                estender((BIN_OP, node.op))
+            elif classe is Compare:
+                estender((COMPARE, node.op))
+            elif classe is Call:
+                estender((CALL, node.nome, len(node.args)))
+            elif classe is Assign:
+                estender((ASSIGN, node.nome))
+            elif classe is Write:
+                emitir(WRITE)
+            elif classe is If:
+                senao = -1 if node.else_block is None else len(node.else_block)
+                estender((IF, len(node.then_block), senao))
+            elif classe is While:
+                estender((WHILE, len(node.block)))
+            elif classe is Return:
+                emitir(RETURN)
+            elif classe is CallStmt:
+                emitir(CALL_STMT)
+            elif classe is ProcDecl:
+                estender((PROC_DECL, node.nome, _params(node.params), len(node.body)))
+            else:
+                # o 'retorne' da função é um dos comandos do corpo
+                ret = next(
+                    i for i in range(len(node.body) - 1, -1, -1)
+                    if node.body[i] is node.ret
+                )
+                estender(
+                    (FUNC_DECL, node.nome, _params(node.params), len(node.body), ret)
+                )
+            escritos[node.nid] = len(escritos)
+            continue
+
+        i = escritos.get(node.nid)
+        if i is not None:
+            estender((REF, i))
+            continue
+
+        if classe is VarRef:
+            estender((VAR_REF, node.nome))
+        elif classe is NumInt:
+            estender((NUM_INT, node.valor))
+        elif classe is NumReal:
+            estender((NUM_REAL, node.valor))
+        elif classe is StrLit:
+            estender((STR_LIT, node.valor))
+        elif classe is VarDecl:
+            estender((VAR_DECL, node.tipo, node.nome))
+        else:
+            pilha.append((node,))
+            if classe is BinOp or classe is Compare:
+                pilha.append(node.right)
+                pilha.append(node.left)
+            elif classe is Call:
+                pilha.extend(reversed(node.args))
+            elif classe is Assign or classe is Write or classe is Return:
+                pilha.append(node.expr)
+            elif classe is CallStmt:
+                pilha.append(node.call)
+            elif classe is If:
+                if node.else_block is not None:
+                    pilha.extend(reversed(node.else_block))
+                pilha.extend(reversed(node.then_block))
+                pilha.append(node.cond)
+            elif classe is While:
+                pilha.extend(reversed(node.block))
+                pilha.append(node.cond)
+            elif classe is ProcDecl or classe is FuncDecl:
+                pilha.extend(reversed(node.body))
+            else:
+                raise TypeError(f"Nó não serializável: {classe.__name__}")
+            continue
+
+        escritos[node.nid] = len(escritos)
+
+    return marshal.dumps((VERSAO_AST, len(program.comandos), tuple(dados)))
+
+
+def _params(params: list[Param]) -> tuple[str, ...]:
+    # (tipo, nome, tipo, nome, ...)
+    return tuple(campo for p in params for campo in (p.tipo, p.nome))
+
+
+def desserializar(dados: bytes) -> Program:
+    """
+    Inverso de serializar(). Os nids são dados de novo, na ordem dos dados
+    (que é a pós-ordem); ValueError se os dados não forem desta versão.
+    """
+    versao, n_comandos, dados = marshal.loads(dados)
+    if versao != VERSAO_AST:
+        raise ValueError(f"AST serializada na versão {versao}, esperada {VERSAO_AST}.")
+
+    # Os nós não formam ciclos, então o coletor de ciclos não tem o que
+    # achar aqui; ligado, ele varreria a AST crescente várias vezes.
+    coletor = gc.isenabled()
+    gc.disable()
+    try:
+        return _montar(n_comandos, dados)
+    finally:
+        if coletor:
+            gc.enable()
+
+
+def _montar(n_comandos: int, dados: tuple) -> Program:
+    pilha: list = []
+    empilhar = pilha.append
+    nos: list = []  # nos[nid], para as referências
+    registrar = nos.append
+    nid = 0
+    i = 0
+    n = len(dados)
+
+    while i < n:
+        codigo = dados[i]
+
+        if codigo == VAR_REF:
+            empilhar(VarRef(dados[i + 1], nid=nid))
+            i += 2
+        elif codigo == NUM_INT:
+            empilhar(NumInt(dados[i + 1], nid=nid))
+            i += 2
+        elif codigo == BIN_OP:
+            right = pilha.pop()
+            pilha[-1] = BinOp(dados[i + 1], pilha[-1], right, nid=nid)
+            i += 2
+        elif codigo == ASSIGN:
+            pilha[-1] = Assign(dados[i + 1], pilha[-1], nid=nid)
+            i += 2
+        elif codigo == COMPARE:
+            right = pilha.pop()
+            pilha[-1] = Compare(dados[i + 1], pilha[-1], right, nid=nid)
+            i += 2
+        elif codigo == NUM_REAL:
+            empilhar(NumReal(dados[i + 1], nid=nid))
+            i += 2
+        elif codigo == STR_LIT:
+            empilhar(StrLit(dados[i + 1], nid=nid))
+            i += 2
+        elif codigo == CALL:
+            empilhar(Call(dados[i + 1], _desempilhar(pilha, dados[i + 2]), nid=nid))
+            i += 3
+        elif codigo == WRITE:
+            pilha[-1] = Write(pilha[-1], nid=nid)
+            i += 1
+        elif codigo == RETURN:
+            pilha[-1] = Return(pilha[-1], nid=nid)
+            i += 1
+        elif codigo == CALL_STMT:
+            pilha[-1] = CallStmt(pilha[-1], nid=nid)
+            i += 1
+        elif codigo == VAR_DECL:
+            empilhar(VarDecl(dados[i + 1], dados[i + 2], nid=nid))
+            i += 3
+        elif codigo == IF:
+            n_senao = dados[i + 2]
+            else_block = None if n_senao < 0 else _desempilhar(pilha, n_senao)
+            then_block = _desempilhar(pilha, dados[i + 1])
+            pilha[-1] = If(pilha[-1], then_block, else_block, nid=nid)
+            i += 3
+        elif codigo == WHILE:
+            block = _desempilhar(pilha, dados[i + 1])
+            pilha[-1] = While(pilha[-1], block, nid=nid)
+            i += 2
+        elif codigo == PROC_DECL:
+            params = _desfazer_params(dados[i + 2])
+            body = _desempilhar(pilha, dados[i + 3])
+            empilhar(ProcDecl(dados[i + 1], params, body, nid=nid))
+            i += 4
+        elif codigo == FUNC_DECL:
+            params = _desfazer_params(dados[i + 2])
+            body = _desempilhar(pilha, dados[i + 3])
+            ret = body[dados[i + 4]]
+            empilhar(FuncDecl(dados[i + 1], params, body, ret, nid=nid))
+            i += 5
+        elif codigo == REF:
+            empilhar(nos[dados[i + 1]])
+            i += 2
+            continue
+        else:
+            raise ValueError(f"Código de nó inválido: {codigo!r}")
+
+        registrar(pilha[-1])
+        nid += 1
+
+    if len(pilha) != n_comandos:
+        raise ValueError("AST serializada incompleta.")
+    return Program(pilha, nid)
+
+
+def _desempilhar(pilha: list, n: int) -> list:
+    if n == 0:
+        return []
+    itens = pilha[-n:]
+    del pilha[-n:]
+    return itens
+
+
+def _desfazer_params(campos: tuple[str, ...]) -> list[Param]:
+    return [Param(campos[k], campos[k + 1]) for k in range(0, len(campos), 2)]
+
+
+def _nome(resumo: str) -> str:
+    # a versão do marshal entra na chave porque o formato dele pode mudar
+    # entre versões do Python
+    chave = hashlib.sha256(
+        f"{VERSAO}:{VERSAO_AST}:{marshal.version}:{resumo}".encode()
+    ).hexdigest()[:32]
+    return f"ast-{chave}.marshal"
+
+
+def carregar_ast(resumo: str) -> Program | None:
+    """
+    AST em cache da fonte cujo sha256 (em hex, do texto em UTF-8) é
+    `resumo`, ou None se não houver uma válida.
+    """
+    dados = ler_cache(_nome(resumo))
+    if dados is None:
+        return None
+    try:
+        return desserializar(dados)
+    except Exception:
+        return None  # cache corrompido ou de outra versão: faz o parse de novo
+
+
+def gravar_ast(resumo: str, program: Program) -> None:
+    gravar_cache(_nome(resumo), serializar(program))
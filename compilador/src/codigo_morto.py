@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+from collections.abc import Generator
+
+from .ast_nodes import (
+    Program,
+    Stmt,
+    VarDecl,
+    Assign,
+    If,
+    While,
+    ProcDecl,
+    FuncDecl,
+    CallStmt,
+    Return,
+    Expr,
+    VarRef,
+    BinOp,
+    Compare,
+    Call,
+    NumInt,
+    NumReal,
+    StrLit,
+)
+from .grafo_chamadas import GrafoChamadas, chamadas
+from .reescrita import Reescrita, mesmos
+from .tabela_simbolos import SimboloRotina, SimboloVar
+
+
+class EliminacaoCodigoMorto(Reescrita):
+    """
+    Tira da AST o que não muda o que o programa faz:
+
+    - os comandos depois de um 'retorne' no mesmo bloco, ou de um 'se' em
+      que os dois caminhos retornam (menos o 'retorne' do nível do corpo
+      da função, o FuncDecl.ret, que fica no fim dele);
+    - as rotinas que o programa principal não chama, direta ou
+      indiretamente, pelo grafo de chamadas;
+    - as variáveis que nunca são lidas: a declaração e as atribuições a
+      elas. Das atribuições ficam só as chamadas de rotina que estavam na
+      expressão, como comandos. Uma variável lida só em atribuições a
+      variáveis que morrem também morre.
+
+    Os nós novos (comandos de chamada) ganham nids a partir de
+    Program.n_nos, com tipo e símbolo None acrescentados às listas da
+    semântica; os nós que não mudam são os mesmos objetos.
+    """
+
+    def __init__(
+        self,
+        simbolos: list[SimboloVar | SimboloRotina | None],
+        tipos_expr: list[str | None],
+    ) -> None:
+        super().__init__(simbolos, tipos_expr)
+        # ids dos símbolos das variáveis que nunca são lidas
+        self._mortas: set[int] = set()
+        # se o último bloco interno que acabou retorna (ver _if)
+        self._retornou = False
+
+    def _comandos(self, program: Program) -> list[Stmt]:
+        # o código inalcançável sai antes, para que as chamadas e leituras
+        # dele não contem
+        comandos = self._bloco(program.comandos)
+        comandos = self._alcancaveis(comandos)
+        self._mortas = self._variaveis_mortas(comandos)
+        if self._mortas:
+            comandos = self._bloco(comandos)
+        return comandos
+
+    def _alcancaveis(self, comandos: list[Stmt]) -> list[Stmt]:
+        """`comandos` sem as rotinas que o programa principal nunca chama."""
+        rotinas = [s for s in comandos if isinstance(s, (ProcDecl, FuncDecl))]
+        grafo = GrafoChamadas(rotinas)
+
+        principal = [s for s in comandos if not isinstance(s, (ProcDecl, FuncDecl))]
+        pilha = [grafo.indice[n] for n in chamadas(principal) if n in grafo.indice]
+        vistas = set(pilha)
+        while pilha:
+            for j in grafo.arestas[pilha.pop()]:
+                if j not in vistas:
+                    vistas.add(j)
+                    pilha.append(j)
+
+        if len(vistas) == len(rotinas):
+            return comandos
+        mantidas = {id(rotinas[i]) for i in vistas}
+        return [
+            s
+            for s in comandos
+            if not isinstance(s, (ProcDecl, FuncDecl)) or id(s) in mantidas
+        ]
+
+    def _variaveis_mortas(self, comandos: list[Stmt]) -> set[int]:
+        """
+        ids dos símbolos das variáveis declaradas ou atribuídas em
+        `comandos` que nunca são lidas, contando como não lida a leitura
+        numa atribuição a uma variável que morre (fora dos argumentos de
+        uma chamada, que ficam).
+        """
+        simbolos = self.simbolos
+        leituras: dict[int, int] = {}
+        # variável -> variáveis lidas nas atribuições a ela, fora de chamadas
+        fontes: dict[int, list[int]] = {}
+
+        pilha: list = list(comandos)
+        while pilha:
+            stmt = pilha.pop()
+            classe = stmt.__class__
+            if classe is VarDecl:
+                fontes.setdefault(id(simbolos[stmt.nid]), [])
+            elif classe is Assign:
+                destino = id(simbolos[stmt.nid])
+                soltas, presas = self._leituras(stmt.expr)
+                lidas = fontes.setdefault(destino, [])
+                for chave in soltas:
+                    # ler a própria variável só alimenta ela mesma
+                    if chave != destino:
+                        lidas.append(chave)
+                        leituras[chave] = leituras.get(chave, 0) + 1
+                for chave in presas:
+                    leituras[chave] = leituras.get(chave, 0) + 1
+            elif classe is If or classe is While:
+                for chave in _todas(self._leituras(stmt.cond)):
+                    leituras[chave] = leituras.get(chave, 0) + 1
+                if classe is While:
+                    pilha += stmt.block
+                else:
+                    pilha += stmt.then_block
+                    if stmt.else_block is not None:
+                        pilha += stmt.else_block
+            elif classe is ProcDecl or classe is FuncDecl:
+                pilha += stmt.body
+            else:
+                expr = stmt.call if classe is CallStmt else stmt.expr
+                for chave in _todas(self._leituras(expr)):
+                    leituras[chave] = leituras.get(chave, 0) + 1
+
+        mortas = {chave for chave in fontes if not leituras.get(chave)}
+        pendentes = list(mortas)
+        while pendentes:
+            for chave in fontes[pendentes.pop()]:
+                leituras[chave] -= 1
+                if not leituras[chave] and chave in fontes and chave not in mortas:
+                    mortas.add(chave)
+                    pendentes.append(chave)
+        return mortas
+
+    def _leituras(self, expr: Expr) -> tuple[list[int], list[int]]:
+        """
+        ids dos símbolos das variáveis lidas em `expr`, uma vez por leitura:
+        as que estão fora de qualquer chamada e as que estão nos argumentos
+        de uma.
+        """
+        soltas: list[int] = []
+        presas: list[int] = []
+        # (nó, se está dentro de uma chamada)
+        pilha: list[tuple[Expr, bool]] = [(expr, False)]
+        while pilha:
+            node, em_chamada = pilha.pop()
+            classe = node.__class__
+            if classe is VarRef:
+                (presas if em_chamada else soltas).append(id(self.simbolos[node.nid]))
+            elif classe is BinOp or classe is Compare:
+                pilha.append((node.left, em_chamada))
+                pilha.append((node.right, em_chamada))
+            elif classe is Call:
+                pilha += [(arg, True) for arg in node.args]
+        return soltas, presas
+
+    def _resultado(self) -> list[Stmt]:
+        self._retornou = self._terminou
+        return self._saida
+
+    # Um método por classe de comando, chamado por visitar(); os que não
+    # estão aqui são os de Reescrita. Um 'retorne' termina o bloco: o resto
+    # dele não é visitado
+    def _var_decl(self, stmt: VarDecl) -> None:
+        if id(self.simbolos[stmt.nid]) not in self._mortas:
+            self._saida.append(stmt)
+
+    def _assign(self, stmt: Assign) -> None:
+        if id(self.simbolos[stmt.nid]) not in self._mortas:
+            self._saida.append(stmt)
+            return
+
+        # só as chamadas de fora ficam; as de dentro são argumentos delas
+        pilha = [stmt.expr]
+        while pilha:
+            node = pilha.pop()
+            classe = node.__class__
+            if classe is Call:
+                self._saida.append(CallStmt(node, nid=self._novo_nid(None, None)))
+            elif classe is BinOp or classe is Compare:
+                pilha.append(node.right)
+                pilha.append(node.left)
+
+    def _return(self, stmt: Return) -> None:
+        self._saida.append(stmt)
+        self._terminou = True
+
+    def _if(self, stmt: If) -> Generator:
+        then_block = yield stmt.then_block
+        retorna = self._retornou
+        else_block = None
+        if stmt.else_block is not None:
+            else_block = yield stmt.else_block
+            retorna = retorna and self._retornou
+        else:
+            retorna = False
+
+        self._saida.append(self._se_novo(stmt, stmt.cond, then_block, else_block))
+        self._terminou = retorna
+
+    # o 'enquanto' é o de Reescrita: o corpo pode nunca executar, então o
+    # laço não termina o bloco
+
+    def _func_decl(self, stmt: FuncDecl) -> Generator:
+        body = yield stmt.body
+        # como no parser, o FuncDecl.ret é o último 'retorne' do nível do
+        # corpo; se ele ficou depois de um 'se' que retorna, um novo vai
+        # para o fim
+        if not mesmos(body, stmt.body) and not any(
+            s.__class__ is Return for s in body
+        ):
+            body.append(self._retorno_inalcancavel(stmt))
+        self._saida.append(self._rotina_nova(stmt, body))
+
+    def _retorno_inalcancavel(self, stmt: FuncDecl) -> Return:
+        """
+        'retorne' com um literal do tipo de retorno de `stmt`, para o fim de
+        um corpo que já retornou antes. O FuncDecl.ret original não serve:
+        ele pode ler variáveis declaradas no código que saiu.
+        """
+        retorno = self.simbolos[stmt.nid].retorno
+        nid = self._novo_nid(None, retorno)
+        if retorno == "inteiro":
+            literal = NumInt(0, nid=nid)
+        elif retorno == "real":
+            literal = NumReal(0.0, nid=nid)
+        else:
+            literal = StrLit("", nid=nid)
+        return Return(literal, nid=self._novo_nid(None, None))
+
+
+def _todas(leituras: tuple[list[int], list[int]]) -> list[int]:
+    return leituras[0] + leituras[1]
+
@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+import hashlib
+import pickle
+from collections.abc import MutableSequence
+
+from .cache import gravar_cache, ler_cache
+
+# Incrementar quando o formato da tabela ou o algoritmo de geração mudar
+VERSAO_GERADOR = 1
+
+# Símbolos que representam os caracteres fora do ASCII. O `\d` de `re` casa
+# qualquer dígito Unicode, então os dígitos não-ASCII ficam em um símbolo
+# separado dos demais.
+NAO_ASCII_DIGITO = "<nao-ascii-digito>"
+NAO_ASCII = "<nao-ascii>"
+
+ASCII = frozenset(chr(c) for c in range(128))
+UNIVERSO = ASCII | {NAO_ASCII_DIGITO, NAO_ASCII}
+DIGITOS = frozenset("0123456789") | {NAO_ASCII_DIGITO}
+
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+
+
+class ErroRegex(ValueError):
+    pass
+
+
+class _ParserRegex:
+    """
+    Parser do subconjunto de expressões regulares usado em Lexer.TOKEN_SPECS:
+    literais, escapes, classes [...] (com ^ e intervalos), '.', \\d, grupos,
+    alternação e os quantificadores *, + e ?.
+
+    Produz um fragmento de NFA de Thompson em `nfa`.
+    """
+
+    def __init__(self, padrao: str, nfa: _NFA) -> None:
+        self.padrao = padrao
+        self.pos = 0
+        self.nfa = nfa
+
+    def parse(self) -> tuple[int, int]:
+        frag = self._alternacao()
+        if self.pos != len(self.padrao):
+            raise ErroRegex(f"Regex inválida: {self.padrao!r} (posição {self.pos})")
+        return frag
+
+    def _atual(self) -> str | None:
+        return self.padrao[self.pos] if self.pos < len(self.padrao) else None
+
+    def _alternacao(self) -> tuple[int, int]:
+        frags = [self._concatenacao()]
+        while self._atual() == "|":
+            self.pos += 1
+            frags.append(self._concatenacao())
+
+        if len(frags) == 1:
+            return frags[0]
+
+        inicio = self.nfa.novo_estado()
+        fim = self.nfa.novo_estado()
+        for ini_frag, fim_frag in frags:
+            self.nfa.epsilon(inicio, ini_frag)
+            self.nfa.epsilon(fim_frag, fim)
+        return inicio, fim
+
+    def _concatenacao(self) -> tuple[int, int]:
+        inicio = fim = self.nfa.novo_estado()
+        while self._atual() not in (None, "|", ")"):
+            ini_frag, fim_frag = self._repeticao()
+            self.nfa.epsilon(fim, ini_frag)
+            fim = fim_frag
+        return inicio, fim
+
+    def _repeticao(self) -> tuple[int, int]:
+        ini_frag, fim_frag = self._atomo()
+
+        while self._atual() in ("*", "+", "?"):
+            op = self._atual()
+            self.pos += 1
+
+            inicio = self.nfa.novo_estado()
+            fim = self.nfa.novo_estado()
+            self.nfa.epsilon(inicio, ini_frag)
+            self.nfa.epsilon(fim_frag, fim)
+            if op in ("*", "?"):
+                self.nfa.epsilon(inicio, fim)
+            if op in ("*", "+"):
+                self.nfa.epsilon(fim_frag, ini_frag)
+            ini_frag, fim_frag = inicio, fim
+
+        return ini_frag, fim_frag
+
+    def _atomo(self) -> tuple[int, int]:
+        ch = self._atual()
+
+        if ch == "(":
+            self.pos += 1
+            frag = self._alternacao()
+            if self._atual() != ")":
+                raise ErroRegex(f"Regex inválida: ')' esperado em {self.padrao!r}")
+            self.pos += 1
+            return frag
+
+        if ch == "[":
+            simbolos = self._classe()
+        elif ch == ".":
+            self.pos += 1
+            simbolos = UNIVERSO - {"\n"}
+        elif ch == "\\":
+            simbolos = self._escape()
+        elif ch is None or ch in "*+?":
+            raise ErroRegex(f"Regex inválida: {self.padrao!r} (posição {self.pos})")
+        else:
+            self.pos += 1
+            simbolos = frozenset(ch)
+
+        if not simbolos <= UNIVERSO:
+            raise ErroRegex(f"Regex com caractere fora do ASCII: {self.padrao!r}")
+
+        inicio = self.nfa.novo_estado()
+        fim = self.nfa.novo_estado()
+        self.nfa.transicao(inicio, frozenset(simbolos), fim)
+        return inicio, fim
+
+    def _escape(self) -> frozenset[str]:
+        self.pos += 1
+        ch = self._atual()
+        if ch is None:
+            raise ErroRegex(f"Regex inválida: escape no fim de {self.padrao!r}")
+        self.pos += 1
+        if ch == "d":
+            return DIGITOS
+        return frozenset(_ESCAPES.get(ch, ch))
+
+    def _classe(self) -> frozenset[str]:
+        self.pos += 1
+        negada = self._atual() == "^"
+        if negada:
+            self.pos += 1
+
+        simbolos: set[str] = set()
+        primeiro = True
+        while self._atual() != "]" or primeiro:
+            primeiro = False
+            if self._atual() is None:
+                raise ErroRegex(f"Regex inválida: ']' esperado em {self.padrao!r}")
+
+            if self._atual() == "\\":
+                item = self._escape()
+                if len(item) != 1:
+                    simbolos |= item
+                    continue
+                (ch,) = item
+            else:
+                ch = self._atual()
+                self.pos += 1
+
+            if self._atual() == "-" and self.padrao[self.pos + 1 : self.pos + 2] not in ("]", ""):
+                self.pos += 1
+                if self._atual() == "\\":
+                    (ate,) = self._escape()
+                else:
+                    ate = self._atual()
+                    self.pos += 1
+                simbolos |= {chr(c) for c in range(ord(ch), ord(ate) + 1)}
+            else:
+                simbolos.add(ch)
+
+        self.pos += 1
+        return UNIVERSO - simbolos if negada else frozenset(simbolos)
+
+
+class _NFA:
+    def __init__(self) -> None:
+        self.epsilons: list[list[int]] = []
+        self.transicoes: list[list[tuple[frozenset[str], int]]] = []
+        self.aceita: dict[int, int] = {}  # estado final -> prioridade do token
+
+    def novo_estado(self) -> int:
+        self.epsilons.append([])
+        self.transicoes.append([])
+        return len(self.epsilons) - 1
+
+    def epsilon(self, de: int, para: int) -> None:
+        self.epsilons[de].append(para)
+
+    def transicao(self, de: int, simbolos: frozenset[str], para: int) -> None:
+        self.transicoes[de].append((simbolos, para))
+
+    def fecho(self, estados: set[int]) -> frozenset[int]:
+        pilha = list(estados)
+        fecho = set(estados)
+        while pilha:
+            for prox in self.epsilons[pilha.pop()]:
+                if prox not in fecho:
+                    fecho.add(prox)
+                    pilha.append(prox)
+        return frozenset(fecho)
+
+
+class ScannerDFA:
+    """
+    Scanner dirigido por tabela: um autômato determinístico que reconhece o
+    maior prefixo que casa com algum token, desempatando pela ordem de
+    prioridade (a mesma ordem da alternação de regex do Lexer).
+
+    As palavras-chave entram no autômato como tokens próprios (sem distinguir
+    maiúsculas), antes de IDENT, então não é preciso consultá-las depois.
+
+    Cada estado é um dict: caractere -> dict do próximo estado, sem a
+    tabela de classes no caminho. Os caracteres fora do ASCII vão pelas
+    chaves NAO_ASCII_DIGITO e NAO_ASCII (que não são caracteres), e o id do
+    token que o estado aceita fica na chave None (-1 para os ignorados).
+    """
+
+    def __init__(self, tabela: dict, ids: dict[str, int | None]) -> None:
+        """`ids`: tipo de token -> id inteiro, ou None para os que não são emitidos."""
+        classes = tabela["classes"]
+        estados: list[dict] = [{} for _ in tabela["transicoes"]]
+
+        for estado, linha, aceita in zip(estados, tabela["transicoes"], tabela["aceita"]):
+            for simbolo, classe in classes.items():
+                if linha[classe] >= 0:
+                    estado[simbolo] = estados[linha[classe]]
+            if aceita is not None:
+                tipo = ids[aceita]
+                estado[None] = -1 if tipo is None else tipo
+
+        self._inicial = estados[0]
+
+    @classmethod
+    def carregar(
+        cls,
+        token_specs: list[tuple[str, str]],
+        keywords: dict[str, str],
+        ids: dict[str, int | None],
+    ) -> ScannerDFA:
+        """Usa a tabela em cache no disco se houver uma para estas especificações."""
+        chave = hashlib.sha256(
+            repr((VERSAO_GERADOR, token_specs, sorted(keywords.items()))).encode()
+        ).hexdigest()[:16]
+        nome = f"dfa-{chave}.pickle"
+
+        dados = ler_cache(nome)
+        if dados is not None:
+            try:
+                return cls(pickle.loads(dados), ids)
+            except Exception:
+                pass  # cache corrompido: gera de novo
+
+        tabela = gerar_tabela(token_specs, keywords)
+        gravar_cache(nome, pickle.dumps(tabela, protocol=pickle.HIGHEST_PROTOCOL))
+        return cls(tabela, ids)
+
+    def varrer(
+        self,
+        texto: str,
+        pos: int,
+        limite: int,
+        final: bool,
+        tipos: MutableSequence[int],
+        inicios: MutableSequence[int],
+        fins: MutableSequence[int],
+    ) -> int:
+        """
+        Reconhece os tokens de `texto` que começam em `pos` e antes de
+        `limite`, acrescentando os emitidos às colunas; devolve onde parou.
+        Para antes de um caractere inválido e, se `texto` não é o fim da
+        fonte (`final`), antes de um token que chega ao fim dele.
+        """
+        inicial = self._inicial
+        tipos_append = tipos.append
+        inicios_append = inicios.append
+        fins_append = fins.append
+
+        while pos < limite:
+            estado = inicial
+            i = pos
+            try:
+                while True:
+                    prox = estado.get(texto[i])
+                    if prox is None:
+                        if texto[i] < "\x80":
+                            break
+                        prox = estado.get(_nao_ascii(texto[i]))
+                        if prox is None:
+                            break
+                    estado = prox
+                    i += 1
+            except IndexError:
+                # o token chega ao fim de texto: pode continuar no próximo bloco
+                if not final:
+                    return pos
+
+            tipo = estado.get(None)
+            if tipo is None:
+                # O autômato parou fora de um estado final (ex.: "1." de um
+                # real incompleto): refaz o caminho até o último estado final
+                tipo, i = self._recuar(texto, pos, i)
+                if tipo is None:
+                    return pos
+            if tipo >= 0:
+                tipos_append(tipo)
+                inicios_append(pos)
+                fins_append(i)
+            pos = i
+
+        return pos
+
+    def _recuar(self, texto: str, pos: int, ate: int) -> tuple[int | None, int]:
+        estado = self._inicial
+        tipo = None
+        fim = pos
+        for i in range(pos, ate):
+            ch = texto[i]
+            estado = estado.get(ch) or estado[_nao_ascii(ch)]
+            if None in estado:
+                tipo = estado[None]
+                fim = i + 1
+        return tipo, fim
+
+
+def _nao_ascii(ch: str) -> str:
+    return NAO_ASCII_DIGITO if ch.isdecimal() else NAO_ASCII
+
+
+def gerar_tabela(
+    token_specs: list[tuple[str, str]], keywords: dict[str, str]
+) -> dict:
+    """
+    Compila as especificações em uma tabela de transições:
+      - classes: símbolo -> classe de equivalência do alfabeto
+      - transicoes[estado][classe] -> próximo estado (-1 = sem transição)
+      - aceita[estado] -> tipo de token reconhecido (ou None)
+    O estado 0 é o inicial.
+    """
+    # (tipo, regex, palavra-chave) em ordem de prioridade; as palavras-chave
+    # entram logo antes de IDENT
+    especificacoes: list[tuple[str, str | None, str | None]] = []
+    for tok_type, pattern in token_specs:
+        if tok_type == "IDENT":
+            for lexema, kw_type in keywords.items():
+                especificacoes.append((kw_type, None, lexema))
+        especificacoes.append((tok_type, pattern, None))
+
+    nfa = _NFA()
+    inicio = nfa.novo_estado()
+
+    for prioridade, (tok_type, pattern, lexema) in enumerate(especificacoes):
+        if pattern is None:
+            ini_frag, fim_frag = _palavra_chave(nfa, lexema)
+        else:
+            ini_frag, fim_frag = _ParserRegex(pattern, nfa).parse()
+        nfa.epsilon(inicio, ini_frag)
+        nfa.aceita[fim_frag] = prioridade
+
+    # classes de equivalência: símbolos que aparecem exatamente nos mesmos
+    # conjuntos de transição são indistinguíveis para o autômato
+    conjuntos = sorted(
+        {simbolos for trans in nfa.transicoes for simbolos, _ in trans},
+        key=lambda s: sorted(s),
+    )
+    assinaturas: dict[tuple[bool, ...], int] = {}
+    classes: dict[str, int] = {}
+    for simbolo in sorted(UNIVERSO):
+        assinatura = tuple(simbolo in conjunto for conjunto in conjuntos)
+        classes[simbolo] = assinaturas.setdefault(assinatura, len(assinaturas))
+
+    # representante de cada classe, para testar as transições do NFA
+    representantes: dict[int, str] = {}
+    for simbolo, classe in classes.items():
+        representantes.setdefault(classe, simbolo)
+
+    # construção de subconjuntos
+    inicial = nfa.fecho({inicio})
+    estados: dict[frozenset[int], int] = {inicial: 0}
+    pendentes = [inicial]
+    transicoes: list[list[int]] = []
+    aceita: list[str | None] = []
+
+    while pendentes:
+        atual = pendentes.pop(0)
+        linha = [-1] * len(representantes)
+
+        for classe, simbolo in representantes.items():
+            destino = {
+                para
+                for estado in atual
+                for simbolos, para in nfa.transicoes[estado]
+                if simbolo in simbolos
+            }
+            if not destino:
+                continue
+            fecho = nfa.fecho(destino)
+            if fecho not in estados:
+                estados[fecho] = len(estados)
+                pendentes.append(fecho)
+            linha[classe] = estados[fecho]
+
+        transicoes.append(linha)
+        prioridades = [nfa.aceita[e] for e in atual if e in nfa.aceita]
+        aceita.append(especificacoes[min(prioridades)][0] if prioridades else None)
+
+    return {"classes": classes, "transicoes": transicoes, "aceita": aceita}
+
+
+def _palavra_chave(nfa: _NFA, lexema: str) -> tuple[int, int]:
+    # o Lexer compara palavras-chave com lexema.lower()
+    inicio = fim = nfa.novo_estado()
+    for ch in lexema:
+        prox = nfa.novo_estado()
+        nfa.transicao(fim, frozenset({ch.lower(), ch.upper()}), prox)
+        fim = prox
+    return inicio, fim
@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+from .ast_nodes import (
+    Program,
+    Stmt,
+    ProcDecl,
+    FuncDecl,
+    CallStmt,
+    Expr,
+    NumInt,
+    NumReal,
+    VarRef,
+    BinOp,
+    Compare,
+    Call,
+)
+from .grafo_chamadas import GrafoChamadas
+from .propagacao_constantes import BOOL, CADEIA, DOUBLE, FLOAT, INT, tipo_c, tipo_comum
+from .reescrita import Reescrita
+from .tabela_simbolos import SimboloRotina, SimboloVar
+
+# Nós que o corpo de uma função pode ter (depois de expandidas as chamadas
+# dele) para que ela seja expandida
+TAMANHO_MAXIMO = 16
+
+
+class ExpansaoFuncoes(Reescrita):
+    """
+    Troca as chamadas de funções pequenas pelo corpo delas, com os
+    argumentos no lugar dos parâmetros, antes da propagação de constantes
+    (que então dobra o que os argumentos constantes permitirem).
+
+    Só uma função cujo corpo é um 'retorne' de uma expressão é expandida,
+    já que a AST não tem comandos dentro de expressões; ela também não
+    pode ser recursiva (pelo grafo de chamadas) nem passar de
+    TAMANHO_MAXIMO nós. Sem variáveis locais e sem enxergar as do
+    programa, o corpo só lê parâmetros, então trocá-los pelos argumentos
+    não captura nada e não há o que renomear.
+
+    Uma chamada só é expandida se o resultado faz a mesma conta:
+
+    - os tipos C têm que bater, o da expressão do corpo com o do retorno e
+      o de cada argumento com o do parâmetro, porque não há conversão na
+      AST (um argumento double num parâmetro real seria arredondado para
+      float na chamada);
+    - um parâmetro lido mais de uma vez só recebe uma variável ou um
+      literal, e um não lido, algo sem chamadas e sem divisão, para que
+      cada argumento continue sendo calculado uma vez;
+    - um argumento com chamada só entra num corpo sem chamadas, porque a
+      ordem entre os efeitos delas mudaria.
+
+    As funções são percorridas das chamadas para as que chamam, então o
+    corpo de uma já vem com as chamadas dele expandidas. Os nós novos
+    ganham nids a partir de Program.n_nos, com o tipo e o símbolo do nó
+    que copiam; os nós que não mudam são os mesmos objetos.
+    """
+
+    def __init__(
+        self,
+        simbolos: list[SimboloVar | SimboloRotina | None],
+        tipos_expr: list[str | None],
+    ) -> None:
+        super().__init__(simbolos, tipos_expr)
+        # nome -> (expressão do corpo, nomes dos parâmetros, leituras de
+        # cada parâmetro, se o corpo tem chamadas, se tem divisão), das que
+        # podem ser expandidas
+        self._corpos: dict[str, tuple[Expr, list[str], list[int], bool, bool]] = {}
+
+    def _comandos(self, program: Program) -> list[Stmt]:
+        rotinas = [s for s in program.comandos if isinstance(s, (ProcDecl, FuncDecl))]
+        grafo = GrafoChamadas(rotinas)
+        novas: dict[int, Stmt] = {}
+        for componente in grafo.componentes():
+            recursiva = grafo.recursiva(componente)
+            for i in componente:
+                rotina = self._bloco([rotinas[i]])[0]
+                novas[id(rotinas[i])] = rotina
+                if not recursiva:
+                    self._registrar(rotina)
+
+        return self._bloco([novas.get(id(s), s) for s in program.comandos])
+
+    def _registrar(self, rotina: Stmt) -> None:
+        """Guarda `rotina` em _corpos, se ela pode ser expandida."""
+        if rotina.__class__ is not FuncDecl or len(rotina.body) != 1:
+            return
+        if any(p.tipo == "cadeia" for p in rotina.params):
+            return
+        expr = rotina.ret.expr
+        retorno = self.simbolos[rotina.nid].retorno
+        if tipo_c(expr, self.simbolos) != {"inteiro": INT, "real": FLOAT}.get(retorno):
+            return
+
+        nomes = [p.nome for p in rotina.params]
+        leituras = [0] * len(nomes)
+        tamanho = 0
+        tem_chamada = False
+        tem_divisao = False
+        pilha = [expr]
+        while pilha:
+            node = pilha.pop()
+            tamanho += 1
+            classe = node.__class__
+            if classe is VarRef:
+                leituras[nomes.index(node.nome)] += 1
+            elif classe is BinOp or classe is Compare:
+                if classe is BinOp and node.op == "/":
+                    tem_divisao = True
+                pilha.append(node.left)
+                pilha.append(node.right)
+            elif classe is Call:
+                tem_chamada = True
+                pilha += node.args
+
+        if tamanho <= TAMANHO_MAXIMO:
+            self._corpos[rotina.nome] = (expr, nomes, leituras, tem_chamada, tem_divisao)
+
+    # Os outros comandos ficam com os métodos de Reescrita, que passam as
+    # expressões por _expr
+    def _call_stmt(self, stmt: CallStmt) -> None:
+        # a chamada do comando fica (o valor de uma função seria perdido);
+        # só os argumentos são expandidos
+        call = stmt.call
+        args = [self._expr(arg) for arg in call.args]
+        if any(a is not b for a, b in zip(args, call.args)):
+            stmt = CallStmt(self._copia(call, args), nid=stmt.nid)
+        self._saida.append(stmt)
+
+    # Expressions
+    def _expr(self, expr: Expr) -> Expr:
+        """
+        `expr` com as chamadas que podem ser expandidas trocadas pelo corpo
+        da função, em pós-ordem com uma pilha explícita: os argumentos de
+        uma chamada já vêm expandidos. A marca (node,) na pilha combina os
+        filhos de `node`, que ficam em `resultados` como (nó novo, tipo C,
+        se tem chamada, se tem divisão), para que _expandir não precise
+        percorrer os argumentos de novo.
+        """
+        if not self._corpos:
+            return expr
+
+        simbolos = self.simbolos
+        resultados: list[tuple[Expr, int, bool, bool]] = []
+        pilha: list = [expr]
+        while pilha:
+            node = pilha.pop()
+            classe = node.__class__
+
+            if classe is BinOp or classe is Compare:
+                pilha.append((node,))
+                pilha.append(node.right)
+                pilha.append(node.left)
+            elif classe is Call:
+                pilha.append((node,))
+                pilha += reversed(node.args)
+            elif classe is tuple:
+                node = node[0]
+                if node.__class__ is Call:
+                    n = len(node.args)
+                    args = resultados[len(resultados) - n :]
+                    del resultados[len(resultados) - n :]
+                    expandida = self._expandir(node, args)
+                    if expandida is None:
+                        retorno = simbolos[node.nid].retorno
+                        expandida = (
+                            self._copia(node, [a[0] for a in args]),
+                            {"inteiro": INT, "real": FLOAT}.get(retorno, CADEIA),
+                            True,
+                            any(a[3] for a in args),
+                        )
+                    resultados.append(expandida)
+                else:
+                    right = resultados.pop()
+                    left = resultados.pop()
+                    if node.__class__ is Compare:
+                        tipo = BOOL
+                    else:
+                        tipo = tipo_comum(left[1], right[1])
+                    resultados.append(
+                        (
+                            self._copia(node, [left[0], right[0]]),
+                            tipo,
+                            left[2] or right[2],
+                            left[3] or right[3] or node.op == "/",
+                        )
+                    )
+            elif classe is NumInt:
+                resultados.append((node, INT, False, False))
+            elif classe is NumReal:
+                resultados.append((node, DOUBLE, False, False))
+            elif classe is VarRef:
+                tipo = simbolos[node.nid].tipo
+                resultados.append(
+                    (node, {"inteiro": INT, "real": FLOAT}.get(tipo, CADEIA), False, False)
+                )
+            else:
+                resultados.append((node, CADEIA, False, False))
+
+        return resultados[0][0]
+
+    def _expandir(
+        self, call: Call, args: list[tuple[Expr, int, bool, bool]]
+    ) -> tuple[Expr, int, bool, bool] | None:
+        """
+        O corpo da função chamada com `args` (como em _expr) nos
+        parâmetros, ou None se a chamada fica.
+        """
+        corpo = self._corpos.get(call.nome)
+        if corpo is None:
+            return None
+        expr, nomes, leituras, tem_chamada, tem_divisao = corpo
+
+        params = self.simbolos[call.nid].params
+        for (arg, tipo_arg, chamada, divisao), tipo, n in zip(args, params, leituras):
+            if tipo_arg != (INT if tipo == "inteiro" else FLOAT):
+                return None
+            classe = arg.__class__
+            if classe is VarRef or classe is NumInt or classe is NumReal:
+                continue
+            if n > 1:
+                return None
+            if chamada and (tem_chamada or n == 0):
+                return None
+            if n == 0 and divisao:
+                return None
+
+        # os argumentos não lidos somem com a chamada
+        lidos = [a for a, n in zip(args, leituras) if n]
+        valores = dict(zip(nomes, (a[0] for a in args)))
+        resultados: list[Expr] = []
+        pilha: list = [expr]
+        while pilha:
+            node = pilha.pop()
+            classe = node.__class__
+            if classe is VarRef:
+                resultados.append(valores[node.nome])
+            elif classe is BinOp or classe is Compare:
+                pilha.append((node,))
+                pilha.append(node.right)
+                pilha.append(node.left)
+            elif classe is Call:
+                pilha.append((node,))
+                pilha += reversed(node.args)
+            elif classe is tuple:
+                node = node[0]
+                n = len(node.args) if node.__class__ is Call else 2
+                filhos = resultados[len(resultados) - n :]
+                del resultados[len(resultados) - n :]
+                resultados.append(self._copia(node, filhos))
+            else:
+                resultados.append(node)
+
+        # o tipo C do corpo é o do retorno (ver _registrar)
+        retorno = self.simbolos[call.nid].retorno
+        return (
+            resultados[0],
+            INT if retorno == "inteiro" else FLOAT,
+            tem_chamada or any(a[2] for a in lidos),
+            tem_divisao or any(a[3] for a in lidos),
+        )
+
+    def _copia(self, node: Expr, filhos: list[Expr]) -> Expr:
+        """`node` com `filhos` no lugar dos seus, ou ele mesmo se são os mesmos."""
+        if node.__class__ is Call:
+            if all(a is b for a, b in zip(filhos, node.args)):
+                return node
+        elif filhos[0] is node.left and filhos[1] is node.right:
+            return node
+        nid = self._novo_nid(self.simbolos[node.nid], self.tipos_expr[node.nid])
+        if node.__class__ is Call:
+            return Call(node.nome, filhos, nid=nid)
+        return node.__class__(node.op, *filhos, nid=nid)
+
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from collections.abc import Generator, Iterator
+
 from .ast_nodes import (
     Program,
     Stmt,
@@ -22,13 +24,27 @@ from .ast_nodes import (
     Compare,
     Call,
 )
-from .tabela_simbolos import TabelaDeSimbolos
-
-
-class GeradorC:
-    def __init__(self, tabela: TabelaDeSimbolos, tipos_expr: dict[int, str]) -> None:
-        self.tabela = tabela
+from .intervalos import TiposC
+from .tabela_simbolos import SimboloRotina, SimboloVar
+from .visitante import Visitante
+
+# A partir deste nível de aninhamento as linhas não são mais recuadas: com
+# milhares de blocos aninhados o recuo deixaria a saída quadrática.
+RECUO_MAXIMO = 64
+
+
+class GeradorC(Visitante):
+    def __init__(
+        self,
+        simbolos: list[SimboloVar | SimboloRotina | None],
+        tipos_expr: list[str | None],
+        tipos: TiposC | None = None,
+    ) -> None:
+        # ambos vêm de AnalisadorSemantico, indexados pelo nid dos nós
+        self.simbolos = simbolos
         self.tipos_expr = tipos_expr
+        # tipos C escolhidos por AnaliseIntervalos; sem eles, os de sempre
+        self.tipos = tipos if tipos is not None else TiposC()
         self._out: list[str] = []
         self._indent = 0
 
@@ -41,18 +57,23 @@ class GeradorC:
         self._emit("#include <string.h>")
         self._emit("")
 
-        for stmt in program.comandos:
-            if isinstance(stmt, (ProcDecl, FuncDecl)):
-                self._rotina(stmt)
-                self._emit("")
+        # protótipos: uma rotina pode chamar outra declarada depois dela
+        rotinas = [s for s in program.comandos if isinstance(s, (ProcDecl, FuncDecl))]
+        for stmt in rotinas:
+            self._emit(self._assinatura(stmt) + ";")
+        if rotinas:
+            self._emit("")
+
+        for stmt in rotinas:
+            self._bloco([stmt])
+            self._emit("")
 
         self._emit("int main() {")
         self._indent += 1
 
-        for stmt in program.comandos:
-            if isinstance(stmt, (ProcDecl, FuncDecl)):
-                continue
-            self._stmt(stmt)
+        self._bloco(
+            [s for s in program.comandos if not isinstance(s, (ProcDecl, FuncDecl))]
+        )
 
         self._emit("return 0;")
         self._indent -= 1
@@ -61,7 +82,35 @@ class GeradorC:
         return "\n".join(self._out)
 
     def _emit(self, line: str) -> None:
-        self._out.append(("  " * self._indent) + line)
+        recuo = self._indent if self._indent < RECUO_MAXIMO else RECUO_MAXIMO
+        self._out.append(("  " * recuo) + line)
+
+    def _bloco(self, stmts: list[Stmt]) -> None:
+        """
+        Gera `stmts` e os blocos aninhados neles sem recursão: comandos
+        compostos são geradores que fazem `yield` de cada bloco interno e
+        continuam depois que ele foi gerado.
+        """
+        visitar = self.visitar
+        pilha: list[tuple[Generator | None, Iterator[Stmt]]] = []
+        gerador: Generator | None = None
+        comandos = iter(stmts)
+
+        while True:
+            for stmt in comandos:
+                sub = visitar(stmt)
+                if sub is not None:
+                    pilha.append((gerador, comandos))
+                    gerador = sub
+                    break
+
+            if gerador is None:
+                return
+            bloco = next(gerador, None)
+            if bloco is None:
+                gerador, comandos = pilha.pop()
+            else:
+                comandos = iter(bloco)
 
     def _c_tipo(self, tipo: str) -> str:
         if tipo == "inteiro":
@@ -93,28 +142,13 @@ class GeradorC:
                 parts.append(f"{self._c_tipo(p.tipo)} {p.nome}")
         return ", ".join(parts)
 
-    # rotinas (fora do main)
-    def _rotina(self, stmt: Stmt) -> None:
-        if isinstance(stmt, ProcDecl):
-            self._proc_decl(stmt)
-            return
-        if isinstance(stmt, FuncDecl):
-            self._func_decl(stmt)
-            return
-        raise ValueError(f"Rotina não suportada: {type(stmt).__name__}")
-
-    def _proc_decl(self, stmt: ProcDecl) -> None:
+    def _assinatura(self, stmt: ProcDecl | FuncDecl) -> str:
         params = self._params_c(stmt.params)
-        self._emit(f"void {stmt.nome}({params}) " + "{")
-        self._indent += 1
-        for s in stmt.body:
-            self._stmt_rotina(s)
-        self._indent -= 1
-        self._emit("}")
+        if isinstance(stmt, ProcDecl):
+            return f"void {stmt.nome}({params})"
 
-    def _func_decl(self, stmt: FuncDecl) -> None:
-        # semântica deve ter inferido retorno e colocado na tabela (global)
-        sym = self.tabela.buscar(stmt.nome)
+        # semântica deve ter inferido o retorno e ligado o símbolo à declaração
+        sym = self.simbolos[stmt.nid]
         if sym is None or getattr(sym, "kind", None) != "func" or getattr(sym, "retorno", None) is None:
             raise RuntimeError(f"Tipo de retorno da função '{stmt.nome}' não disponível para geração.")
 
@@ -122,56 +156,42 @@ class GeradorC:
         if ret_tipo == "cadeia":
             raise RuntimeError("Função retornando 'cadeia' não suportada nesta versão.")
 
-        params = self._params_c(stmt.params)
-        self._emit(f"{self._c_tipo(ret_tipo)} {stmt.nome}({params}) " + "{")
+        return f"{self._c_tipo(ret_tipo)} {stmt.nome}({params})"
+
+    # Um método por classe de comando, chamado por visitar(); os compostos
+    # (rotinas, se, enquanto) devolvem o gerador dos seus blocos
+    def _nao_suportado(self, no: Stmt) -> None:
+        raise ValueError(f"Stmt não suportado: {type(no).__name__}")
+
+    def _proc_decl(self, stmt: ProcDecl) -> Generator:
+        self._emit(self._assinatura(stmt) + " {")
         self._indent += 1
-        for s in stmt.body:
-            self._stmt_rotina(s)
+        yield stmt.body
         self._indent -= 1
         self._emit("}")
 
-    # statements (main)
-    def _stmt(self, stmt: Stmt) -> None:
-        if isinstance(stmt, VarDecl):
-            self._var_decl(stmt)
-            return
-        if isinstance(stmt, Assign):
-            self._assign(stmt)
-            return
-        if isinstance(stmt, Write):
-            self._write(stmt)
-            return
-        if isinstance(stmt, If):
-            self._if(stmt)
-            return
-        if isinstance(stmt, While):
-            self._while(stmt)
-            return
-        if isinstance(stmt, CallStmt):
-            self._call_stmt(stmt)
-            return
-        raise ValueError(f"Stmt não suportado: {type(stmt).__name__}")
-
-    def _stmt_rotina(self, stmt: Stmt) -> None:
-        if isinstance(stmt, Return):
-            self._return(stmt)
-            return
-        self._stmt(stmt)
+    def _func_decl(self, stmt: FuncDecl) -> Generator:
+        self._emit(self._assinatura(stmt) + " {")
+        self._indent += 1
+        yield stmt.body
+        self._indent -= 1
+        self._emit("}")
 
     def _var_decl(self, stmt: VarDecl) -> None:
         if stmt.tipo == "cadeia":
             self._emit(f"char {stmt.nome}[100];")
-        else:
-            self._emit(f"{self._c_tipo(stmt.tipo)} {stmt.nome};")
+            return
+        tipo = self.tipos.variaveis.get(stmt.nid)
+        self._emit(f"{tipo or self._c_tipo(stmt.tipo)} {stmt.nome};")
 
     def _assign(self, stmt: Assign) -> None:
-        sym = self.tabela.buscar(stmt.nome)
+        sym = self.simbolos[stmt.nid]
         if sym is None or getattr(sym, "kind", None) != "var":
             raise RuntimeError(f"Variável '{stmt.nome}' não encontrada na geração de código.")
 
         tipo_var = sym.tipo
 
-        tipo_expr = self.tipos_expr.get(id(stmt.expr))
+        tipo_expr = self.tipos_expr[stmt.expr.nid]
         if tipo_expr is None:
             raise RuntimeError("Tipo da expressão não encontrado (semântica não preencheu tipos_expr).")
 
@@ -187,34 +207,31 @@ class GeradorC:
             self._emit(f"{stmt.nome} = {rhs};")
 
     def _write(self, stmt: Write) -> None:
-        tipo = self.tipos_expr[id(stmt.expr)]
-        fmt = self._printf_fmt(tipo)
+        tipo = self.tipos_expr[stmt.expr.nid]
+        fmt = "%lld" if stmt.expr.nid in self.tipos.largas else self._printf_fmt(tipo)
         expr_c = self._expr(stmt.expr)
         self._emit(f'printf("{fmt}", {expr_c});')
 
-    def _if(self, stmt: If) -> None:
+    def _if(self, stmt: If) -> Generator:
         cond_c = self._expr(stmt.cond)
         self._emit(f"if ({cond_c}) " + "{")
         self._indent += 1
-        for s in stmt.then_block:
-            self._stmt_rotina(s)
+        yield stmt.then_block
         self._indent -= 1
         self._emit("}")
 
         if stmt.else_block is not None:
             self._emit("else {")
             self._indent += 1
-            for s in stmt.else_block:
-                self._stmt_rotina(s)
+            yield stmt.else_block
             self._indent -= 1
             self._emit("}")
 
-    def _while(self, stmt: While) -> None:
+    def _while(self, stmt: While) -> Generator:
         cond_c = self._expr(stmt.cond)
         self._emit(f"while ({cond_c}) " + "{")
         self._indent += 1
-        for s in stmt.block:
-            self._stmt_rotina(s)
+        yield stmt.block
         self._indent -= 1
         self._emit("}")
 
@@ -228,19 +245,52 @@ class GeradorC:
 
     # Expressions
     def _expr(self, expr: Expr) -> str:
-        if isinstance(expr, NumInt):
-            return str(expr.valor)
-        if isinstance(expr, NumReal):
-            return str(expr.valor)
-        if isinstance(expr, StrLit):
-            return '"' + expr.valor.replace('"', '\\"') + '"'
-        if isinstance(expr, VarRef):
-            return expr.nome
-        if isinstance(expr, Call):
-            args = ", ".join(self._expr(a) for a in expr.args)
-            return f"{expr.nome}({args})"
-        if isinstance(expr, BinOp):
-            return f"({self._expr(expr.left)} {expr.op} {self._expr(expr.right)})"
-        if isinstance(expr, Compare):
-            return f"({self._expr(expr.left)} {expr.op} {self._expr(expr.right)})"
-        raise ValueError(f"Expr não suportada: {type(expr).__name__}")
+        """
+        Texto C de `expr`, montado em ordem com uma pilha explícita de nós e
+        trechos de texto a emitir depois deles. As partes são juntadas uma
+        vez só no fim: concatenar a cada nível seria quadrático numa cadeia
+        longa de operadores.
+        """
+        promovidas = self.tipos.promovidas
+        partes: list[str] = []
+        pilha: list[Expr | str] = [expr]
+
+        while pilha:
+            node = pilha.pop()
+            classe = node.__class__
+
+            # desce pelo lado esquerdo (os operadores associam à esquerda,
+            # então é por ali que as cadeias crescem), deixando na pilha o
+            # que vem à direita
+            while classe is BinOp or classe is Compare:
+                # a conta que passaria de 32 bits é feita em long long
+                partes.append("((long long)" if node.nid in promovidas else "(")
+                direita = node.right
+                if direita.__class__ is VarRef:
+                    pilha.append(f" {node.op} {direita.nome})")
+                else:
+                    pilha.append(")")
+                    pilha.append(direita)
+                    pilha.append(f" {node.op} ")
+                node = node.left
+                classe = node.__class__
+
+            if classe is str:
+                partes.append(node)
+            elif classe is VarRef:
+                partes.append(node.nome)
+            elif classe is NumInt or classe is NumReal:
+                partes.append(str(node.valor))
+            elif classe is StrLit:
+                partes.append('"' + node.valor.replace('"', '\\"') + '"')
+            elif classe is Call:
+                partes.append(f"{node.nome}(")
+                pilha.append(")")
+                for k in range(len(node.args) - 1, -1, -1):
+                    pilha.append(node.args[k])
+                    if k:
+                        pilha.append(", ")
+            else:
+                raise ValueError(f"Expr não suportada: {classe.__name__}")
+
+        return "".join(partes)
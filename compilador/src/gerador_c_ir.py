@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from .ir import CADEIA, INT, Const, FuncaoIR, Instr, Operando, ProgramaIR
+from .ssa import desfazer_ssa
+
+
+class GeradorCIR:
+    """
+    Gera C a partir da IR de ir.py: cada FuncaoIR vira uma função com as
+    variáveis declaradas no começo e um rótulo por bloco básico que recebe
+    desvios; os desvios viram goto, menos o que vai para o bloco seguinte.
+    Se o programa estiver em SSA, ele sai dela antes (ver
+    ssa.desfazer_ssa).
+
+    Cada instrução é um comando C com no máximo um operador, então não há
+    expressões aninhadas nem percursos recursivos aqui.
+    """
+
+    def __init__(self) -> None:
+        self._out: list[str] = []
+
+    def gerar(self, programa: ProgramaIR) -> str:
+        self._out = []
+        desfazer_ssa(programa)
+
+        # cabeçalho
+        self._emit("#include <stdio.h>")
+        self._emit("#include <string.h>")
+        self._emit("")
+
+        # protótipos: uma rotina pode chamar outra declarada depois dela
+        for funcao in programa.rotinas:
+            self._emit(self._assinatura(funcao) + ";")
+        if programa.rotinas:
+            self._emit("")
+
+        for funcao in programa.rotinas:
+            self._funcao(funcao)
+            self._emit("")
+        self._funcao(programa.principal)
+
+        return "\n".join(self._out)
+
+    def _emit(self, line: str) -> None:
+        self._out.append(line)
+
+    def _assinatura(self, funcao: FuncaoIR) -> str:
+        if funcao.nome is None:
+            return "int main()"
+        partes = []
+        for p in funcao.params:
+            variavel = funcao.variaveis[p]
+            if variavel.tipo == CADEIA:
+                partes.append(f"char {variavel.nome}[100]")
+            else:
+                partes.append(f"{variavel.tipo} {variavel.nome}")
+        params = ", ".join(partes) if partes else "void"
+        return f"{funcao.retorno or 'void'} {funcao.nome}({params})"
+
+    def _funcao(self, funcao: FuncaoIR) -> None:
+        nomes = [v.nome for v in funcao.variaveis]
+
+        def op(x: Operando) -> str:
+            if x.__class__ is not Const:
+                return nomes[x]
+            if x.tipo == CADEIA:
+                return '"' + x.valor.replace('"', '\\"') + '"'
+            return str(x.valor)
+
+        self._emit(self._assinatura(funcao) + " {")
+        # só as variáveis que aparecem em alguma instrução são declaradas
+        usadas: set[int] = set()
+        for bloco in funcao.blocos:
+            for instr in bloco.instrs:
+                usadas.add(instr.dest)
+                usadas.update(instr.args)
+            if bloco.fim[0] != "vai":
+                usadas.add(bloco.fim[1])
+        usadas.difference_update(funcao.params)
+        for i, variavel in enumerate(funcao.variaveis):
+            if i not in usadas:
+                continue
+            if variavel.tipo == CADEIA:
+                self._emit(f"  char {variavel.nome}[100];")
+            else:
+                self._emit(f"  {variavel.tipo} {variavel.nome};")
+
+        # só ganham rótulo os blocos para os quais algum outro desvia
+        rotulados: set[int] = set()
+        for b in range(len(funcao.blocos)):
+            for s in funcao.sucessores(b):
+                if s != b + 1:
+                    rotulados.add(s)
+
+        for b, bloco in enumerate(funcao.blocos):
+            if b in rotulados:
+                self._emit(f" L{b}:;")
+            for instr in bloco.instrs:
+                self._emit("  " + self._instr(instr, funcao, op))
+
+            fim = bloco.fim
+            if fim[0] == "vai":
+                if fim[1] != b + 1:
+                    self._emit(f"  goto L{fim[1]};")
+            elif fim[0] == "se":
+                if fim[3] == b + 1:
+                    self._emit(f"  if ({op(fim[1])}) goto L{fim[2]};")
+                elif fim[2] == b + 1:
+                    self._emit(f"  if (!{op(fim[1])}) goto L{fim[3]};")
+                else:
+                    self._emit(f"  if ({op(fim[1])}) goto L{fim[2]};")
+                    self._emit(f"  goto L{fim[3]};")
+            elif fim[1] is None:
+                self._emit("  return;")
+            else:
+                self._emit(f"  return {op(fim[1])};")
+        self._emit("}")
+
+    def _instr(self, instr: Instr, funcao: FuncaoIR, op) -> str:
+        args = instr.args
+        if instr.op == "escreva":
+            tipo = funcao.tipo(args[0])
+            fmt = "%d" if tipo == INT else "%s" if tipo == CADEIA else "%f"
+            return f'printf("{fmt}", {op(args[0])});'
+        if instr.op == "chamada":
+            chamada = f"{instr.rotina}({', '.join(map(op, args))});"
+            if instr.dest is None:
+                return chamada
+            return f"{op(instr.dest)} = {chamada}"
+        if instr.op == "copia":
+            if funcao.variaveis[instr.dest].tipo == CADEIA:
+                return f"strcpy({op(instr.dest)}, {op(args[0])});"
+            return f"{op(instr.dest)} = {op(args[0])};"
+        if instr.op == "phi":
+            raise ValueError("Instrução phi fora de SSA")
+        return f"{op(instr.dest)} = {op(args[0])} {instr.op} {op(args[1])};"
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Sequence
+
+from .ast_nodes import (
+    Assign,
+    BinOp,
+    Call,
+    CallStmt,
+    Compare,
+    FuncDecl,
+    If,
+    ProcDecl,
+    Return,
+    Stmt,
+    While,
+    Write,
+)
+
+
+def chamadas(comandos: Iterable[Stmt]) -> set[str]:
+    """Nomes das rotinas chamadas em `comandos` e no que há dentro deles, sem recursão."""
+    nomes: set[str] = set()
+    pilha: list = list(comandos)
+    while pilha:
+        node = pilha.pop()
+        classe = node.__class__
+        if classe is Call:
+            nomes.add(node.nome)
+            pilha += node.args
+        elif classe is BinOp or classe is Compare:
+            pilha.append(node.left)
+            pilha.append(node.right)
+        elif classe is Assign or classe is Write or classe is Return:
+            pilha.append(node.expr)
+        elif classe is CallStmt:
+            pilha.append(node.call)
+        elif classe is If:
+            pilha.append(node.cond)
+            pilha += node.then_block
+            if node.else_block is not None:
+                pilha += node.else_block
+        elif classe is While:
+            pilha.append(node.cond)
+            pilha += node.block
+    return nomes
+
+
+class GrafoChamadas:
+    """
+    Quem chama quem entre as rotinas de um programa. `arestas[i]` são os
+    índices (em `rotinas`) das rotinas que a i-ésima chama, em ordem e sem
+    repetição. Um nome é a primeira rotina declarada com ele, como na
+    tabela de símbolos; chamadas a nomes que não são rotinas ficam de fora.
+
+    `nomes_chamados`, se dado, é chamadas(r.body) para cada rotina r, já
+    calculado (ver AnalisadorSemantico._rotinas_em_paralelo).
+    """
+
+    def __init__(
+        self,
+        rotinas: Sequence[ProcDecl | FuncDecl],
+        nomes_chamados: Sequence[set[str]] | None = None,
+    ) -> None:
+        self.rotinas = rotinas
+        self.indice: dict[str, int] = {}
+        for i, rotina in enumerate(rotinas):
+            self.indice.setdefault(rotina.nome, i)
+
+        if nomes_chamados is None:
+            nomes_chamados = [chamadas(r.body) for r in rotinas]
+        self.arestas: list[list[int]] = [
+            sorted({self.indice[n] for n in nomes if n in self.indice})
+            for nomes in nomes_chamados
+        ]
+
+    def componentes(self, so_funcoes: bool = False) -> list[list[int]]:
+        """
+        Componentes fortemente conexas, em ordem topológica reversa: cada
+        uma vem depois de todas as que ela chama. Dentro de uma componente
+        os índices ficam em ordem crescente. Com `so_funcoes`, só contam as
+        chamadas a funções, as que têm tipo de retorno.
+
+        É o algoritmo de Tarjan, com uma pilha explícita em vez de recursão,
+        em O(rotinas + chamadas).
+        """
+        arestas = self.arestas
+        if so_funcoes:
+            funcao = [isinstance(r, FuncDecl) for r in self.rotinas]
+            arestas = [[j for j in saidas if funcao[j]] for saidas in arestas]
+
+        n = len(arestas)
+        ordem = [-1] * n  # ordem de descoberta
+        menor = [0] * n  # menor ordem alcançável pela subárvore
+        na_pilha = [False] * n
+        pilha: list[int] = []
+        resultado: list[list[int]] = []
+        contador = 0
+
+        for raiz in range(n):
+            if ordem[raiz] >= 0:
+                continue
+            # (vértice, próxima aresta a olhar)
+            caminho = [(raiz, 0)]
+            ordem[raiz] = menor[raiz] = contador
+            contador += 1
+            pilha.append(raiz)
+            na_pilha[raiz] = True
+
+            while caminho:
+                v, k = caminho[-1]
+                saidas = arestas[v]
+                if k < len(saidas):
+                    caminho[-1] = (v, k + 1)
+                    w = saidas[k]
+                    if ordem[w] < 0:
+                        ordem[w] = menor[w] = contador
+                        contador += 1
+                        pilha.append(w)
+                        na_pilha[w] = True
+                        caminho.append((w, 0))
+                    elif na_pilha[w] and ordem[w] < menor[v]:
+                        menor[v] = ordem[w]
+                    continue
+
+                caminho.pop()
+                if caminho:
+                    u = caminho[-1][0]
+                    if menor[v] < menor[u]:
+                        menor[u] = menor[v]
+                if menor[v] == ordem[v]:
+                    componente = []
+                    while True:
+                        w = pilha.pop()
+                        na_pilha[w] = False
+                        componente.append(w)
+                        if w == v:
+                            break
+                    componente.sort()
+                    resultado.append(componente)
+
+        return resultado
+
+    def recursiva(self, componente: list[int]) -> bool:
+        """Se a componente tem um ciclo: mais de uma rotina, ou uma que chama a si mesma."""
+        return len(componente) > 1 or componente[0] in self.arestas[componente[0]]
@@ -0,0 +1,699 @@
+from __future__ import annotations
+
+import math
+from collections.abc import Generator, Iterator
+from dataclasses import dataclass, field
+
+from .ast_nodes import (
+    Program,
+    Stmt,
+    VarDecl,
+    Assign,
+    Write,
+    If,
+    While,
+    ProcDecl,
+    FuncDecl,
+    CallStmt,
+    Return,
+    Expr,
+    NumInt,
+    NumReal,
+    StrLit,
+    VarRef,
+    BinOp,
+    Compare,
+    Call,
+)
+from .grafo_chamadas import GrafoChamadas
+from .propagacao_constantes import atribuidas
+from .tabela_simbolos import SimboloRotina, SimboloVar
+from .visitante import Visitante
+
+# Um intervalo fechado [mínimo, máximo]; os limites são int, ou ±inf sem
+# limite conhecido. Um estado (variável -> intervalo) None é inalcançável.
+Intervalo = tuple[int | float, int | float]
+Estado = dict[int, Intervalo] | None
+
+INF = math.inf
+TUDO: Intervalo = (-INF, INF)
+
+# Tipos inteiros do C, do menor para o maior, com os valores que cabem
+TIPOS_INTEIROS: list[tuple[str, Intervalo]] = [
+    ("signed char", (-(2**7), 2**7 - 1)),
+    ("short", (-(2**15), 2**15 - 1)),
+    ("int", (-(2**31), 2**31 - 1)),
+    ("long long", (-(2**63), 2**63 - 1)),
+]
+INT32 = TIPOS_INTEIROS[2][1]
+INT64 = TIPOS_INTEIROS[3][1]
+FINITO: Intervalo = (-1.7976931348623157e308, 1.7976931348623157e308)
+
+# Acima disto (2^24) um float não guarda todos os inteiros, e o %f de
+# escreva mostra a diferença já na parte inteira
+FLOAT_EXATO = 2**24
+
+# 'enquanto' aninhados em mais níveis que isto não são iterados até o
+# ponto fixo: as variáveis atribuídas no corpo ficam sem limite. Cada nível
+# iterado multiplica o trabalho dos de dentro por umas cinco passadas.
+PROFUNDIDADE_ITERADA = 2
+
+
+@dataclass(slots=True)
+class TiposC:
+    """
+    O que AnaliseIntervalos decidiu: o tipo C de cada variável declarada,
+    pelo nid do VarDecl dela; os nids dos BinOp inteiros que o gerador calcula
+    em long long (um cast no operando da esquerda) e os nids das expressões
+    inteiras que ficam long long, para o formato de escreva. `relatorio`
+    tem as linhas de --explicar-tipos.
+    """
+
+    variaveis: dict[int, str] = field(default_factory=dict)
+    promovidas: set[int] = field(default_factory=set)
+    largas: set[int] = field(default_factory=set)
+    relatorio: list[str] = field(default_factory=list)
+
+
+class AnaliseIntervalos(Visitante):
+    """
+    Interpretação abstrata com intervalos sobre a AST já otimizada: acha,
+    para cada variável inteiro e real, o intervalo dos valores que as
+    atribuições guardam nela, e para cada operação inteira o dos valores
+    que ela calcula. Com isso escolhe tipos C:
+
+    - inteiro que cabe em 8 ou 16 bits vira signed char ou short;
+    - inteiro ou operação inteira que passa de 32 bits, com um limite
+      que cabe em 64, vira long long (a operação, com um cast), em vez de
+      estourar o int;
+    - real cujo valor passa de 2^24 em módulo, com limite conhecido, vira
+      double, porque o float já perderia dígitos que escreva mostra.
+
+    Sem limite provado, fica o tipo de sempre. Parâmetros e retornos de
+    rotina mantêm os tipos declarados; os parâmetros valem qualquer valor
+    do tipo, e as funções não recursivas devolvem o intervalo dos seus
+    'retorne' (as rotinas são analisadas das chamadas para as que chamam).
+
+    Um 'se' junta os estados dos dois caminhos, refinados pela condição
+    quando ela compara uma variável. Um 'enquanto' itera o corpo até o
+    estado da entrada parar de crescer, alargando para ±inf os limites que
+    ainda crescem depois da segunda volta, e refaz uma volta para
+    estreitar; só a última passada, já sobre um estado válido, registra os
+    intervalos. Os blocos aninhados são percorridos sem recursão.
+    """
+
+    def __init__(
+        self,
+        simbolos: list[SimboloVar | SimboloRotina | None],
+        tipos_expr: list[str | None],
+    ) -> None:
+        # ambos vêm de AnalisadorSemantico (e dos passes de otimizar)
+        self.simbolos = simbolos
+        self.tipos_expr = tipos_expr
+        self._estado: Estado = {}
+        # se a passada atual registra o que vê (fora das voltas de um laço)
+        self._registrar = True
+        self._profundidade = 0
+        # id do símbolo -> união dos valores atribuídos
+        self._atribuidos: dict[int, Intervalo] = {}
+        # nid de um BinOp inteiro -> união dos valores calculados
+        self._calculados: dict[int, Intervalo] = {}
+        # nome da função -> união dos valores devolvidos
+        self._retornos: dict[str, Intervalo] = {}
+        self._retorno: Intervalo | None = None
+        # (nome da rotina ou None, VarDecl) de cada declaração, em ordem
+        self._declaradas: list[tuple[str | None, VarDecl]] = []
+        # variáveis (ids dos símbolos) e operações (nids) seguidas com
+        # valores exatos além de 32 bits, e as que ficam no int (ver
+        # analisar)
+        self._largas: set[int] = set()
+        self._nos_largos: set[int] = set()
+        self._sem_limite: set[int] = set()
+        self._nos_sem_limite: set[int] = set()
+        self._nome_rotina: str | None = None
+        self._atribuidas_em: dict[int, set[int]] = {}
+
+    def analisar(self, program: Program) -> TiposC:
+        rotinas = [s for s in program.comandos if isinstance(s, (ProcDecl, FuncDecl))]
+        principal = [s for s in program.comandos if not isinstance(s, (ProcDecl, FuncDecl))]
+        grafo = GrafoChamadas(rotinas)
+        componentes = grafo.componentes()
+
+        while True:
+            self._atribuidos, self._calculados, self._retornos = {}, {}, {}
+            self._declaradas = []
+            self._largas, self._nos_largos = set(), set()
+            for componente in componentes:
+                recursiva = grafo.recursiva(componente)
+                for i in componente:
+                    rotina = rotinas[i]
+                    self._rotina(rotina.nome, rotina.body)
+                    if isinstance(rotina, FuncDecl) and not recursiva:
+                        self._guardar_retorno(rotina)
+            self._rotina(None, principal)
+
+            # uma variável ou operação que passa de 32 bits é seguida com o
+            # valor exato, como se fosse long long, até que algum valor dela
+            # passe de 64 bits: aí ela fica int (sem limite), e o valor dá
+            # a volta. Se as duas coisas aconteceram, a análise é refeita
+            # com ela int desde o começo.
+            if not self._largas & self._sem_limite and not (
+                self._nos_largos & self._nos_sem_limite
+            ):
+                return self._decidir(program)
+
+    def _rotina(self, nome: str | None, corpo: list[Stmt]) -> None:
+        self._estado = {}
+        self._registrar = True
+        self._retorno = None
+        self._nome_rotina = nome
+        self._bloco(corpo)
+
+    def _guardar_retorno(self, rotina: FuncDecl) -> None:
+        retorno = self._retorno
+        sym = self.simbolos[rotina.nid]
+        if retorno is None:
+            return
+        if sym.retorno == "inteiro" and not _dentro(retorno, INT32):
+            # o valor é convertido para o int do retorno
+            retorno = INT32
+        self._retornos[rotina.nome] = retorno
+
+    def _bloco(self, stmts: list[Stmt]) -> None:
+        """
+        Interpreta `stmts` e os blocos aninhados neles sem recursão:
+        comandos compostos são geradores que fazem `yield` de cada bloco
+        interno (um 'enquanto', do corpo uma vez por volta) e continuam
+        depois que ele foi interpretado, com o estado em `_estado`.
+        """
+        visitar = self.visitar
+        pilha: list[tuple[Generator | None, Iterator[Stmt]]] = []
+        gerador: Generator | None = None
+        comandos = iter(stmts)
+
+        while True:
+            for stmt in comandos:
+                sub = visitar(stmt)
+                if sub is not None:
+                    pilha.append((gerador, comandos))
+                    gerador = sub
+                    break
+
+            if gerador is None:
+                return
+            bloco = next(gerador, None)
+            if bloco is None:
+                gerador, comandos = pilha.pop()
+            else:
+                comandos = iter(bloco)
+
+    # Um método por classe de comando, chamado por visitar(): os simples
+    # atualizam _estado; os compostos devolvem o gerador dos seus blocos
+    def _var_decl(self, stmt: VarDecl) -> None:
+        sym = self.simbolos[stmt.nid]
+        if self._registrar:
+            self._declaradas.append((self._nome_rotina, stmt))
+        if self._estado is not None and stmt.tipo != "cadeia":
+            # sem valor ainda: qualquer um do tipo
+            self._estado[id(sym)] = INT32 if stmt.tipo == "inteiro" else TUDO
+
+    def _assign(self, stmt: Assign) -> None:
+        if self._estado is None:
+            return
+        sym = self.simbolos[stmt.nid]
+        if sym.tipo == "cadeia":
+            return
+        valor = self._avaliar(stmt.expr)
+        chave = id(sym)
+        if self._registrar:
+            anterior = self._atribuidos.get(chave)
+            self._atribuidos[chave] = valor if anterior is None else _uniao(anterior, valor)
+        if sym.tipo == "inteiro" and not _dentro(valor, INT32):
+            if not _dentro(valor, INT64):
+                self._sem_limite.add(chave)
+            if chave in self._sem_limite:
+                # a variável fica int, e o valor guardado é algum int
+                valor = INT32
+            else:
+                self._largas.add(chave)
+        self._estado[chave] = valor
+
+    def _write(self, stmt: Write) -> None:
+        if self._estado is not None:
+            self._avaliar(stmt.expr)
+
+    def _call_stmt(self, stmt: CallStmt) -> None:
+        if self._estado is not None:
+            self._avaliar(stmt.call)
+
+    def _return(self, stmt: Return) -> None:
+        if self._estado is None:
+            return
+        valor = self._avaliar(stmt.expr)
+        if self._registrar:
+            self._retorno = valor if self._retorno is None else _uniao(self._retorno, valor)
+        self._estado = None
+
+    def _if(self, stmt: If) -> Generator:
+        estado = self._estado
+        if estado is None:
+            return
+        self._avaliar(stmt.cond)
+
+        self._estado = self._refinar(estado, stmt.cond, True)
+        yield stmt.then_block
+        depois_entao = self._estado
+
+        if stmt.else_block is not None:
+            self._estado = self._refinar(estado, stmt.cond, False)
+            yield stmt.else_block
+            depois_senao = self._estado
+        else:
+            depois_senao = self._refinar(estado, stmt.cond, False)
+        self._estado = _juntar(depois_entao, depois_senao)
+
+    def _while(self, stmt: While) -> Generator:
+        entrada = self._estado
+        if entrada is None:
+            return
+
+        self._profundidade += 1
+        if self._profundidade > PROFUNDIDADE_ITERADA:
+            # fundo demais para iterar: o que o corpo atribui fica sem limite
+            cabeca = dict(entrada)
+            for chave in atribuidas(stmt, self.simbolos, self._atribuidas_em):
+                cabeca[chave] = TUDO
+        else:
+            registrar, self._registrar = self._registrar, False
+            cabeca = entrada
+            voltas = 0
+            while True:
+                self._estado = self._refinar(cabeca, stmt.cond, True)
+                yield stmt.block
+                # juntar com cabeca, e não com a entrada, faz a sequência
+                # só crescer: um corpo como t = 0 - t oscilaria
+                novo = _juntar(cabeca, self._estado)
+                if voltas >= 1:
+                    novo = _alargar(cabeca, novo)
+                if _contido(novo, cabeca):
+                    break
+                cabeca = novo
+                voltas += 1
+
+            # cabeca já cobre tudo o que o laço alcança; mais uma volta a
+            # partir dela só pode estreitar
+            self._estado = self._refinar(cabeca, stmt.cond, True)
+            yield stmt.block
+            cabeca = _juntar(entrada, self._estado)
+            self._registrar = registrar
+
+        # a passada que vale, só quando se registra: para a saída basta
+        # cabeca. Os laços de dentro contam este como aberto nela também,
+        # senão cada nível voltaria a iterar os seus.
+        if self._registrar:
+            self._avaliar(stmt.cond, cabeca)
+            self._estado = self._refinar(cabeca, stmt.cond, True)
+            yield stmt.block
+        self._estado = self._refinar(cabeca, stmt.cond, False)
+        self._profundidade -= 1
+
+    # Expressões
+    def _avaliar(
+        self, expr: Expr, estado: Estado = None, registrar: bool | None = None
+    ) -> Intervalo:
+        """
+        Intervalo dos valores de `expr` em `estado` (o atual, se None), em pós-ordem com
+        uma pilha explícita; o marcador `(node,)` combina os intervalos dos
+        filhos, que estão no topo de `valores`. Registra o intervalo de
+        cada operação inteira (ver _registrar). Comparações valem TUDO.
+        """
+        if registrar is None:
+            registrar = self._registrar
+        if estado is None:
+            estado = self._estado
+        simbolos = self.simbolos
+        tipos_expr = self.tipos_expr
+        valores: list[Intervalo] = []
+        pilha: list = [expr]
+
+        while pilha:
+            node = pilha.pop()
+            classe = node.__class__
+
+            if classe is tuple:
+                node = node[0]
+                classe = node.__class__
+                if classe is Call:
+                    del valores[len(valores) - len(node.args) :]
+                    sym = simbolos[node.nid]
+                    valor = self._retornos.get(node.nome)
+                    if valor is None:
+                        valor = INT32 if sym.retorno == "inteiro" else TUDO
+                    valores.append(valor)
+                    continue
+                direita = valores.pop()
+                esquerda = valores.pop()
+                if classe is Compare:
+                    valores.append(TUDO)
+                    continue
+                inteiro = tipos_expr[node.nid] == "inteiro"
+                valor = _operar(node.op, esquerda, direita, inteiro)
+                if inteiro and not _dentro(valor, INT32):
+                    if not _dentro(valor, INT64):
+                        self._nos_sem_limite.add(node.nid)
+                    if node.nid in self._nos_sem_limite:
+                        valor = TUDO
+                    else:
+                        self._nos_largos.add(node.nid)
+                if inteiro and registrar:
+                    anterior = self._calculados.get(node.nid)
+                    self._calculados[node.nid] = (
+                        valor if anterior is None else _uniao(anterior, valor)
+                    )
+                valores.append(valor)
+            elif classe is VarRef:
+                sym = simbolos[node.nid]
+                valor = estado.get(id(sym))
+                if valor is None:
+                    # parâmetro ainda não atribuído
+                    valor = INT32 if sym.tipo == "inteiro" else TUDO
+                valores.append(valor)
+            elif classe is NumInt or classe is NumReal:
+                valores.append((node.valor, node.valor))
+            elif classe is StrLit:
+                valores.append(TUDO)
+            elif classe is BinOp or classe is Compare:
+                pilha.append((node,))
+                pilha.append(node.right)
+                pilha.append(node.left)
+            elif classe is Call:
+                pilha.append((node,))
+                pilha += node.args
+            else:
+                raise ValueError(f"Expr não suportada: {classe.__name__}")
+
+        return valores[0]
+
+    def _refinar(self, estado: Estado, cond: Expr, verdade: bool) -> Estado:
+        """
+        Cópia de `estado` restrita ao caminho em que `cond` é `verdade`,
+        quando ela compara uma variável inteiro ou real com outra
+        expressão. None se o caminho é impossível. Os comandos do caminho
+        mudam a cópia, não `estado`.
+        """
+        if estado is None:
+            return None
+        refinado = dict(estado)
+        if cond.__class__ is not Compare:
+            return refinado
+        op = cond.op if verdade else _NEGACAO[cond.op]
+
+        for lado, outro, relacao in (
+            (cond.left, cond.right, op),
+            (cond.right, cond.left, _INVERSA[op]),
+        ):
+            if lado.__class__ is not VarRef:
+                continue
+            sym = self.simbolos[lado.nid]
+            if sym.tipo == "cadeia":
+                continue
+            chave = id(sym)
+            atual = refinado.get(chave) or (INT32 if sym.tipo == "inteiro" else TUDO)
+            limite = self._avaliar(outro, estado, registrar=False)
+            if self.tipos_expr[outro.nid] == "real":
+                # o float do C arredonda: uma folga cobre a diferença
+                limite = (
+                    limite[0] - abs(limite[0]) * 1e-6 - 1e-6,
+                    limite[1] + abs(limite[1]) * 1e-6 + 1e-6,
+                )
+            novo = _restringir(atual, relacao, limite, sym.tipo == "inteiro")
+            if novo is None:
+                return None
+            refinado[chave] = novo
+        return refinado
+
+    # Decisão
+    def _decidir(self, program: Program) -> TiposC:
+        tipos = TiposC()
+        relatorio = tipos.relatorio
+        # id do símbolo -> tipo C, para as leituras em _expressoes_largas
+        por_simbolo: dict[int, str] = {}
+        rotina_atual: object = ()
+        for rotina, decl in self._declaradas:
+            if rotina != rotina_atual:
+                rotina_atual = rotina
+                relatorio.append(
+                    "programa principal:" if rotina is None else f"rotina {rotina}:"
+                )
+            sym = self.simbolos[decl.nid]
+            if sym.tipo == "cadeia":
+                continue
+            valores = self._atribuidos.get(id(sym))
+            if id(sym) in self._sem_limite:
+                tipo, motivo = "int", "pode passar de 64 bits"
+            else:
+                tipo, motivo = _tipo_variavel(sym.tipo, valores)
+            tipos.variaveis[decl.nid] = por_simbolo[id(sym)] = tipo
+            faixa = "nunca atribuída" if valores is None else _texto(valores)
+            relatorio.append(f"  {sym.tipo} {sym.nome}: {faixa} -> {tipo} ({motivo})")
+
+        self._expressoes_largas(program, tipos, por_simbolo)
+        relatorio.append(
+            f"{len(tipos.promovidas)} operações inteiras calculadas em long long"
+        )
+        return tipos
+
+    def _expressoes_largas(
+        self, program: Program, tipos: TiposC, por_simbolo: dict[int, str]
+    ) -> None:
+        """
+        Preenche tipos.largas (expressões inteiras que o C calcula em long
+        long) e tipos.promovidas (as que só chegam lá com um cast), de
+        baixo para cima em cada expressão do programa. `por_simbolo` é o
+        tipo C de cada variável pelo id do símbolo.
+        """
+        simbolos = self.simbolos
+        largas = tipos.largas
+        feitos: set[int] = set()
+
+        comandos: list = list(program.comandos)
+        while comandos:
+            stmt = comandos.pop()
+            classe = stmt.__class__
+            if classe is If:
+                comandos += stmt.then_block
+                if stmt.else_block is not None:
+                    comandos += stmt.else_block
+                raizes = [stmt.cond]
+            elif classe is While:
+                comandos += stmt.block
+                raizes = [stmt.cond]
+            elif classe is ProcDecl or classe is FuncDecl:
+                comandos += stmt.body
+                continue
+            elif classe is CallStmt:
+                raizes = [stmt.call]
+            elif classe is VarDecl:
+                continue
+            else:
+                raizes = [stmt.expr]
+
+            pilha: list = raizes
+            while pilha:
+                node = pilha.pop()
+                classe = node.__class__
+                if classe is tuple:
+                    node = node[0]
+                    if node.__class__ is BinOp and self.tipos_expr[node.nid] == "inteiro":
+                        if node.left.nid in largas or node.right.nid in largas:
+                            largas.add(node.nid)
+                        elif node.nid not in self._nos_sem_limite and not _dentro(
+                            self._calculados.get(node.nid, INT32), INT32
+                        ):
+                            tipos.promovidas.add(node.nid)
+                            largas.add(node.nid)
+                elif node.nid in feitos:
+                    continue
+                elif classe is VarRef:
+                    feitos.add(node.nid)
+                    if por_simbolo.get(id(simbolos[node.nid])) == "long long":
+                        largas.add(node.nid)
+                elif classe is BinOp or classe is Compare:
+                    feitos.add(node.nid)
+                    pilha.append((node,))
+                    pilha.append(node.right)
+                    pilha.append(node.left)
+                elif classe is Call:
+                    feitos.add(node.nid)
+                    pilha += node.args
+
+
+def explicar(tipos: TiposC) -> str:
+    """O relatório de --explicar-tipos."""
+    return "\n".join(tipos.relatorio)
+
+
+def _tipo_variavel(tipo: str, valores: Intervalo | None) -> tuple[str, str]:
+    """Tipo C de uma variável de tipo Portugol `tipo` e o motivo."""
+    if tipo == "real":
+        if valores is None or not _dentro(valores, FINITO):
+            return "float", "sem limite provado"
+        if max(-valores[0], valores[1]) > FLOAT_EXATO:
+            return "double", "passa de 2^24, o float perderia dígitos"
+        return "float", "cabe na precisão do float"
+
+    if valores is None:
+        return "int", "nunca atribuída"
+    for nome, faixa in TIPOS_INTEIROS:
+        if _dentro(valores, faixa):
+            if nome == "int":
+                return nome, "cabe em 32 bits"
+            if nome == "long long":
+                return nome, "passa de 32 bits, estouraria o int"
+            return nome, f"cabe em {8 if nome == 'signed char' else 16} bits"
+    return "int", "sem limite provado"
+
+
+# op -> op do caminho falso, e op com os lados trocados
+_NEGACAO = {"<": ">=", ">=": "<", ">": "<=", "<=": ">", "==": "!=", "!=": "=="}
+_INVERSA = {"<": ">", ">": "<", "<=": ">=", ">=": "<=", "==": "==", "!=": "!="}
+
+
+def _dentro(a: Intervalo, b: Intervalo) -> bool:
+    return b[0] <= a[0] and a[1] <= b[1]
+
+
+def _uniao(a: Intervalo, b: Intervalo) -> Intervalo:
+    return (min(a[0], b[0]), max(a[1], b[1]))
+
+
+def _texto(a: Intervalo) -> str:
+    return "[" + ", ".join(_numero(x) for x in a) + "]"
+
+
+def _numero(x: int | float) -> str:
+    if x == INF:
+        return "+inf"
+    if x == -INF:
+        return "-inf"
+    return str(x)
+
+
+def _juntar(a: Estado, b: Estado) -> Estado:
+    """União de dois estados; as variáveis só de um lado saem de escopo."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return {chave: _uniao(valor, b[chave]) for chave, valor in a.items() if chave in b}
+
+
+def _alargar(velho: Estado, novo: Estado) -> Estado:
+    """`novo`, com os limites que cresceram desde `velho` levados a ±inf."""
+    if velho is None or novo is None:
+        return novo
+    alargado = {}
+    for chave, (menor, maior) in novo.items():
+        antes = velho.get(chave)
+        if antes is not None:
+            if menor < antes[0]:
+                menor = -INF
+            if maior > antes[1]:
+                maior = INF
+        alargado[chave] = (menor, maior)
+    return alargado
+
+
+def _contido(novo: Estado, velho: Estado) -> bool:
+    if novo is None:
+        return True
+    if velho is None:
+        return False
+    for chave, valor in novo.items():
+        antes = velho.get(chave)
+        if antes is not None and not _dentro(valor, antes):
+            return False
+    return True
+
+
+def _multiplicar(x: int | float, y: int | float) -> int | float:
+    # 0 * inf é 0 aqui: um lado que vale só 0 zera o produto
+    if x == 0 or y == 0:
+        return 0
+    return x * y
+
+
+def _dividir(x: int | float, y: int | float, inteiro: bool) -> int | float:
+    if math.isinf(y):
+        return 0
+    if math.isinf(x):
+        return x if y > 0 else -x
+    if not inteiro:
+        return x / y
+    # divisão do C, que trunca em direção a zero
+    q = abs(x) // abs(y)
+    return q if (x < 0) == (y < 0) else -q
+
+
+def _operar(op: str, a: Intervalo, b: Intervalo, inteiro: bool) -> Intervalo:
+    if op == "+":
+        return (a[0] + b[0], a[1] + b[1])
+    if op == "-":
+        return (a[0] - b[1], a[1] - b[0])
+    if op == "*":
+        cantos = [_multiplicar(x, y) for x in a for y in b]
+        return (min(cantos), max(cantos))
+
+    # divisão: o divisor 0 fica de fora (no C é indefinido)
+    partes = []
+    if b[0] < 0:
+        partes.append((b[0], min(b[1], -1 if inteiro else 0)))
+    if b[1] > 0:
+        partes.append((max(b[0], 1 if inteiro else 0), b[1]))
+    if not partes or (not inteiro and b[0] <= 0 <= b[1]):
+        return TUDO
+    cantos = [_dividir(x, y, inteiro) for x in a for parte in partes for y in parte]
+    return (min(cantos), max(cantos))
+
+
+def _restringir(
+    atual: Intervalo, op: str, limite: Intervalo, inteiro: bool
+) -> Intervalo | None:
+    """Os valores de `atual` que podem satisfazer `valor op limite`."""
+    menor, maior = atual
+    if op == "<":
+        teto = limite[1]
+        if inteiro and not math.isinf(teto):
+            teto = math.ceil(teto) - 1
+        maior = min(maior, teto)
+    elif op == "<=":
+        teto = limite[1]
+        if inteiro and not math.isinf(teto):
+            teto = math.floor(teto)
+        maior = min(maior, teto)
+    elif op == ">":
+        piso = limite[0]
+        if inteiro and not math.isinf(piso):
+            piso = math.floor(piso) + 1
+        menor = max(menor, piso)
+    elif op == ">=":
+        piso = limite[0]
+        if inteiro and not math.isinf(piso):
+            piso = math.ceil(piso)
+        menor = max(menor, piso)
+    elif op == "==":
+        menor, maior = max(menor, limite[0]), min(maior, limite[1])
+        if inteiro:
+            if not math.isinf(menor):
+                menor = math.ceil(menor)
+            if not math.isinf(maior):
+                maior = math.floor(maior)
+    elif limite[0] == limite[1] and inteiro:
+        # != um valor só: pode tirar uma ponta
+        if menor == limite[0]:
+            menor += 1
+        elif maior == limite[0]:
+            maior -= 1
+    if menor > maior:
+        return None
+    return (menor, maior)
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+from collections.abc import Generator
+
+from .ast_nodes import (
+    Program,
+    Stmt,
+    VarDecl,
+    Write,
+    If,
+    While,
+    ProcDecl,
+    FuncDecl,
+    CallStmt,
+    Expr,
+    NumInt,
+    NumReal,
+    VarRef,
+    BinOp,
+    Compare,
+    Call,
+)
+from .grafo_chamadas import GrafoChamadas
+from .propagacao_constantes import BOOL, CADEIA, DOUBLE, FLOAT, INT, atribuidas, tipo_comum
+from .reescrita import Reescrita
+from .tabela_simbolos import SimboloRotina, SimboloVar
+
+
+class MovimentoInvariantes(Reescrita):
+    """
+    Tira dos 'enquanto' as subexpressões que dão o mesmo valor em todas as
+    voltas, calculando-as uma vez antes do laço numa variável temporária.
+
+    Uma subexpressão é invariante num laço se nenhuma variável que ela lê
+    é atribuída (ou declarada) nele; ela sobe para antes do laço mais de
+    fora em que é invariante, inteira quando possível. Só sobem operações
+    e chamadas cujo tipo C é int ou float, o das variáveis que o gerador
+    declara: uma conta em double (com um literal real) guardada num float
+    perderia precisão.
+
+    Calcular antes do laço é calcular mesmo que ele não dê nenhuma volta,
+    ou que o comando nunca seja alcançado. Por isso, do corpo só sobe o
+    que não tem efeito nem pode falhar: sem chamadas e sem divisão inteira
+    (a não ser por uma constante que não é 0 nem -1). Da condição, que é
+    sempre calculada na entrada, sobem também a divisão e as chamadas de
+    funções puras, que não escrevem nem chamam procedimentos (direta ou
+    indiretamente) e, sem variáveis globais, só dependem dos argumentos.
+
+    Os nós novos (as temporárias, com nomes que o programa não usa) ganham
+    nids a partir de Program.n_nos, com tipo e símbolo acrescentados às
+    listas da semântica; os nós que não mudam são os mesmos objetos.
+    """
+
+    PREFIXO_TEMPORARIAS = "_inv"
+
+    def __init__(
+        self,
+        simbolos: list[SimboloVar | SimboloRotina | None],
+        tipos_expr: list[str | None],
+    ) -> None:
+        super().__init__(simbolos, tipos_expr)
+        # um item por 'enquanto' aberto, do mais de fora para o de dentro:
+        # os comandos que vão antes dele
+        self._antes: list[list[Stmt]] = []
+        # id do símbolo de uma variável -> índices (em _antes) dos laços
+        # abertos que a atribuem, em ordem, ou o do laço em que foi declarada
+        self._atribuida_em: dict[int, list[int]] = {}
+        self._declarada_em: dict[int, int] = {}
+        self._atribuidas_em: dict[int, set[int]] = {}
+        self._puras: set[str] = set()
+
+    def _comandos(self, program: Program) -> list[Stmt]:
+        self._puras = _funcoes_puras(program.comandos)
+        return self._bloco(program.comandos)
+
+    # Os outros comandos ficam com os métodos de Reescrita, que passam as
+    # expressões por _expr
+    def _var_decl(self, stmt: VarDecl) -> None:
+        if self._antes:
+            # o valor dela não existe antes do laço
+            self._declarada_em[id(self.simbolos[stmt.nid])] = len(self._antes) - 1
+        self._saida.append(stmt)
+
+    def _while(self, stmt: While) -> Generator:
+        nivel = len(self._antes)
+        mudam = atribuidas(stmt, self.simbolos, self._atribuidas_em)
+        for chave in mudam:
+            self._atribuida_em.setdefault(chave, []).append(nivel)
+        antes: list[Stmt] = []
+        self._antes.append(antes)
+
+        cond = self._expr(stmt.cond, na_condicao=True)
+        block = yield stmt.block
+
+        self._antes.pop()
+        for chave in mudam:
+            self._atribuida_em[chave].pop()
+
+        self._saida += antes
+        self._saida.append(self._enquanto_novo(stmt, cond, block))
+
+    # Expressions
+    def _expr(self, expr: Expr, na_condicao: bool = False) -> Expr:
+        """
+        `expr` com as subexpressões invariantes trocadas por temporárias,
+        cujas atribuições vão para antes do laço de cada uma.
+
+        Percorre a árvore em pós-ordem com uma pilha explícita; a marca
+        (node,) na pilha combina os filhos de `node`, que ficam em
+        `resultados` como (nó novo, nível, seguro, tipo C). O nível é o
+        índice do laço mais de fora em que o nó é invariante (len(_antes)
+        se não é em nenhum); seguro é não ter chamada nem divisão que
+        possa falhar.
+        """
+        abertos = len(self._antes)
+        if not abertos:
+            return expr
+
+        simbolos = self.simbolos
+        resultados: list[tuple[Expr, int, bool, int]] = []
+        pilha: list = [expr]
+
+        while pilha:
+            node = pilha.pop()
+            classe = node.__class__
+
+            if classe is NumInt:
+                resultados.append((node, 0, True, INT))
+            elif classe is NumReal:
+                resultados.append((node, 0, True, DOUBLE))
+            elif classe is VarRef:
+                sym = simbolos[node.nid]
+                em = self._atribuida_em.get(id(sym))
+                nivel = max(
+                    self._declarada_em.get(id(sym), -1), em[-1] if em else -1
+                ) + 1
+                tipo = {"inteiro": INT, "real": FLOAT}.get(sym.tipo, CADEIA)
+                resultados.append((node, nivel, True, tipo))
+
+            elif classe is BinOp or classe is Compare or classe is Call:
+                pilha.append((node,))
+                if classe is Call:
+                    pilha += reversed(node.args)
+                else:
+                    pilha.append(node.right)
+                    pilha.append(node.left)
+
+            elif classe is tuple:
+                node = node[0]
+                classe = node.__class__
+                n = len(node.args) if classe is Call else 2
+                filhos = resultados[len(resultados) - n :]
+                del resultados[len(resultados) - n :]
+
+                # o nó inteiro sobe junto com os filhos que iriam para o
+                # mesmo laço; os que vão para um laço mais de fora sobem
+                # sozinhos
+                alvo = self._alvo(node, *self._combinar(node, filhos), na_condicao)
+                for i, filho in enumerate(filhos):
+                    alvo_filho = self._alvo(*filho, na_condicao)
+                    if alvo_filho is not None and (alvo is None or alvo_filho < alvo):
+                        temporaria = self._subir(filho[0], filho[3], alvo_filho)
+                        filhos[i] = (temporaria, alvo_filho, True, filho[3])
+
+                novos = [f[0] for f in filhos]
+                if classe is Call:
+                    if any(a is not b for a, b in zip(novos, node.args)):
+                        node = Call(node.nome, novos, nid=node.nid)
+                elif novos[0] is not node.left or novos[1] is not node.right:
+                    node = classe(node.op, novos[0], novos[1], nid=node.nid)
+                resultados.append((node, *self._combinar(node, filhos)))
+
+            else:
+                resultados.append((node, 0, True, CADEIA))
+
+        resultado = resultados[0]
+        alvo = self._alvo(*resultado, na_condicao)
+        if alvo is None:
+            return resultado[0]
+        return self._subir(resultado[0], resultado[3], alvo)
+
+    def _combinar(
+        self, node: Expr, filhos: list[tuple[Expr, int, bool, int]]
+    ) -> tuple[int, bool, int]:
+        """Nível, seguro e tipo C de `node` a partir dos dos filhos."""
+        nivel = max((f[1] for f in filhos), default=0)
+        seguro = all(f[2] for f in filhos)
+        classe = node.__class__
+
+        if classe is Call:
+            if node.nome not in self._puras:
+                nivel = len(self._antes)
+            retorno = self.simbolos[node.nid].retorno
+            return nivel, False, {"inteiro": INT, "real": FLOAT}.get(retorno, CADEIA)
+        if classe is Compare:
+            return nivel, seguro, BOOL
+
+        tipo = tipo_comum(filhos[0][3], filhos[1][3])
+        if node.op == "/" and tipo == INT:
+            divisor = node.right
+            # x / 0 e INT_MIN / -1 param o programa
+            if divisor.__class__ is not NumInt or divisor.valor in (0, -1):
+                seguro = False
+        return nivel, seguro, tipo
+
+    def _alvo(
+        self, node: Expr, nivel: int, seguro: bool, tipo: int, na_condicao: bool
+    ) -> int | None:
+        """Índice do laço antes do qual `node` vai ser calculado, ou None se ele fica."""
+        classe = node.__class__
+        if (
+            (classe is not BinOp and classe is not Call)
+            or (tipo != INT and tipo != FLOAT)
+            or nivel >= len(self._antes)
+        ):
+            return None
+        if seguro:
+            return nivel
+        # na condição do laço de dentro, que é calculada na entrada dele
+        return len(self._antes) - 1 if na_condicao else None
+
+    def _subir(self, node: Expr, tipo: int, alvo: int) -> VarRef:
+        """Atribui `node` a uma temporária nova antes do laço `alvo` e devolve a leitura dela."""
+        atribuicao, leitura = self._temporaria(node, "inteiro" if tipo == INT else "real")
+        self._antes[alvo] += atribuicao
+        return leitura
+
+
+def _funcoes_puras(comandos: list[Stmt]) -> set[str]:
+    """
+    Nomes das funções de `comandos` que não escrevem nem chamam
+    procedimentos, direta ou indiretamente.
+    """
+    rotinas = [s for s in comandos if isinstance(s, (ProcDecl, FuncDecl))]
+    grafo = GrafoChamadas(rotinas)
+
+    impuras = []
+    for i, rotina in enumerate(rotinas):
+        if rotina.__class__ is ProcDecl:
+            impuras.append(i)
+            continue
+        pilha = list(rotina.body)
+        while pilha:
+            stmt = pilha.pop()
+            classe = stmt.__class__
+            if classe is Write or classe is CallStmt:
+                impuras.append(i)
+                break
+            if classe is If:
+                pilha += stmt.then_block
+                if stmt.else_block is not None:
+                    pilha += stmt.else_block
+            elif classe is While:
+                pilha += stmt.block
+
+    # quem chama uma rotina impura também é
+    chamadores: list[list[int]] = [[] for _ in rotinas]
+    for i, saidas in enumerate(grafo.arestas):
+        for j in saidas:
+            chamadores[j].append(i)
+    vistas = set(impuras)
+    while impuras:
+        for i in chamadores[impuras.pop()]:
+            if i not in vistas:
+                vistas.add(i)
+                impuras.append(i)
+
+    return {r.nome for i, r in enumerate(rotinas) if i not in vistas}
+
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+# Tipos C dos valores da IR: as variáveis 'real' e as rotinas que devolvem
+# 'real' são float, os literais reais são double, como no C que GeradorC gera
+INT, FLOAT, DOUBLE, CADEIA = "int", "float", "double", "char*"
+
+# Operadores das instruções de três endereços
+ARITMETICOS = ("+", "-", "*", "/")
+COMPARACOES = ("<", ">", "<=", ">=", "==", "!=")
+
+
+@dataclass(frozen=True, slots=True)
+class Const:
+    """Literal usado como operando: int, double ou cadeia."""
+
+    tipo: str
+    valor: int | float | str
+
+
+# Um operando é uma Const ou o índice de uma variável em FuncaoIR.variaveis
+Operando = int | Const
+
+
+@dataclass(slots=True)
+class Instr:
+    """
+    Uma instrução de três endereços. `op` é um de:
+
+    - "copia": dest = args[0];
+    - um de ARITMETICOS ou COMPARACOES: dest = args[0] op args[1];
+    - "chamada": dest = rotina(*args), com dest None para descartar;
+    - "escreva": escreve args[0];
+    - "phi" (só em SSA): dest = args[k] quando se chega pelo k-ésimo
+      predecessor do bloco.
+    """
+
+    op: str
+    dest: int | None
+    args: list[Operando]
+    rotina: str | None = None
+
+
+@dataclass(slots=True)
+class Bloco:
+    """
+    Bloco básico: instruções em sequência e o desvio do fim, que é um de
+    ("vai", destino), ("se", condição, destino_verdadeiro, destino_falso)
+    ou ("retorne", operando ou None), com os destinos como índices em
+    FuncaoIR.blocos.
+    """
+
+    instrs: list[Instr] = field(default_factory=list)
+    fim: tuple = ()
+
+
+@dataclass(slots=True)
+class Variavel:
+    nome: str
+    tipo: str
+    # criada pela tradução (resultado de uma subexpressão) ou pela SSA
+    temporaria: bool = False
+
+
+@dataclass(slots=True)
+class FuncaoIR:
+    """
+    Uma rotina (ou o programa principal, com nome None) em blocos básicos;
+    blocos[0] é a entrada. `retorno` é o tipo C do valor devolvido, None
+    nos procedimentos. Todas as variáveis, os parâmetros incluídos, ficam
+    em `variaveis`; `params` são os índices dos parâmetros, em ordem.
+    """
+
+    nome: str | None
+    retorno: str | None
+    params: list[int]
+    variaveis: list[Variavel]
+    blocos: list[Bloco]
+    ssa: bool = False
+
+    def sucessores(self, b: int) -> tuple[int, ...]:
+        fim = self.blocos[b].fim
+        if fim[0] == "vai":
+            return (fim[1],)
+        if fim[0] == "se":
+            return (fim[2], fim[3])
+        return ()
+
+    def predecessores(self) -> list[list[int]]:
+        """Para cada bloco, os blocos que desviam para ele, em ordem."""
+        preds: list[list[int]] = [[] for _ in self.blocos]
+        for b in range(len(self.blocos)):
+            for s in self.sucessores(b):
+                preds[s].append(b)
+        return preds
+
+    def tipo(self, operando: Operando) -> str:
+        if operando.__class__ is Const:
+            return operando.tipo
+        return self.variaveis[operando].tipo
+
+
+@dataclass(slots=True)
+class ProgramaIR:
+    rotinas: list[FuncaoIR]
+    principal: FuncaoIR
+
+
+def texto(programa: ProgramaIR) -> str:
+    """A IR em texto legível, uma instrução por linha."""
+    linhas: list[str] = []
+    for funcao in programa.rotinas + [programa.principal]:
+        nomes = [v.nome for v in funcao.variaveis]
+
+        def op(x: Operando) -> str:
+            if x.__class__ is not Const:
+                return nomes[x]
+            if x.tipo == CADEIA:
+                return '"' + x.valor.replace('"', '\\"') + '"'
+            return str(x.valor)
+
+        params = ", ".join(f"{funcao.tipo(p)} {nomes[p]}" for p in funcao.params)
+        cabecalho = f"{funcao.retorno or 'void'} {funcao.nome or 'principal'}({params})"
+        linhas.append(cabecalho + (" [ssa]" if funcao.ssa else "") + ":")
+        for b, bloco in enumerate(funcao.blocos):
+            linhas.append(f"  B{b}:")
+            for instr in bloco.instrs:
+                args = instr.args
+                if instr.op == "copia":
+                    direita = op(args[0])
+                elif instr.op == "chamada":
+                    direita = f"{instr.rotina}({', '.join(map(op, args))})"
+                elif instr.op == "phi":
+                    direita = f"phi({', '.join(map(op, args))})"
+                elif instr.op == "escreva":
+                    direita = f"escreva {op(args[0])}"
+                else:
+                    direita = f"{op(args[0])} {instr.op} {op(args[1])}"
+                if instr.dest is not None:
+                    direita = f"{nomes[instr.dest]} = {direita}"
+                linhas.append(f"    {direita}")
+
+            fim = bloco.fim
+            if fim[0] == "vai":
+                linhas.append(f"    vai B{fim[1]}")
+            elif fim[0] == "se":
+                linhas.append(f"    se {op(fim[1])} vai B{fim[2]} senao B{fim[3]}")
+            elif fim[1] is None:
+                linhas.append("    retorne")
+            else:
+                linhas.append(f"    retorne {op(fim[1])}")
+        linhas.append("")
+    return "\n".join(linhas)
@@ -1,18 +1,34 @@
 from __future__ import annotations
 
+import codecs
+import mmap
 import re
+from array import array
+from collections.abc import MutableSequence, Sequence
 from dataclasses import dataclass
-from typing import Iterable
+from typing import IO, Iterator
 
-from .erros import ErroLexico, Posicao
+from .dfa import ScannerDFA
+from .erros import ErroLexico
+from .posicoes import IndiceLinhas
+from .tipos_token import COMMENT, EOF, IDENT, NEWLINE, NOMES, SKIP, TIPO_ID
 
+# Tipos de token que o lexer reconhece e descarta
+IGNORADOS = frozenset((NEWLINE, SKIP, COMMENT))
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, repr=False)
 class Token:
-    tipo: str
+    tipo: int  # ver tipos_token
     lexema: str
-    linha: int
-    coluna: int
+    inicio: int  # offset na fonte; linha/coluna vêm de IndiceLinhas
+
+    @property
+    def fim(self) -> int:
+        return self.inicio + len(self.lexema)
+
+    def __repr__(self) -> str:
+        return f"Token(tipo={NOMES[self.tipo]}, lexema={self.lexema!r}, inicio={self.inicio})"
 
 
 class Lexer:
@@ -72,57 +88,271 @@ class Lexer:
         ("IDENT", r"[A-Za-z_][A-Za-z0-9_]*"),
     ]
 
-    def __init__(self) -> None:
+    # Nome de cada tipo de token, indexado pelo id inteiro (ver tipos_token)
+    TIPOS = NOMES
+    TIPO_ID = TIPO_ID
+
+    # Quantos caracteres à frente do cursor o modo streaming mantém em memória
+    TAM_BLOCO = 1 << 16
+    # Quantos caracteres de início de token o scanner percorre em cada
+    # chamada; quem lê os tokens aos poucos não espera mais que isso
+    TAM_LOTE = 1 << 6
+
+    BACKENDS = ("regex", "dfa")
+
+    def __init__(self, backend: str = "regex") -> None:
+        """
+        backend="regex": uma alternação de regex com as TOKEN_SPECS.
+        backend="dfa": tabela de transições gerada das TOKEN_SPECS e KEYWORDS
+        (ver ScannerDFA); produz exatamente os mesmos tokens.
+        """
+        # tipo de token -> id, None para os que o lexer descarta
+        ids = {
+            nome: None if tipo in IGNORADOS else tipo for nome, tipo in TIPO_ID.items()
+        }
+        if backend == "regex":
+            keywords = {lex: TIPO_ID[kind] for lex, kind in self.KEYWORDS.items()}
+            self._scanner = _ScannerRegex(self.TOKEN_SPECS, keywords, ids)
+        elif backend == "dfa":
+            # o autômato já reconhece as palavras-chave
+            self._scanner = ScannerDFA.carregar(self.TOKEN_SPECS, self.KEYWORDS, ids)
+        else:
+            raise ValueError(f"Backend de lexer desconhecido: {backend}")
+
+        # índice de linhas da última fonte tokenizada
+        self.indice = IndiceLinhas("")
+
+    def tokenizar(self, codigo: str) -> list[Token]:
+        self.indice = IndiceLinhas(codigo)
+        return list(self._varrer(iter(()), None, codigo))
+
+    def tokenizar_a_partir(self, codigo: str, inicio: int) -> Iterator[Token]:
+        """
+        Tokens de `codigo` a partir do offset `inicio`, que precisa ser uma
+        fronteira entre tokens (0 ou o fim de um token), até o EOF.
+        """
+        self.indice = IndiceLinhas(codigo)
+        return self._varrer(iter(()), None, codigo, inicio)
+
+    def tokenizar_compacto(self, codigo: str) -> TokensCompactos:
+        """
+        Mesma saída de tokenizar, mas guardada em colunas de inteiros
+        (TokensCompactos) em vez de um objeto Token por token.
+        """
+        self.indice = IndiceLinhas(codigo)
+        tokens = TokensCompactos(codigo)
+        # sem blocos, as posições relativas a buf já são as da fonte
+        for _ in self._varrer_colunas(
+            iter(()), None, codigo, 0, tokens.tipos, tokens.inicios, tokens.fins
+        ):
+            pass
+        return tokens
+
+    def tokenizar_stream(
+        self, fonte: str | IO[str] | IO[bytes] | mmap.mmap
+    ) -> Iterator[Token]:
+        """
+        Gera os tokens sob demanda, lendo a fonte em blocos de TAM_BLOCO.
+        Aceita uma string, um arquivo aberto (texto ou binário) ou um mmap.
+        """
+        if isinstance(fonte, str):
+            self.indice = IndiceLinhas(fonte)
+            return self._varrer(iter(()), None, fonte)
+
+        # a fonte não fica inteira na memória: o índice é montado bloco a bloco
+        self.indice = IndiceLinhas()
+        return self._varrer(self._ler_blocos(fonte), self.indice)
+
+    def _ler_blocos(self, fonte: IO[str] | IO[bytes] | mmap.mmap) -> Iterator[str]:
+        decoder = None
+        while True:
+            bloco = fonte.read(self.TAM_BLOCO)
+            if not bloco:
+                break
+            if isinstance(bloco, bytes):
+                if decoder is None:
+                    decoder = codecs.getincrementaldecoder("utf-8")()
+                bloco = decoder.decode(bloco)
+            if bloco:
+                yield bloco
+        if decoder is not None:
+            resto = decoder.decode(b"", final=True)
+            if resto:
+                yield resto
+
+    def _varrer(
+        self,
+        blocos: Iterator[str],
+        indice: IndiceLinhas | None,
+        buf: str = "",
+        pos: int = 0,
+    ) -> Iterator[Token]:
+        """Os tokens de _varrer_colunas, um objeto Token por token."""
+        tipos: list[int] = []
+        inicios: list[int] = []
+        fins: list[int] = []
+        for buf, base in self._varrer_colunas(blocos, indice, buf, pos, tipos, inicios, fins):
+            for kind, start, end in zip(tipos, inicios, fins):
+                yield Token(kind, buf[start:end], base + start)
+            tipos.clear()
+            inicios.clear()
+            fins.clear()
+
+    def _varrer_colunas(
+        self,
+        blocos: Iterator[str],
+        indice: IndiceLinhas | None,
+        buf: str,
+        pos: int,
+        tipos: MutableSequence[int],
+        inicios: MutableSequence[int],
+        fins: MutableSequence[int],
+    ) -> Iterator[tuple[str, int]]:
+        """
+        Laço principal do lexer. Começa em `buf[pos:]` e continua pelos
+        `blocos`, pedaços consecutivos da fonte; se `indice` for dado, cada
+        bloco lido é registrado nele.
+
+        Acrescenta os tokens às colunas, até o EOF, com as posições
+        relativas ao buf atual, e faz yield de (buf, offset dele na fonte)
+        depois de cada lote; quem lê pode esvaziar as colunas entre um e
+        outro. Sem `blocos`, buf é a fonte inteira e o offset é sempre 0.
+        """
+        varrer = self._scanner.varrer
+        tam_bloco = self.TAM_BLOCO
+        tam_lote = self.TAM_LOTE
+
+        n = len(buf)
+        base = 0  # offset, na fonte, do início de buf
+        lidos = n
+        fim_fonte = False
+
+        while True:
+            # Mantém pelo menos tam_bloco caracteres à frente do cursor, para que
+            # nenhum token seja decidido olhando um pedaço truncado da fonte
+            limite = n if fim_fonte else n - tam_bloco + 1
+            while pos < limite:
+                ate = min(limite, pos + tam_lote)
+                parou = varrer(buf, pos, ate, fim_fonte, tipos, inicios, fins)
+                yield buf, base
+                pos, parou = parou, parou < ate
+                if parou:
+                    # caractere inválido ou token que chega ao fim de buf
+                    break
+
+            if fim_fonte:
+                if pos < n:
+                    # Caractere inválido
+                    raise ErroLexico(
+                        f"Caractere inesperado: {repr(buf[pos])}",
+                        self.indice.posicao(base + pos),
+                    )
+                break
+
+            # o scanner parou antes do fim: o token pode continuar no próximo bloco
+            bloco = next(blocos, None)
+            if bloco is None:
+                fim_fonte = True
+            else:
+                if indice is not None:
+                    indice.estender(bloco, lidos)
+                lidos += len(bloco)
+                buf = buf[pos:] + bloco
+                base += pos
+                n = len(buf)
+                pos = 0
+
+        tipos.append(EOF)
+        inicios.append(n)
+        fins.append(n)
+        yield buf, base
+
+
+class _ScannerRegex:
+    """
+    Uma alternação de regex com as TOKEN_SPECS, com a mesma interface
+    (varrer) de ScannerDFA.
+    """
+
+    def __init__(
+        self,
+        token_specs: list[tuple[str, str]],
+        keywords: dict[str, int],
+        ids: dict[str, int | None],
+    ) -> None:
         parts = []
-        for tok_type, pattern in self.TOKEN_SPECS:
+        for tok_type, pattern in token_specs:
             parts.append(f"(?P<{tok_type}>{pattern})")
-        self._master_pat = re.compile("|".join(parts))
+        self._regex = re.compile("|".join(parts))
+        self._keywords = keywords
+        self._ids = ids
 
-    def tokenizar(self, codigo: str) -> list[Token]:
-        tokens: list[Token] = []
-        linha = 1
-        coluna = 1
-        pos = 0
-        n = len(codigo)
-
-        while pos < n:
-            m = self._master_pat.match(codigo, pos)
+    def varrer(
+        self,
+        texto: str,
+        pos: int,
+        limite: int,
+        final: bool,
+        tipos: MutableSequence[int],
+        inicios: MutableSequence[int],
+        fins: MutableSequence[int],
+    ) -> int:
+        """Ver ScannerDFA.varrer."""
+        match = self._regex.match
+        ids = self._ids
+        keywords = self._keywords
+        tipos_append = tipos.append
+        inicios_append = inicios.append
+        fins_append = fins.append
+        n = len(texto)
+
+        while pos < limite:
+            m = match(texto, pos)
             if not m:
-                # Caractere inválido
-                ch = codigo[pos]
-                raise ErroLexico(
-                    f"Caractere inesperado: {repr(ch)}",
-                    Posicao(linha, coluna),
-                )
+                break
+            fim = m.end()
+            if fim == n and not final:
+                # o token pode continuar no próximo bloco
+                break
 
-            kind = m.lastgroup
-            lex = m.group(kind)
-            start = pos
-            pos = m.end()
+            kind = ids[m.lastgroup]
+            if kind is not None:
+                if kind == IDENT:
+                    kind = keywords.get(texto[pos:fim].lower(), IDENT)
+                tipos_append(kind)
+                inicios_append(pos)
+                fins_append(fim)
+            pos = fim
 
-            if kind == "NEWLINE":
-                linha += 1
-                coluna = 1
-                continue
+        return pos
 
-            if kind in ("SKIP", "COMMENT"):
-                # atualiza coluna pelo tamanho do lexema ignorado
-                coluna += pos - start
-                continue
 
-            tok_linha = linha
-            tok_coluna = coluna
+class TokensCompactos(Sequence):
+    """
+    Tokens em colunas paralelas: tipo em array('B') (os tipos cabem num
+    byte), início e fim em array('i'), com o lexema fatiado da fonte só
+    quando pedido. Expõe a mesma
+    leitura por índice de list[Token], que é o que o Parser usa.
+    """
 
-            # Atualiza coluna depois de consumir o lexema
-            coluna += pos - start
+    __slots__ = ("codigo", "tipos", "inicios", "fins")
 
-            if kind == "IDENT":
-                lowered = lex.lower()
-                if lowered in self.KEYWORDS:
-                    kind = self.KEYWORDS[lowered]
+    def __init__(self, codigo: str) -> None:
+        self.codigo = codigo
+        self.tipos = array("B")
+        self.inicios = array("i")
+        self.fins = array("i")
 
-            tokens.append(Token(kind, lex, tok_linha, tok_coluna))
+    def __len__(self) -> int:
+        return len(self.tipos)
 
-        tokens.append(Token("EOF", "", linha, coluna))
+    def __getitem__(self, i: int) -> Token:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return Token(self.tipos[i], self.lexema(i), self.inicios[i])
 
-        return tokens
+    def tipo(self, i: int) -> int:
+        return self.tipos[i]
+
+    def lexema(self, i: int) -> str:
+        return self.codigo[self.inicios[i] : self.fins[i]]
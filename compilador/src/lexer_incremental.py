@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from typing import Iterator
+
+from .lexer import Lexer, Token
+from .posicoes import IndiceLinhas
+from .tipos_token import EOF
+
+
+class DocumentoLexico:
+    """
+    Fonte e tokens de um buffer de editor, mantidos em sincronia a cada
+    edição sem re-tokenizar o arquivo inteiro.
+
+    Os tokens ficam em blocos de até TAM_BLOCO tokens, com offsets relativos
+    à base do bloco. Como num gap buffer, os blocos antes do ponto da última
+    edição (`_corte`) guardam a base contada do início do texto, e os demais
+    a distância até o fim do texto. Uma edição re-varre só a região
+    danificada, até os tokens novos voltarem a coincidir com os antigos; o
+    que vem depois não precisa ser deslocado, porque a distância até o fim
+    não muda. Só mover o corte para longe custa proporcional à distância.
+
+    O resultado de tokens() é sempre igual ao de Lexer.tokenizar sobre o
+    texto atual.
+    """
+
+    TAM_BLOCO = 256
+
+    # Quantos caracteres depois do fim de um token o lexer pode examinar para
+    # decidi-lo (NUM_INT só termina depois de ver que não há ".dígito").
+    # Um token que termina a menos disso de uma edição precisa ser refeito.
+    LOOKAHEAD = 2
+
+    def __init__(self, codigo: str, lexer: Lexer | None = None) -> None:
+        self.lexer = lexer or Lexer()
+        self.codigo = codigo
+        self.indice = IndiceLinhas(codigo)
+
+        tokens = self.lexer.tokenizar(codigo)
+        self._blocos: list[list[Token]] = []
+        self._bases: list[int] = []
+        self._corte = 0
+        self._montar_blocos(0, 0, tokens[:-1])  # o EOF não é guardado
+
+    def tokens(self) -> list[Token]:
+        tokens = []
+        for b, bloco in enumerate(self._blocos):
+            base = self._base(b)
+            tokens.extend(Token(tok.tipo, tok.lexema, base + tok.inicio) for tok in bloco)
+        tokens.append(Token(EOF, "", len(self.codigo)))
+        return tokens
+
+    def editar(self, inicio: int, removidos: int, inserido: str) -> None:
+        """
+        Aplica a edição: `removidos` caracteres a partir de `inicio` são
+        trocados por `inserido`. Se o texto novo tiver um erro léxico, a
+        ErroLexico é propagada e o documento fica como estava.
+        """
+        if inicio < 0 or removidos < 0 or inicio + removidos > len(self.codigo):
+            raise ValueError("Edição fora dos limites do documento.")
+
+        codigo = self.codigo[:inicio] + inserido + self.codigo[inicio + removidos :]
+        delta = len(inserido) - removidos
+        fim_edicao = inicio + len(inserido)  # nas coordenadas do texto novo
+
+        # primeiro token que a edição pode alterar, e de onde re-varrer
+        b, i = self._localizar(inicio - self.LOOKAHEAD)
+        anterior = self._anterior(b, i)
+        retomada = 0 if anterior is None else anterior.fim
+
+        # re-varre até um token novo começar onde começava um token antigo,
+        # depois da região editada: dali em diante o texto é o mesmo
+        novos: list[Token] = []
+        antigos = self._a_partir(b, i)
+        antigo = next(antigos, None)
+        sincronizado = None
+
+        for tok in self.lexer.tokenizar_a_partir(codigo, retomada):
+            if tok.tipo == EOF:
+                break
+
+            if tok.inicio >= fim_edicao:
+                inicio_antigo = tok.inicio - delta
+                while antigo is not None and antigo[2].inicio < inicio_antigo:
+                    antigo = next(antigos, None)
+                if antigo is not None and antigo[2].inicio == inicio_antigo:
+                    sincronizado = antigo
+                    break
+
+            novos.append(tok)
+
+        # os blocos [b, fim_b] são refeitos
+        if sincronizado is None:
+            fim_b, j = len(self._blocos) - 1, None
+        else:
+            fim_b, j, _ = sincronizado
+            # absorve o bloco seguinte se ele for pequeno, para os blocos não
+            # se fragmentarem ao longo de muitas edições
+            if fim_b + 1 < len(self._blocos) and (
+                len(self._blocos[fim_b + 1]) < self.TAM_BLOCO // 2
+            ):
+                fim_b += 1
+
+        # com o corte logo depois dos blocos refeitos, nada além deles precisa
+        # mudar quando o tamanho do texto mudar
+        self._mover_corte(fim_b + 1)
+
+        prefixo = self._absolutos(b, 0, i) if b < len(self._blocos) else []
+        resto: list[Token] = []
+        if j is not None:
+            resto = self._absolutos(sincronizado[0], j, None, delta)
+            if fim_b != sincronizado[0]:
+                resto += self._absolutos(fim_b, 0, None, delta)
+
+        self.codigo = codigo
+        self.indice = IndiceLinhas(codigo)
+        self._montar_blocos(b, fim_b + 1, prefixo + novos + resto)
+
+    def _base(self, b: int) -> int:
+        if b < self._corte:
+            return self._bases[b]
+        return len(self.codigo) - self._bases[b]
+
+    def _mover_corte(self, corte: int) -> None:
+        # a conversão entre "a partir do início" e "até o fim" é x -> n - x
+        n = len(self.codigo)
+        for b in range(min(corte, self._corte), max(corte, self._corte)):
+            self._bases[b] = n - self._bases[b]
+        self._corte = corte
+
+    def _absolutos(
+        self, b: int, de: int, ate: int | None, delta: int = 0
+    ) -> list[Token]:
+        base = self._base(b) + delta
+        return [
+            Token(tok.tipo, tok.lexema, base + tok.inicio)
+            for tok in self._blocos[b][de:ate]
+        ]
+
+    def _localizar(self, offset: int) -> tuple[int, int]:
+        """(bloco, posição no bloco) do primeiro token com fim > offset."""
+        # último bloco com base <= offset: antes do corte as bases crescem;
+        # depois dele, as distâncias até o fim decrescem
+        b = bisect_right(self._bases, offset, 0, self._corte)
+        if b == self._corte:
+            n = len(self.codigo)
+            b = bisect_right(
+                self._bases, offset - n, self._corte, len(self._bases), key=lambda d: -d
+            )
+        b = max(b - 1, 0)
+
+        while b < len(self._blocos):
+            base = self._base(b)
+            for i, tok in enumerate(self._blocos[b]):
+                if base + tok.inicio + len(tok.lexema) > offset:
+                    return b, i
+            b += 1
+        return len(self._blocos), 0
+
+    def _anterior(self, b: int, i: int) -> Token | None:
+        """Token (com offset absoluto) imediatamente antes de (b, i)."""
+        if i > 0:
+            return self._absolutos(b, i - 1, i)[0]
+        if b > 0:
+            return self._absolutos(b - 1, -1, None)[0]
+        return None
+
+    def _a_partir(self, b: int, i: int) -> Iterator[tuple[int, int, Token]]:
+        """Tokens antigos a partir de (b, i), como (bloco, posição, token absoluto)."""
+        while b < len(self._blocos):
+            base = self._base(b)
+            bloco = self._blocos[b]
+            for j in range(i, len(bloco)):
+                tok = bloco[j]
+                yield b, j, Token(tok.tipo, tok.lexema, base + tok.inicio)
+            b += 1
+            i = 0
+
+    def _montar_blocos(self, de: int, ate: int, tokens: list[Token]) -> None:
+        """
+        Troca os blocos [de, ate), que precisam estar antes do corte, por
+        blocos novos com `tokens` (offsets absolutos).
+        """
+        blocos: list[list[Token]] = []
+        bases: list[int] = []
+
+        # divide em partes de tamanho parecido, sem deixar um resto minúsculo
+        n_blocos = -(-len(tokens) // self.TAM_BLOCO)
+        for k in range(n_blocos):
+            trecho = tokens[
+                k * len(tokens) // n_blocos : (k + 1) * len(tokens) // n_blocos
+            ]
+            base = trecho[0].inicio
+            blocos.append([Token(t.tipo, t.lexema, t.inicio - base) for t in trecho])
+            bases.append(base)
+
+        self._blocos[de:ate] = blocos
+        self._bases[de:ate] = bases
+        self._corte += len(blocos) - (ate - de)
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from .ast_nodes import Program
+from .codigo_morto import EliminacaoCodigoMorto
+from .expansao_funcoes import ExpansaoFuncoes
+from .invariantes import MovimentoInvariantes
+from .propagacao_constantes import PropagacaoConstantes
+from .subexpressoes import EliminacaoSubexpressoes
+from .tabela_simbolos import SimboloRotina, SimboloVar
+
+# nível -> passes que ele liga, na ordem em que rodam
+PASSES = {
+    0: [],
+    1: [PropagacaoConstantes, EliminacaoCodigoMorto],
+    2: [
+        ExpansaoFuncoes,
+        PropagacaoConstantes,
+        EliminacaoCodigoMorto,
+        MovimentoInvariantes,
+        EliminacaoSubexpressoes,
+    ],
+}
+
+
+def otimizar(
+    program: Program,
+    simbolos: list[SimboloVar | SimboloRotina | None],
+    tipos_expr: list[str | None],
+    nivel: int = 1,
+    relatorio: list[str] | None = None,
+) -> Program:
+    """
+    Roda os passes do `nivel` sobre a AST analisada, entre a semântica e o
+    GeradorC. Cada passe devolve uma AST nova (com os nós que não mudaram
+    reaproveitados) e acrescenta a `simbolos` e `tipos_expr` os nós que
+    criou, então o gerador recebe as mesmas listas. Os passes que contam o
+    que fizeram (um atributo `relatorio`) acrescentam as linhas deles a
+    `relatorio`.
+    """
+    for passe in PASSES[nivel]:
+        otimizador = passe(simbolos, tipos_expr)
+        program = otimizador.otimizar(program)
+        if relatorio is not None:
+            relatorio += getattr(otimizador, "relatorio", [])
+    return program
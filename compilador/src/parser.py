@@ -1,7 +1,52 @@
 from __future__ import annotations
 
-from .lexer import Token
+from collections.abc import Generator, Sequence
+from itertools import count
+from types import GeneratorType
+from typing import Iterable
+
+from .lexer import Token, TokensCompactos
 from .erros import ErroSintatico, Posicao
+from .posicoes import IndiceLinhas
+from .tipos_token import (
+    NOMES,
+    NUM_INT,
+    NUM_REAL,
+    STRING,
+    EQ,
+    NE,
+    LE,
+    GE,
+    LT,
+    GT,
+    ASSIGN,
+    PLUS,
+    MINUS,
+    MUL,
+    DIV,
+    SEMI,
+    COMMA,
+    LPAREN,
+    RPAREN,
+    IDENT,
+    KW_INTEIRO,
+    KW_REAL,
+    KW_CADEIA,
+    KW_SE,
+    KW_ENTAO,
+    KW_SENAO,
+    KW_FIMSE,
+    KW_ENQUANTO,
+    KW_FACA,
+    KW_FIMENQUANTO,
+    KW_PROCEDIMENTO,
+    KW_FUNCAO,
+    KW_INICIO,
+    KW_FIM,
+    KW_RETORNE,
+    KW_ESCREVA,
+    EOF,
+)
 from .ast_nodes import (
     Program,
     VarDecl,
@@ -9,6 +54,7 @@ from .ast_nodes import (
     Write,
     Expr,
     Compare,
+    FabricaNos,
     If,
     While,
     NumInt,
@@ -22,27 +68,146 @@ from .ast_nodes import (
     ProcDecl,
     FuncDecl,
     Param,
+    RotinaEsboco,
 )
 
 
+class BufferTokens:
+    """
+    Janela circular sobre um iterável de tokens, indexada pela posição absoluta
+    do token. Só os últimos `capacidade` tokens lidos ficam em memória, o que
+    basta para o Parser (token atual + lookahead).
+    """
+
+    def __init__(self, tokens: Iterable[Token], capacidade: int = 4) -> None:
+        self._fonte = iter(tokens)
+        self._anel: list[Token | None] = [None] * capacidade
+        self._capacidade = capacidade
+        self._lidos = 0
+
+    def __getitem__(self, i: int) -> Token:
+        if i < self._lidos - self._capacidade:
+            raise IndexError(f"Token {i} já foi descartado do buffer.")
+
+        while i >= self._lidos:
+            try:
+                token = next(self._fonte)
+            except StopIteration:
+                raise IndexError(f"Token {i} além do fim da entrada.") from None
+            self._anel[self._lidos % self._capacidade] = token
+            self._lidos += 1
+
+        return self._anel[i % self._capacidade]
+
+
+# Precedência dos operadores binários (quanto maior, mais forte).
+# Os relacionais só aparecem no topo de uma condição e não se encadeiam.
+PREC_RELACIONAL = 1
+PREC_ADITIVO = 2
+PREC_MULTIPLICATIVO = 3
+
+# tipo do token -> (precedência, operador, nó da AST)
+OPERADORES_BINARIOS = {
+    GT: (PREC_RELACIONAL, ">", Compare),
+    LT: (PREC_RELACIONAL, "<", Compare),
+    GE: (PREC_RELACIONAL, ">=", Compare),
+    LE: (PREC_RELACIONAL, "<=", Compare),
+    EQ: (PREC_RELACIONAL, "==", Compare),
+    NE: (PREC_RELACIONAL, "!=", Compare),
+    PLUS: (PREC_ADITIVO, "+", BinOp),
+    MINUS: (PREC_ADITIVO, "-", BinOp),
+    MUL: (PREC_MULTIPLICATIVO, "*", BinOp),
+    DIV: (PREC_MULTIPLICATIVO, "/", BinOp),
+}
+
+TIPOS_DECLARACAO = {KW_INTEIRO: "inteiro", KW_REAL: "real", KW_CADEIA: "cadeia"}
+
+# Tokens que fecham blocos. No modo pânico, o parser pula tokens até um
+# deles ou até um ';'.
+FECHAMENTOS = frozenset({KW_SENAO, KW_FIMSE, KW_FIMENQUANTO, KW_FIM})
+
+
+def _indice(tipos: bytes, tipo: int, inicio: int, fim: int | None = None) -> int:
+    """Posição do primeiro `tipo` em tipos[inicio:fim]; `fim` (ou len) se não houver."""
+    if fim is None:
+        fim = len(tipos)
+    i = tipos.find(tipo, inicio, fim)
+    return fim if i == -1 else i
+
+
+def _proxima_rotina(tipos: bytes, i: int, proximas: dict[int, int]) -> int:
+    # `proximas` guarda, para cada palavra, a última ocorrência achada; só
+    # as que ficaram para trás de `i` são procuradas de novo
+    for palavra, j in proximas.items():
+        if j < i:
+            proximas[palavra] = _indice(tipos, palavra, i)
+    return min(proximas.values())
+
+
 class Parser:
-    def __init__(self, tokens: list[Token]) -> None:
-        self.tokens = tokens
+    def __init__(
+        self,
+        tokens: Sequence[Token] | Iterable[Token],
+        indice: IndiceLinhas | None = None,
+        max_erros: int = 1,
+        compartilhar: bool = False,
+    ) -> None:
+        # sequências (list, TokensCompactos) são acessadas direto; qualquer
+        # outro iterável (ex.: o gerador de Lexer.tokenizar_stream) é
+        # consumido sob demanda
+        self.tokens = tokens if isinstance(tokens, Sequence) else BufferTokens(tokens)
         self.pos = 0
+        # sem índice, os erros saem sem linha/coluna
+        self.indice = indice
+
+        # Com max_erros > 1, um erro de sintaxe é registrado em `erros`, o
+        # comando em que ele ocorreu fica fora da AST e o parse continua
+        # depois do próximo ';' ou fechamento de bloco. O erro de número
+        # max_erros é lançado (com o padrão 1, o primeiro).
+        self.max_erros = max_erros
+        self.erros: list[ErroSintatico] = []
+
+        # nids dos nós, na ordem em que são criados (ver ast_nodes.No)
+        self._nids = count()
+
+        # com compartilhar, subexpressões repetidas viram um só nó
+        self._fabrica = FabricaNos(self._nids) if compartilhar else None
+
+        # um byte por token, para o modo superficial (ver _tipos)
+        self._tipos_tokens: bytes | None = None
+
+        # tipo do token inicial -> regra do comando
+        self._comandos = {
+            KW_INTEIRO: self.declaracao,
+            KW_REAL: self.declaracao,
+            KW_CADEIA: self.declaracao,
+            KW_ESCREVA: self.escreva_stmt,
+            KW_SE: self.se_stmt,
+            KW_ENQUANTO: self.enquanto_stmt,
+            KW_PROCEDIMENTO: self.proc_decl,
+            KW_FUNCAO: self.func_decl,
+            KW_RETORNE: self.return_stmt,
+            IDENT: self._comando_ident,
+        }
+
+    def _posicao(self, token: Token) -> Posicao | None:
+        if self.indice is None:
+            return None
+        return self.indice.posicao(token.inicio)
 
     def current(self) -> Token:
         return self.tokens[self.pos]
 
-    def match(self, tipo: str) -> bool:
-        return self.current().tipo == tipo
+    def match(self, tipo: int) -> bool:
+        return self.tokens[self.pos].tipo == tipo
 
-    def eat(self, tipo: str) -> Token:
-        token = self.current()
+    def eat(self, tipo: int) -> Token:
+        token = self.tokens[self.pos]
 
         if token.tipo != tipo:
             raise ErroSintatico(
-                f"Esperado {tipo}, mas veio {token.tipo} ({token.lexema})",
-                Posicao(token.linha, token.coluna),
+                f"Esperado {NOMES[tipo]}, mas veio {NOMES[token.tipo]} ({token.lexema})",
+                self._posicao(token),
             )
 
         self.pos += 1
@@ -53,313 +218,567 @@ class Parser:
         return self.tokens[self.pos + k]
 
     def parse(self) -> Program:
-        comandos = []
-
-        while not self.match("EOF"):
-            comandos.append(self.comando())
-        self.eat("EOF")
+        comandos = self.bloco_ate(set())
+        self.eat(EOF)
+        if self._fabrica is not None:
+            # a AST não precisa da tabela da fábrica
+            self._fabrica = FabricaNos(self._nids)
 
-        return Program(comandos)
+        # o próximo nid livre é o total de nós
+        return Program(comandos, next(self._nids))
 
     def comando(self):
-        token = self.current()
-
-        if token.tipo in ("KW_INTEIRO", "KW_REAL", "KW_CADEIA"):
-            return self.declaracao()
-
-        if token.tipo == "KW_ESCREVA":
-            return self.escreva_stmt()
-
-        if token.tipo == "KW_SE":
-            return self.se_stmt()
-
-        if token.tipo == "KW_ENQUANTO":
-            return self.enquanto_stmt()
-
-        if token.tipo == "KW_PROCEDIMENTO":
-            return self.proc_decl()
+        regra = self._comandos.get(self.tokens[self.pos].tipo)
+        if regra is None:
+            return None
+        resultado = regra()
+        if isinstance(resultado, GeneratorType):
+            return self._executar(resultado)
+        return resultado
+
+    def bloco_ate(self, stop_tokens: set[int]) -> list:
+        """
+        Lê comandos até o token atual ser um dos stop_tokens (sem consumir o stop token).
+        """
+        return self._executar(self._bloco(stop_tokens))
 
-        if token.tipo == "KW_FUNCAO":
-            return self.func_decl()
+    @staticmethod
+    def _bloco(stop_tokens: set[int]):
+        return (yield stop_tokens)
 
-        if token.tipo == "KW_RETORNE":
-            return self.return_stmt()
+    def _executar(self, raiz: Generator) -> object:
+        """
+        Roda `raiz` e todos os comandos aninhados nela sem recursão.
 
-        if token.tipo == "IDENT":
-            # lookahead 1: se próximo é ASSIGN => atribuicao
-            if self.peek().tipo == "ASSIGN":
-                return self.atribuicao()
-            # se próximo é LPAREN => chamada como comando
-            if self.peek().tipo == "LPAREN":
-                call = self._call_from_ident()
-                self.eat("SEMI")
-                return CallStmt(call)
-            raise ErroSintatico(
-                f"Após identificador '{token.lexema}', esperado '=' ou '('",
-                Posicao(token.linha, token.coluna),
+        As regras de comandos compostos (se, enquanto, rotinas) são geradores:
+        a cada bloco interno elas fazem `yield` dos tokens que o encerram e
+        recebem de volta a lista de comandos lida. Aqui fica a pilha desses
+        geradores, então a profundidade de aninhamento só é limitada pela
+        memória.
+        """
+        tokens = self.tokens
+        comandos = self._comandos
+
+        pilha: list[tuple[Generator, list, set[int]]] = []
+        gerador = raiz
+        stmts: list = []
+        parar = next(gerador)
+
+        while True:
+            token = tokens[self.pos]
+            tipo = token.tipo
+            if tipo != EOF and tipo not in parar:
+                regra = comandos.get(tipo)
+                if regra is not None:
+                    try:
+                        resultado = regra()
+                        if isinstance(resultado, GeneratorType):
+                            proximo = next(resultado)
+                            pilha.append((gerador, stmts, parar))
+                            gerador, stmts, parar = resultado, [], proximo
+                        else:
+                            stmts.append(resultado)
+                    except ErroSintatico as erro:
+                        self._registrar(erro)
+                        self._sincronizar()
+                    continue
+
+                if not any(tipo in fora for _, _, fora in pilha):
+                    self._comando_inesperado(token)
+                    continue
+                # fechamento de um bloco de fora: este bloco acaba aqui e o
+                # comando dele reclama do fechamento que falta
+
+            # fim de um bloco: devolve os comandos a quem pediu
+            try:
+                parar = gerador.send(stmts)
+                stmts = []
+            except StopIteration as fim:
+                if not pilha:
+                    return fim.value
+                gerador, stmts, parar = pilha.pop()
+                if fim.value is not None:
+                    stmts.append(fim.value)
+            except ErroSintatico as erro:
+                # o comando composto não fechou e fica fora da AST; o token
+                # atual é de um bloco de fora, então não há o que pular
+                self._registrar(erro)
+                if not pilha:
+                    return None
+                gerador, stmts, parar = pilha.pop()
+
+    # Contextos da FabricaNos: um bloco começa no contexto de fora (uma rotina,
+    # num novo) e o de fora volta quando ele acaba, já que as declarações
+    # visíveis voltam a ser as mesmas
+    def _contexto(self) -> int:
+        return 0 if self._fabrica is None else self._fabrica.contexto
+
+    def _novo_contexto(self) -> int:
+        """Troca para um contexto novo e devolve o anterior."""
+        contexto = self._contexto()
+        if self._fabrica is not None:
+            self._fabrica.novo_contexto()
+        return contexto
+
+    def _voltar_contexto(self, contexto: int) -> None:
+        if self._fabrica is not None:
+            self._fabrica.contexto = contexto
+
+    # Recuperação de erros
+    def _registrar(self, erro: ErroSintatico) -> None:
+        # um erro que já atingiu o limite só está subindo até quem chamou
+        if len(self.erros) >= self.max_erros:
+            raise erro
+        self.erros.append(erro)
+        if len(self.erros) >= self.max_erros:
+            raise erro
+
+    def _sincronizar(self, *ate: int) -> None:
+        """
+        Modo pânico: pula tokens até um ';' ou um dos tokens `ate` (que são
+        consumidos) ou até um fechamento de bloco (que fica para o bloco).
+        """
+        tokens = self.tokens
+        while True:
+            tipo = tokens[self.pos].tipo
+            if tipo == SEMI or tipo in ate:
+                self.pos += 1
+                return
+            if tipo == EOF or tipo in FECHAMENTOS:
+                return
+            self.pos += 1
+
+    def _comando_inesperado(self, token: Token) -> None:
+        self._registrar(
+            ErroSintatico(
+                f"Esperado comando, mas veio {NOMES[token.tipo]} ({token.lexema})",
+                self._posicao(token),
             )
+        )
+        # um ';' ou fechamento sobrando é só descartado
+        self.pos += 1
+        if token.tipo != SEMI and token.tipo not in FECHAMENTOS:
+            self._sincronizar()
+
+    def _comando_ident(self):
+        token = self.current()
+        proximo = self.peek().tipo
+
+        # lookahead 1: se próximo é ASSIGN => atribuicao
+        if proximo == ASSIGN:
+            return self.atribuicao()
+        # se próximo é LPAREN => chamada como comando
+        if proximo == LPAREN:
+            call = self._call_from_ident()
+            self.eat(SEMI)
+            return CallStmt(call, nid=next(self._nids))
+        raise ErroSintatico(
+            f"Após identificador '{token.lexema}', esperado '=' ou '('",
+            self._posicao(token),
+        )
 
     def declaracao(self) -> VarDecl:
-        if self.match("KW_INTEIRO"):
-            self.eat("KW_INTEIRO")
-            tipo = "inteiro"
-        elif self.match("KW_REAL"):
-            self.eat("KW_REAL")
-            tipo = "real"
-        else:
-            self.eat("KW_CADEIA")
-            tipo = "cadeia"
+        # comando() só chega aqui com KW_INTEIRO, KW_REAL ou KW_CADEIA
+        tipo = TIPOS_DECLARACAO[self.current().tipo]
+        self.pos += 1
 
-        nome = self.eat("IDENT").lexema
-        self.eat("SEMI")
+        nome = self.eat(IDENT).lexema
+        self.eat(SEMI)
 
-        return VarDecl(tipo, nome)
+        self._novo_contexto()
+        return VarDecl(tipo, nome, nid=next(self._nids))
 
     def atribuicao(self) -> Assign:
-        nome = self.eat("IDENT").lexema
-        self.eat("ASSIGN")
+        nome = self.eat(IDENT).lexema
+        self.eat(ASSIGN)
         expr = self.expr()
-        self.eat("SEMI")
+        self.eat(SEMI)
 
-        return Assign(nome, expr)
+        return Assign(nome, expr, nid=next(self._nids))
 
     def escreva_stmt(self) -> Write:
-        self.eat("KW_ESCREVA")
-        self.eat("LPAREN")
+        self.eat(KW_ESCREVA)
+        self.eat(LPAREN)
         expr = self.expr()
-        self.eat("RPAREN")
-        self.eat("SEMI")
+        self.eat(RPAREN)
+        self.eat(SEMI)
 
-        return Write(expr)
+        return Write(expr, nid=next(self._nids))
 
     def expr(self) -> Expr:
-        node = self.termo()
+        """Expressão aritmética (sem operadores relacionais)."""
+        return self._expressao(PREC_ADITIVO)
 
-        while self.match("PLUS") or self.match("MINUS"):
+    def condicao(self) -> Expr:
+        """Expressão aritmética, opcionalmente comparada com outra."""
+        return self._expressao(PREC_RELACIONAL)
 
-            if self.match("PLUS"):
-                self.eat("PLUS")
-                op = "+"
+    def _expressao(self, prec_minima: int) -> Expr:
+        """
+        Precedence climbing sem recursão. Operadores ainda sem lado direito
+        ficam em `pendentes`; um operador novo antes combina os pendentes de
+        precedência >= à dele, o que deixa tudo associativo à esquerda. Cada
+        parêntese ou lista de argumentos aberta guarda o contexto de fora em
+        `abertos`, então a profundidade só é limitada pela memória.
+        """
+        tokens = self.tokens
+        nids = self._nids
+        fabrica = self._fabrica
+        # (nome da chamada, ou None num parêntese; argumentos já lidos;
+        # pendentes e precedência mínima do contexto de fora)
+        abertos: list[tuple[str | None, list[Expr], list, int]] = []
+        pendentes: list[tuple[Expr, tuple]] = []
+        minima = prec_minima
+
+        while True:
+            token = tokens[self.pos]
+            tipo = token.tipo
+
+            if tipo == LPAREN:
+                self.pos += 1
+                abertos.append((None, [], pendentes, minima))
+                pendentes, minima = [], PREC_ADITIVO
+                continue
+
+            if tipo == IDENT and tokens[self.pos + 1].tipo == LPAREN:
+                self.pos += 2
+                if tokens[self.pos].tipo != RPAREN:
+                    abertos.append((token.lexema, [], pendentes, minima))
+                    pendentes, minima = [], PREC_ADITIVO
+                    continue
+                self.pos += 1
+                if fabrica is None:
+                    node = Call(token.lexema, [], nid=next(nids))
+                else:
+                    node = fabrica.chamada(token.lexema, [])
             else:
-                self.eat("MINUS")
-                op = "-"
-
-            right = self.termo()
-            node = BinOp(op, node, right)
-
-        return node
-
-    def _call_from_ident(self) -> Call:
-        nome = self.eat("IDENT").lexema
-        self.eat("LPAREN")
+                node = self.fator()
+
+            # depois de um operando: operadores, ou o fim de contextos abertos
+            # (cujo resultado vira operando do contexto de fora)
+            while True:
+                op = OPERADORES_BINARIOS.get(tokens[self.pos].tipo)
+                if op is not None and op[0] >= minima:
+                    prec = op[0]
+                    while pendentes and pendentes[-1][1][0] >= prec:
+                        left, (_, simbolo, classe) = pendentes.pop()
+                        if fabrica is None:
+                            node = classe(simbolo, left, node, nid=next(nids))
+                        else:
+                            node = fabrica.binaria(classe, simbolo, left, node)
+                    self.pos += 1
+                    pendentes.append((node, op))
+                    if prec == PREC_RELACIONAL:
+                        # comparações não se encadeiam: a < b < c é erro de sintaxe
+                        minima = PREC_ADITIVO
+                    break
+
+                while pendentes:
+                    left, (_, simbolo, classe) = pendentes.pop()
+                    if fabrica is None:
+                        node = classe(simbolo, left, node, nid=next(nids))
+                    else:
+                        node = fabrica.binaria(classe, simbolo, left, node)
+
+                if not abertos:
+                    return node
+
+                nome, args, pendentes, minima = abertos.pop()
+                if nome is not None:
+                    args.append(node)
+                    if tokens[self.pos].tipo == COMMA:
+                        self.pos += 1
+                        abertos.append((nome, args, pendentes, minima))
+                        pendentes, minima = [], PREC_ADITIVO
+                        break
+                self.eat(RPAREN)
+                if nome is not None:
+                    if fabrica is None:
+                        node = Call(nome, args, nid=next(nids))
+                    else:
+                        node = fabrica.chamada(nome, args)
+
+    def _args(self) -> list[Expr]:
+        self.eat(LPAREN)
         args = []
-        if not self.match("RPAREN"):
+        if not self.match(RPAREN):
             args.append(self.expr())
-            while self.match("COMMA"):
-                self.eat("COMMA")
+            while self.match(COMMA):
+                self.eat(COMMA)
                 args.append(self.expr())
-        self.eat("RPAREN")
-        return Call(nome, args)
+        self.eat(RPAREN)
+        return args
+
+    def _call_from_ident(self) -> Call:
+        nome = self.eat(IDENT).lexema
+        args = self._args()
+        if self._fabrica is not None:
+            return self._fabrica.chamada(nome, args)
+        return Call(nome, args, nid=next(self._nids))
 
     def _param(self) -> tuple[str, str]:
-        if self.match("KW_INTEIRO"):
-            self.eat("KW_INTEIRO")
-            tipo = "inteiro"
-        elif self.match("KW_REAL"):
-            self.eat("KW_REAL")
-            tipo = "real"
-        elif self.match("KW_CADEIA"):
-            self.eat("KW_CADEIA")
-            tipo = "cadeia"
-        else:
+        tipo = TIPOS_DECLARACAO.get(self.current().tipo)
+        if tipo is None:
             tipo = "inteiro"  # default
+        else:
+            self.pos += 1
 
-        nome = self.eat("IDENT").lexema
+        nome = self.eat(IDENT).lexema
         return (tipo, nome)
 
     def _param_list(self) -> list:
         params = []
-        if not self.match("RPAREN"):
+        if not self.match(RPAREN):
             tipo, nome = self._param()
             params.append(Param(tipo, nome))
-            while self.match("COMMA"):
-                self.eat("COMMA")
+            while self.match(COMMA):
+                self.eat(COMMA)
                 tipo, nome = self._param()
                 params.append(Param(tipo, nome))
         return params
 
-    def proc_decl(self) -> ProcDecl:
-        self.eat("KW_PROCEDIMENTO")
-        nome = self.eat("IDENT").lexema
-        self.eat("LPAREN")
-        params = self._param_list()
-        self.eat("RPAREN")
-        self.eat("KW_INICIO")
-
-        body = self.bloco_ate({"KW_FIM"})
-        self.eat("KW_FIM")
-
-        return ProcDecl(nome, params, body)
-
-    def func_decl(self) -> FuncDecl:
-        self.eat("KW_FUNCAO")
-        nome = self.eat("IDENT").lexema
-        self.eat("LPAREN")
+    def _cabecalho(self, palavra: int) -> tuple[str, list[Param]]:
+        self.eat(palavra)
+        nome = self.eat(IDENT).lexema
+        self.eat(LPAREN)
         params = self._param_list()
-        self.eat("RPAREN")
-        self.eat("KW_INICIO")
-
-        body = []
+        self.eat(RPAREN)
+        self.eat(KW_INICIO)
+
+        return nome, params
+
+    def proc_decl(self) -> Generator[set[int], list, ProcDecl | None]:
+        try:
+            nome, params = self._cabecalho(KW_PROCEDIMENTO)
+        except ErroSintatico as erro:
+            # o corpo ainda é lido, para achar os erros dele
+            self._registrar(erro)
+            self._sincronizar(KW_INICIO)
+            nome = None
+
+        contexto = self._novo_contexto()
+        body = yield {KW_FIM}
+        self._voltar_contexto(contexto)
+        self.eat(KW_FIM)
+
+        if nome is None:
+            return None
+        return ProcDecl(nome, params, body, nid=next(self._nids))
+
+    def func_decl(self) -> Generator[set[int], list, FuncDecl | None]:
+        try:
+            nome, params = self._cabecalho(KW_FUNCAO)
+        except ErroSintatico as erro:
+            self._registrar(erro)
+            self._sincronizar(KW_INICIO)
+            nome = None
+
+        contexto = self._novo_contexto()
+        body = yield {KW_FIM}
+        self._voltar_contexto(contexto)
+        self.eat(KW_FIM)
+
+        if nome is None:
+            return None
+        return self._funcao(nome, params, body)
+
+    def _funcao(self, nome: str, params: list[Param], body: list) -> FuncDecl | None:
+        # o 'retorne' da função é o último no nível do corpo
         ret = None
-        while not self.match("KW_FIM"):
-            if self.match("KW_RETORNE"):
-                ret = self.return_stmt()
-                body.append(ret)
-            else:
-                body.append(self.comando())
-
-        self.eat("KW_FIM")
+        for s in body:
+            if isinstance(s, Return):
+                ret = s
 
         if ret is None:
             tok = self.current()
-            raise ErroSintatico(
-                f"Função '{nome}' sem 'retorne'.",
-                Posicao(tok.linha, tok.coluna),
+            self._registrar(
+                ErroSintatico(
+                    f"Função '{nome}' sem 'retorne'.",
+                    self._posicao(tok),
+                )
             )
+            return None
 
-        return FuncDecl(nome, params, body, ret)
+        return FuncDecl(nome, params, body, ret, nid=next(self._nids))
 
     def return_stmt(self) -> Return:
-        tok = self.eat("KW_RETORNE")
+        self.eat(KW_RETORNE)
         expr = self.expr()
-        self.eat("SEMI")
-        return Return(expr)
-
-    def condicao(self) -> Expr:
-        left = self.expr()
-
-        if (
-            self.match("GT")
-            or self.match("LT")
-            or self.match("GE")
-            or self.match("LE")
-            or self.match("EQ")
-            or self.match("NE")
-        ):
-            if self.match("GT"):
-                self.eat("GT")
-                op = ">"
-            elif self.match("LT"):
-                self.eat("LT")
-                op = "<"
-            elif self.match("GE"):
-                self.eat("GE")
-                op = ">="
-            elif self.match("LE"):
-                self.eat("LE")
-                op = "<="
-            elif self.match("EQ"):
-                self.eat("EQ")
-                op = "=="
-            else:
-                self.eat("NE")
-                op = "!="
-            right = self.expr()
-            return Compare(op, left, right)
-        return left
-
-    def bloco_ate(self, stop_tokens: set[str]) -> list:
-        """
-        Lê comandos até o token atual ser um dos stop_tokens (sem consumir o stop token).
-        """
-        stmts = []
-
-        while (not self.match("EOF")) and (self.current().tipo not in stop_tokens):
-            stmts.append(self.comando())
-        return stmts
-
-    def se_stmt(self) -> If:
-        self.eat("KW_SE")
-        self.eat("LPAREN")
-        cond = self.condicao()
-        self.eat("RPAREN")
-        self.eat("KW_ENTAO")
-
-        then_block = self.bloco_ate({"KW_SENAO", "KW_FIMSE"})
+        self.eat(SEMI)
+        return Return(expr, nid=next(self._nids))
+
+    def se_stmt(self) -> Generator[set[int], list, If | None]:
+        self.eat(KW_SE)
+        try:
+            self.eat(LPAREN)
+            cond = self.condicao()
+            self.eat(RPAREN)
+            self.eat(KW_ENTAO)
+        except ErroSintatico as erro:
+            self._registrar(erro)
+            self._sincronizar(KW_ENTAO)
+            cond = None
+
+        contexto = self._contexto()
+        then_block = yield {KW_SENAO, KW_FIMSE}
+        self._voltar_contexto(contexto)
 
         else_block = None
-        if self.match("KW_SENAO"):
-            self.eat("KW_SENAO")
-            else_block = self.bloco_ate({"KW_FIMSE"})
-
-        self.eat("KW_FIMSE")
-        return If(cond, then_block, else_block)
-
-    def enquanto_stmt(self) -> While:
-        self.eat("KW_ENQUANTO")
-        self.eat("LPAREN")
-        cond = self.condicao()
-        self.eat("RPAREN")
-        self.eat("KW_FACA")
-
-        block = self.bloco_ate({"KW_FIMENQUANTO"})
-
-        self.eat("KW_FIMENQUANTO")
-        return While(cond, block)
-
-    def termo(self) -> Expr:
-        node = self.fator()
-
-        while self.match("MUL") or self.match("DIV"):
-            if self.match("MUL"):
-                self.eat("MUL")
-                op = "*"
-            else:
-                self.eat("DIV")
-                op = "/"
-
-            right = self.fator()
-            node = BinOp(op, node, right)
-
-        return node
+        if self.match(KW_SENAO):
+            self.eat(KW_SENAO)
+            else_block = yield {KW_FIMSE}
+            self._voltar_contexto(contexto)
+
+        self.eat(KW_FIMSE)
+        if cond is None:
+            return None
+        return If(cond, then_block, else_block, nid=next(self._nids))
+
+    def enquanto_stmt(self) -> Generator[set[int], list, While | None]:
+        self.eat(KW_ENQUANTO)
+        try:
+            self.eat(LPAREN)
+            cond = self.condicao()
+            self.eat(RPAREN)
+            self.eat(KW_FACA)
+        except ErroSintatico as erro:
+            self._registrar(erro)
+            self._sincronizar(KW_FACA)
+            cond = None
+
+        contexto = self._contexto()
+        block = yield {KW_FIMENQUANTO}
+        self._voltar_contexto(contexto)
+
+        self.eat(KW_FIMENQUANTO)
+        if cond is None:
+            return None
+        return While(cond, block, nid=next(self._nids))
 
     def fator(self) -> Expr:
-        token = self.current()
-
-        if token.tipo == "NUM_INT":
-            self.eat("NUM_INT")
-            return NumInt(int(token.lexema))
-
-        if token.tipo == "NUM_REAL":
-            self.eat("NUM_REAL")
-            return NumReal(float(token.lexema))
-
-        if token.tipo == "STRING":
-            self.eat("STRING")
+        """Operando simples: literal ou variável (parênteses e chamadas ficam em _expressao)."""
+        token = self.tokens[self.pos]
+        tipo = token.tipo
+
+        if tipo == NUM_INT:
+            classe, valor = NumInt, int(token.lexema)
+        elif tipo == NUM_REAL:
+            classe, valor = NumReal, float(token.lexema)
+        elif tipo == STRING:
             # remove aspas externas
-            return StrLit(token.lexema[1:-1])
-
-        if token.tipo == "IDENT":
-            nome = self.eat("IDENT").lexema
-            if self.match("LPAREN"):
-                self.eat("LPAREN")
-                args = []
-                if not self.match("RPAREN"):
-                    args.append(self.expr())
-                    while self.match("COMMA"):
-                        self.eat("COMMA")
-                        args.append(self.expr())
-                self.eat("RPAREN")
-                return Call(nome, args)
-            return VarRef(nome)
-
-        if token.tipo == "LPAREN":
-            self.eat("LPAREN")
-            node = self.expr()
-            self.eat("RPAREN")
-            return node
+            classe, valor = StrLit, token.lexema[1:-1]
+        elif tipo == IDENT:
+            classe, valor = VarRef, token.lexema
+        else:
+            raise ErroSintatico(
+                f"Esperado expressão, mas veio {NOMES[tipo]} ({token.lexema})",
+                self._posicao(token),
+            )
 
-        raise ErroSintatico(
-            f"Esperado expressão, mas veio {token.tipo} ({token.lexema})",
-            Posicao(token.linha, token.coluna),
-        )
+        self.pos += 1
+        if self._fabrica is not None:
+            return self._fabrica.folha(classe, valor)
+        return classe(valor, nid=next(self._nids))
+
+    # Modo superficial
+    def esbocar(self) -> list[RotinaEsboco]:
+        """
+        Lê só os cabeçalhos das rotinas. Os corpos e os comandos do programa
+        principal são pulados sem montar AST (a busca por 'inicio'/'fim' é
+        um bytes.find sobre os tipos, um byte por token), e o intervalo de
+        tokens de cada corpo fica guardado para corpo() fazer o parse sob
+        demanda.
+        """
+        tipos = self._tipos()
+        rotinas = []
+        proximas = {KW_PROCEDIMENTO: -1, KW_FUNCAO: -1}
+        i = self.pos
+
+        while True:
+            i = _proxima_rotina(tipos, i, proximas)
+            if i == len(tipos):
+                break
+            rotinas.append(self._esboco(tipos, i))
+            i = rotinas[-1].fim + 1
+
+        self.pos = len(tipos) - 1
+        return rotinas
+
+    def delimitar(self) -> list[tuple[int, int]]:
+        """
+        Os tokens de 'procedimento'/'funcao' e do 'fim' de cada rotina que
+        esbocar() acharia, sem ler os cabeçalhos: o corpo começa depois do
+        primeiro 'inicio'. Se um cabeçalho estiver errado, é esbocar_rotina()
+        que lança o erro.
+        """
+        tipos = self._tipos()
+        limites = []
+        proximas = {KW_PROCEDIMENTO: -1, KW_FUNCAO: -1}
+        i = self.pos
+
+        while True:
+            i = _proxima_rotina(tipos, i, proximas)
+            if i == len(tipos):
+                break
+            fim = self._fim_do_corpo(tipos, _indice(tipos, KW_INICIO, i) + 1)
+            limites.append((i, fim))
+            i = fim + 1
+
+        return limites
+
+    def esbocar_rotina(self, cabecalho: int) -> RotinaEsboco:
+        """O esboço da rotina que começa no token `cabecalho` (ver delimitar)."""
+        return self._esboco(self._tipos(), cabecalho)
+
+    def _tipos(self) -> bytes:
+        if self._tipos_tokens is None:
+            if isinstance(self.tokens, BufferTokens):
+                raise TypeError(
+                    "O modo superficial precisa dos tokens numa sequência "
+                    "(list ou TokensCompactos)."
+                )
+            if isinstance(self.tokens, TokensCompactos):
+                self._tipos_tokens = self.tokens.tipos.tobytes()
+            else:
+                self._tipos_tokens = bytes(tok.tipo for tok in self.tokens)
+        return self._tipos_tokens
+
+    def _esboco(self, tipos: bytes, i: int) -> RotinaEsboco:
+        self.pos = i
+        kind = "proc" if tipos[i] == KW_PROCEDIMENTO else "func"
+        nome, params = self._cabecalho(tipos[i])
+        fim = self._fim_do_corpo(tipos, self.pos)
+        return RotinaEsboco(kind, nome, params, self.pos, fim)
+
+    def _fim_do_corpo(self, tipos: bytes, i: int) -> int:
+        # só rotinas usam 'inicio'/'fim'; um 'inicio' antes do próximo 'fim'
+        # é de uma rotina aninhada
+        abertos = 1
+        while True:
+            fim = _indice(tipos, KW_FIM, i)
+            if fim == len(tipos):
+                self.pos = fim - 1
+                self.eat(KW_FIM)
+
+            inicio = _indice(tipos, KW_INICIO, i, fim)
+            if inicio < fim:
+                abertos += 1
+                i = inicio + 1
+                continue
+
+            abertos -= 1
+            if abertos == 0:
+                return fim
+            i = fim + 1
+
+    def corpo(self, rotina: RotinaEsboco) -> ProcDecl | FuncDecl:
+        """Parse completo de uma rotina lida por esbocar()."""
+        self.pos = rotina.inicio
+        contexto = self._novo_contexto()
+        body = self.bloco_ate({KW_FIM})
+        self._voltar_contexto(contexto)
+        self.eat(KW_FIM)
+
+        if rotina.kind == "proc":
+            return ProcDecl(rotina.nome, rotina.params, body, nid=next(self._nids))
+        return self._funcao(rotina.nome, rotina.params, body)
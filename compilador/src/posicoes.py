@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_right
+
+from .erros import Posicao
+
+
+class IndiceLinhas:
+    """
+    Offset de início de cada linha da fonte. Os tokens guardam só offsets;
+    linha e coluna são resolvidas aqui, por bisseção, quando alguém precisa
+    (mensagens de erro, mapas de fonte, ferramentas).
+
+    Pode ser construído a partir da fonte inteira (o índice só é montado na
+    primeira consulta) ou estendido bloco a bloco no modo streaming.
+    """
+
+    def __init__(self, codigo: str | None = None) -> None:
+        self._codigo = codigo
+        self._inicios: array | None = None if codigo is not None else array("q", [0])
+
+    @property
+    def inicios(self) -> array:
+        if self._inicios is None:
+            self._inicios = array("q", [0])
+            self.estender(self._codigo, 0)
+            self._codigo = None
+        return self._inicios
+
+    def estender(self, trecho: str, base: int) -> None:
+        """Registra as quebras de linha de `trecho`, que começa no offset `base`."""
+        inicios = self.inicios
+        i = trecho.find("\n")
+        while i != -1:
+            inicios.append(base + i + 1)
+            i = trecho.find("\n", i + 1)
+
+    def posicao(self, offset: int) -> Posicao:
+        inicios = self.inicios
+        linha = bisect_right(inicios, offset)
+        return Posicao(linha, offset - inicios[linha - 1] + 1)
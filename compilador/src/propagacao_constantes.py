@@ -0,0 +1,453 @@
+from __future__ import annotations
+
+import math
+import struct
+from collections.abc import Generator
+
+from .ast_nodes import (
+    Program,
+    Stmt,
+    VarDecl,
+    Assign,
+    If,
+    While,
+    ProcDecl,
+    FuncDecl,
+    Expr,
+    NumInt,
+    NumReal,
+    StrLit,
+    VarRef,
+    BinOp,
+    Compare,
+    Call,
+)
+from .reescrita import Reescrita
+from .tabela_simbolos import SimboloRotina, SimboloVar
+
+# Tipo C de uma expressão, como o gerador a emite: 'inteiro' é int; uma
+# variável, parâmetro ou função 'real' é float; um literal real é double.
+# Os dois lados de um operador passam pelas conversões usuais do C.
+INT, FLOAT, DOUBLE, BOOL, CADEIA = range(5)
+
+# Um valor conhecido: (tipo C, valor). Um FLOAT já está arredondado para
+# precisão simples.
+Constante = tuple[int, int | float | bool]
+
+# int de 32 bits; o menor valor fica de fora porque -2147483648 em C é a
+# negação de um literal long
+INT_MAX = 2**31 - 1
+
+
+def _f32(valor: float) -> float | None:
+    """`valor` arredondado para float, ou None se não cabe num float."""
+    try:
+        return struct.unpack("f", struct.pack("f", valor))[0]
+    except OverflowError:
+        return None
+
+
+def _converter(constante: Constante, tipo: int) -> int | float | None:
+    origem, valor = constante
+    if tipo == INT:
+        return valor
+    if tipo == DOUBLE:
+        return float(valor)
+    return valor if origem == FLOAT else _f32(float(valor))
+
+
+def tipo_comum(a: int, b: int) -> int:
+    """Tipo C do resultado de um operador aritmético entre os tipos `a` e `b`."""
+    if a == DOUBLE or b == DOUBLE:
+        return DOUBLE
+    if a == FLOAT or b == FLOAT:
+        return FLOAT
+    return INT
+
+
+def _operar(op: str, tipo: int, a: Constante, b: Constante) -> Constante | None:
+    """
+    `a op b` calculado como em C no tipo `tipo`, ou None se o resultado
+    não é um valor que dê para emitir (divisão por zero, overflow, inf).
+    Um resultado float é a operação em double arredondada para float, que
+    é o mesmo que operar em float (o double tem mais que o dobro dos bits).
+    """
+    x, y = _converter(a, tipo), _converter(b, tipo)
+    if x is None or y is None or (op == "/" and y == 0):
+        return None
+
+    if op == "+":
+        r = x + y
+    elif op == "-":
+        r = x - y
+    elif op == "*":
+        r = x * y
+    elif tipo == INT:
+        # divisão inteira do C: trunca em direção ao zero
+        r = abs(x) // abs(y)
+        if (x < 0) != (y < 0):
+            r = -r
+    else:
+        r = x / y
+
+    if tipo == INT:
+        return (INT, r) if -INT_MAX <= r <= INT_MAX else None
+    if tipo == FLOAT:
+        r = _f32(r)
+    if r is None or not math.isfinite(r):
+        return None
+    return (tipo, r)
+
+
+def _comparar(op: str, a: Constante, b: Constante) -> Constante | None:
+    tipo = tipo_comum(a[0], b[0])
+    x, y = _converter(a, tipo), _converter(b, tipo)
+    if x is None or y is None:
+        return None
+    if op == ">":
+        r = x > y
+    elif op == "<":
+        r = x < y
+    elif op == ">=":
+        r = x >= y
+    elif op == "<=":
+        r = x <= y
+    elif op == "==":
+        r = x == y
+    else:
+        r = x != y
+    return (BOOL, r)
+
+
+def _mesma(a: Constante | None, b: Constante | None) -> bool:
+    # 0.0 == -0.0, mas são valores diferentes em C
+    return a == b and (a is None or str(a[1]) == str(b[1]))
+
+
+def tipo_c(expr: Expr, simbolos: list[SimboloVar | SimboloRotina | None]) -> int:
+    """Tipo C de `expr`, sem recursão."""
+    tipos: list[int] = []
+    pilha: list = [expr]
+    while pilha:
+        node = pilha.pop()
+        classe = node.__class__
+        if classe is NumInt:
+            tipos.append(INT)
+        elif classe is NumReal:
+            tipos.append(DOUBLE)
+        elif classe is StrLit:
+            tipos.append(CADEIA)
+        elif classe is VarRef or classe is Call:
+            sym = simbolos[node.nid]
+            tipo = sym.tipo if classe is VarRef else sym.retorno
+            tipos.append({"inteiro": INT, "real": FLOAT}.get(tipo, CADEIA))
+        elif classe is BinOp or classe is Compare:
+            pilha.append((node,))
+            pilha.append(node.right)
+            pilha.append(node.left)
+        else:
+            direita = tipos.pop()
+            esquerda = tipos.pop()
+            if node[0].__class__ is Compare:
+                tipos.append(BOOL)
+            else:
+                tipos.append(tipo_comum(esquerda, direita))
+    return tipos[0]
+
+
+def _sem_declaracoes(bloco: list[Stmt]) -> bool:
+    return not any(s.__class__ is VarDecl for s in bloco)
+
+
+def atribuidas(
+    loop: While,
+    simbolos: list[SimboloVar | SimboloRotina | None],
+    guardadas: dict[int, set[int]],
+) -> set[int]:
+    """
+    ids dos símbolos das variáveis atribuídas no corpo de `loop`, nos
+    blocos aninhados também. `guardadas` (id de cada 'enquanto' -> o
+    resultado dele) é mantido entre as chamadas: calcular um 'enquanto' já
+    guarda os de dentro dele, então um aninhamento profundo é percorrido
+    uma vez só.
+    """
+    if id(loop) in guardadas:
+        return guardadas[id(loop)]
+
+    # um conjunto por 'enquanto' aberto; a marca (loop,) fecha o dele
+    abertos: list[set[int]] = [set()]
+    pilha: list = [(loop,), *loop.block]
+    while pilha:
+        stmt = pilha.pop()
+        classe = stmt.__class__
+        if classe is Assign:
+            abertos[-1].add(id(simbolos[stmt.nid]))
+        elif classe is If:
+            pilha += stmt.then_block
+            if stmt.else_block is not None:
+                pilha += stmt.else_block
+        elif classe is While:
+            if id(stmt) in guardadas:
+                abertos[-1] |= guardadas[id(stmt)]
+            else:
+                abertos.append(set())
+                pilha.append((stmt,))
+                pilha += stmt.block
+        elif classe is tuple:
+            feitas = guardadas[id(stmt[0])] = abertos.pop()
+            if abertos:
+                abertos[-1] |= feitas
+    return guardadas[id(loop)]
+
+
+class PropagacaoConstantes(Reescrita):
+    """
+    Dobra as operações entre constantes e propaga o valor das variáveis
+    inteiro e real atribuídas com uma constante, ao longo do código em
+    linha reta. Um 'se' de condição conhecida vira o bloco que executa
+    (ou só o 'se' com esse bloco, se ele declara variáveis), e um
+    'enquanto' de condição falsa some.
+
+    As contas seguem o C gerado: divisão inteira que trunca, int de 32
+    bits, float para variáveis reais e double para literais reais. Um
+    valor que o C não calcularia igual (overflow, divisão por zero) fica
+    como está. Um valor float só vira literal (double) onde o C o
+    converteria para double de qualquer jeito, ou onde ele é guardado,
+    escrito, passado ou devolvido; ao lado de um int ou de outro float, a
+    expressão original continua.
+
+    Depois de um 'se', ficam as variáveis com o mesmo valor nos dois
+    caminhos; um 'enquanto' esquece as variáveis atribuídas no corpo dele.
+    As rotinas não enxergam as variáveis do programa principal e recebem
+    argumentos por valor, então uma chamada não muda nada.
+
+    Os nós novos ganham nids a partir de Program.n_nos, com tipo e símbolo
+    acrescentados às listas da semântica; os nós que não mudam são os
+    mesmos objetos.
+    """
+
+    def __init__(
+        self,
+        simbolos: list[SimboloVar | SimboloRotina | None],
+        tipos_expr: list[str | None],
+    ) -> None:
+        super().__init__(simbolos, tipos_expr)
+        # valores conhecidos no bloco atual, pelo id do símbolo da variável
+        # (símbolos iguais podem ser de declarações diferentes)
+        self._valores: dict[int, Constante] = {}
+        # id de cada 'enquanto' -> ids dos símbolos atribuídos nele
+        self._atribuidas_em: dict[int, set[int]] = {}
+
+    def _comandos(self, program: Program) -> list[Stmt]:
+        return self._bloco((program.comandos, {}))[0]
+
+    # Os compostos fazem `yield` de cada bloco interno com os valores do
+    # começo dele, e recebem de volta os comandos novos e os valores no
+    # fim do bloco
+    def _abrir(self, bloco: tuple[list[Stmt], dict[int, Constante]]) -> list[Stmt]:
+        stmts, self._valores = bloco
+        return super()._abrir(stmts)
+
+    def _resultado(self) -> tuple[list[Stmt], dict[int, Constante]]:
+        return self._saida, self._valores
+
+    _estado = _resultado
+
+    def _restaurar(self, estado: tuple[list[Stmt], dict[int, Constante]]) -> None:
+        self._saida, self._valores = estado
+
+    # Um método por classe de comando, chamado por visitar(); os que não
+    # estão aqui são os de Reescrita. Um composto pode devolver a lista de
+    # comandos que o substituem
+    def _var_decl(self, stmt: VarDecl) -> None:
+        self._valores.pop(id(self.simbolos[stmt.nid]), None)
+        self._saida.append(stmt)
+
+    def _assign(self, stmt: Assign) -> None:
+        expr, valor = self._avaliar(stmt.expr)
+        sym = self.simbolos[stmt.nid]
+        chave = id(sym)
+
+        if valor is not None and sym.tipo == "inteiro":
+            self._valores[chave] = valor
+        elif valor is not None and sym.tipo == "real":
+            guardado = _converter(valor, FLOAT)
+            if guardado is None:
+                self._valores.pop(chave, None)
+            else:
+                self._valores[chave] = (FLOAT, guardado)
+        else:
+            self._valores.pop(chave, None)
+
+        if expr is not stmt.expr:
+            stmt = Assign(stmt.nome, expr, nid=stmt.nid)
+        self._saida.append(stmt)
+
+    def _if(self, stmt: If) -> Generator | list[Stmt]:
+        cond, valor = self._avaliar(stmt.cond)
+        if valor is not None:
+            bloco = stmt.then_block if valor[1] else stmt.else_block
+            if bloco is None:
+                return []
+            # sem declarações, o bloco pode ir para o escopo de fora
+            if _sem_declaracoes(bloco):
+                return bloco
+        return self._se(stmt, cond, valor)
+
+    def _se(self, stmt: If, cond: Expr, valor: Constante | None) -> Generator:
+        valores = self._valores
+        if valor is not None:
+            # só o bloco que executa, que declara variáveis
+            bloco, depois = yield (
+                stmt.then_block if valor[1] else stmt.else_block,
+                dict(valores),
+            )
+            then_block, else_block = (bloco, None) if valor[1] else ([], bloco)
+        else:
+            then_block, depois = yield (stmt.then_block, dict(valores))
+            else_block = None
+            senao = valores
+            if stmt.else_block is not None:
+                else_block, senao = yield (stmt.else_block, dict(valores))
+            for chave in [c for c in depois if not _mesma(depois[c], senao.get(c))]:
+                del depois[chave]
+
+        valores.clear()
+        valores.update(depois)
+        self._saida.append(self._se_novo(stmt, cond, then_block, else_block))
+
+    def _while(self, stmt: While) -> Generator | list[Stmt]:
+        # falsa na entrada, o corpo nunca executa
+        valor = self._avaliar(stmt.cond, reescrever=False)[1]
+        if valor is not None and not valor[1]:
+            return []
+
+        # nas voltas seguintes só vale o que o corpo não muda
+        for chave in atribuidas(stmt, self.simbolos, self._atribuidas_em):
+            self._valores.pop(chave, None)
+        cond = self._expr(stmt.cond)
+        return self._enquanto(stmt, cond)
+
+    def _enquanto(self, stmt: While, cond: Expr) -> Generator:
+        block, _ = yield (stmt.block, dict(self._valores))
+        self._saida.append(self._enquanto_novo(stmt, cond, block))
+
+    def _proc_decl(self, stmt: ProcDecl | FuncDecl) -> Generator:
+        # os parâmetros não têm valor conhecido
+        body, _ = yield (stmt.body, {})
+        self._saida.append(self._rotina_nova(stmt, body))
+
+    _func_decl = _proc_decl
+
+    # Expressions
+    def _expr(self, expr: Expr) -> Expr:
+        return self._avaliar(expr)[0]
+
+    def _avaliar(
+        self, expr: Expr, reescrever: bool = True
+    ) -> tuple[Expr, Constante | None]:
+        """
+        `expr` otimizada e o valor dela, se é conhecido. Sem `reescrever`,
+        só o valor é calculado, e o nó devolvido é o próprio `expr`.
+
+        Percorre a árvore em pós-ordem com uma pilha explícita; a marca
+        (node,) na pilha combina os filhos de `node`, que ficam em
+        `resultados` como (nó otimizado, valor, tipo C).
+        """
+        simbolos = self.simbolos
+        resultados: list[tuple[Expr, Constante | None, int]] = []
+        pilha: list = [expr]
+
+        while pilha:
+            node = pilha.pop()
+            classe = node.__class__
+
+            if classe is NumInt:
+                valor = (INT, node.valor) if node.valor <= INT_MAX else None
+                resultados.append((node, valor, INT))
+            elif classe is NumReal:
+                valor = (DOUBLE, node.valor) if math.isfinite(node.valor) else None
+                resultados.append((node, valor, DOUBLE))
+            elif classe is StrLit:
+                resultados.append((node, None, CADEIA))
+            elif classe is VarRef:
+                sym = simbolos[node.nid]
+                tipo = {"inteiro": INT, "real": FLOAT}.get(sym.tipo, CADEIA)
+                resultados.append((node, self._valores.get(id(sym)), tipo))
+
+            elif classe is BinOp or classe is Compare or classe is Call:
+                pilha.append((node,))
+                if classe is Call:
+                    pilha += reversed(node.args)
+                else:
+                    pilha.append(node.right)
+                    pilha.append(node.left)
+
+            else:
+                node = node[0]
+                classe = node.__class__
+                if classe is Call:
+                    n = len(node.args)
+                    if reescrever:
+                        args = [
+                            self._literal(*r[:2])
+                            for r in resultados[len(resultados) - n :]
+                        ]
+                        if any(a is not b for a, b in zip(args, node.args)):
+                            node = Call(node.nome, args, nid=node.nid)
+                    del resultados[len(resultados) - n :]
+                    retorno = simbolos[node.nid].retorno
+                    tipo = {"inteiro": INT, "real": FLOAT}.get(retorno, CADEIA)
+                    resultados.append((node, None, tipo))
+                    continue
+
+                left, vl, tl = resultados[-2]
+                right, vr, tr = resultados[-1]
+                del resultados[-2:]
+                if classe is BinOp:
+                    tipo = tipo_comum(tl, tr)
+                    valor = None
+                    if vl is not None and vr is not None:
+                        valor = _operar(node.op, tipo, vl, vr)
+                else:
+                    tipo = BOOL
+                    valor = None
+                    if vl is not None and vr is not None:
+                        valor = _comparar(node.op, vl, vr)
+
+                resultados.append((node, valor, tipo))
+                if not reescrever or (
+                    valor is not None and (tipo == INT or tipo == DOUBLE)
+                ):
+                    continue  # o nó todo vai virar um literal
+
+                # um float ao lado de um int ou float seria calculado em
+                # precisão simples; como literal, em double
+                left = self._literal(left, vl, tr == DOUBLE)
+                right = self._literal(right, vr, tl == DOUBLE)
+                if left is not node.left or right is not node.right:
+                    node = classe(node.op, left, right, nid=node.nid)
+                    resultados[-1] = (node, valor, tipo)
+
+        node, valor, _ = resultados[0]
+        if not reescrever:
+            return expr, valor
+        return self._literal(node, valor), valor
+
+    def _literal(
+        self, node: Expr, valor: Constante | None, double_ao_lado: bool = True
+    ) -> Expr:
+        """`node` trocado pelo literal de `valor`, onde isso não muda o resultado."""
+        if (
+            valor is None
+            or valor[0] == BOOL
+            or (valor[0] == FLOAT and not double_ao_lado)
+            or node.__class__ is NumInt
+            or node.__class__ is NumReal
+        ):
+            return node
+
+        if valor[0] == INT:
+            return NumInt(valor[1], nid=self._novo_nid(None, "inteiro"))
+        return NumReal(valor[1], nid=self._novo_nid(None, "real"))
+
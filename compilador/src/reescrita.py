@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+from collections.abc import Generator, Iterator
+from typing import Any
+
+from .ast_nodes import (
+    Program,
+    Stmt,
+    VarDecl,
+    Assign,
+    Write,
+    If,
+    While,
+    ProcDecl,
+    FuncDecl,
+    CallStmt,
+    Return,
+    Expr,
+    VarRef,
+)
+from .tabela_simbolos import SimboloRotina, SimboloVar
+from .visitante import Visitante
+
+
+class Reescrita(Visitante):
+    """
+    Base dos passes de otimizar() que reescrevem a AST analisada:
+    Passe(simbolos, tipos_expr).otimizar(program) devolve uma AST nova, com
+    os nós que não mudaram reaproveitados (o próprio `program`, se nada
+    mudou), e acrescenta a `simbolos` e `tipos_expr` os nós que criou.
+
+    _bloco percorre um bloco e os aninhados nele sem recursão, chamando
+    visitar() para cada comando. O método de um comando simples acrescenta
+    o que fica dele a `_saida`; o de um composto devolve um gerador que faz
+    `yield` de cada bloco interno e recebe de volta o resultado dele, ou
+    uma lista de comandos que o substituem e são percorridos no mesmo
+    bloco. Um comando que põe `_terminou` encerra o bloco: o resto dele não
+    é visitado.
+
+    Os métodos padrão de cada comando reescrevem as expressões com _expr
+    (que não muda nada, se o passe não a redefine) e os blocos internos;
+    um passe redefine só os comandos que trata de outro jeito. O que um
+    composto passa no `yield`, e o que recebe de volta, são _abrir e
+    _resultado; por padrão, o bloco e os comandos novos dele.
+    """
+
+    # prefixo dos nomes das temporárias que o passe cria (ver _temporaria)
+    PREFIXO_TEMPORARIAS = "_tmp"
+
+    def __init__(
+        self,
+        simbolos: list[SimboloVar | SimboloRotina | None],
+        tipos_expr: list[str | None],
+    ) -> None:
+        # ambos vêm de AnalisadorSemantico e ganham os nids dos nós novos
+        self.simbolos = simbolos
+        self.tipos_expr = tipos_expr
+        self._program: Program | None = None
+        # bloco atual: comandos novos e se ele já terminou
+        self._saida: list[Stmt] = []
+        self._terminou = False
+        # nomes declarados no programa, que as temporárias não podem usar
+        self._usados: set[str] | None = None
+        self._temporarias = 0
+
+    def otimizar(self, program: Program) -> Program:
+        # a AST pode ter nids além do fim das listas (cache, passes anteriores)
+        falta = program.n_nos - len(self.tipos_expr)
+        if falta > 0:
+            self.tipos_expr.extend([None] * falta)
+            self.simbolos.extend([None] * falta)
+
+        self._program = program
+        comandos = self._comandos(program)
+        if mesmos(comandos, program.comandos):
+            return program
+        return Program(comandos, len(self.tipos_expr))
+
+    def _comandos(self, program: Program) -> list[Stmt]:
+        """Os comandos novos do programa."""
+        return self._bloco(program.comandos)
+
+    def _bloco(self, bloco: Any) -> Any:
+        """
+        Percorre `bloco` (o que um composto faria `yield`) e tudo o que
+        estiver aninhado nele, sem recursão; devolve o _resultado dele.
+        """
+        # blocos suspensos: (gerador do bloco de fora, comandos pendentes,
+        # estado do bloco)
+        pilha: list[tuple[Generator | None, list[Iterator[Stmt]], Any]] = []
+        gerador: Generator | None = None
+        pendentes = [iter(self._abrir(bloco))]
+
+        while True:
+            sub = None
+            while pendentes and not self._terminou:
+                for stmt in pendentes[-1]:
+                    sub = self.visitar(stmt)
+                    if sub is not None or self._terminou:
+                        break
+                else:
+                    pendentes.pop()
+                    continue
+                if sub.__class__ is not list:
+                    break
+                pendentes.append(iter(sub))
+                sub = None
+
+            if sub is not None:
+                pilha.append((gerador, pendentes, self._estado()))
+                gerador, resultado = sub, None
+            else:
+                resultado = self._resultado()
+                if gerador is None:
+                    return resultado
+                # o bloco interno acabou: volta para o de fora, que não
+                # tinha terminado (senão não teria entrado nele)
+                self._restaurar(pilha[-1][2])
+                self._terminou = False
+
+            try:
+                bloco = gerador.send(resultado)
+            except StopIteration:
+                gerador, pendentes, estado = pilha.pop()
+                self._restaurar(estado)
+                continue
+            pendentes = [iter(self._abrir(bloco))]
+
+    def _abrir(self, bloco: Any) -> list[Stmt]:
+        """Começa um bloco interno a partir do que o composto fez `yield`; devolve os comandos dele."""
+        self._saida, self._terminou = [], False
+        return bloco
+
+    def _resultado(self) -> Any:
+        """O que o bloco que acabou devolve ao composto que o abriu."""
+        return self._saida
+
+    def _estado(self) -> Any:
+        """O estado do bloco atual, guardado enquanto um interno é percorrido."""
+        return self._saida
+
+    def _restaurar(self, estado: Any) -> None:
+        self._saida = estado
+
+    # Um método por classe de comando, chamado por visitar()
+    def _var_decl(self, stmt: VarDecl) -> None:
+        self._saida.append(stmt)
+
+    def _assign(self, stmt: Assign) -> None:
+        expr = self._expr(stmt.expr)
+        if expr is not stmt.expr:
+            stmt = Assign(stmt.nome, expr, nid=stmt.nid)
+        self._saida.append(stmt)
+
+    def _write(self, stmt: Write) -> None:
+        expr = self._expr(stmt.expr)
+        if expr is not stmt.expr:
+            stmt = Write(expr, nid=stmt.nid)
+        self._saida.append(stmt)
+
+    def _call_stmt(self, stmt: CallStmt) -> None:
+        call = self._expr(stmt.call)
+        if call is not stmt.call:
+            stmt = CallStmt(call, nid=stmt.nid)
+        self._saida.append(stmt)
+
+    def _return(self, stmt: Return) -> None:
+        expr = self._expr(stmt.expr)
+        if expr is not stmt.expr:
+            stmt = Return(expr, nid=stmt.nid)
+        self._saida.append(stmt)
+
+    def _if(self, stmt: If) -> Generator | list[Stmt]:
+        cond = self._expr(stmt.cond)
+        then_block = yield stmt.then_block
+        else_block = None
+        if stmt.else_block is not None:
+            else_block = yield stmt.else_block
+        self._saida.append(self._se_novo(stmt, cond, then_block, else_block))
+
+    def _while(self, stmt: While) -> Generator | list[Stmt]:
+        cond = self._expr(stmt.cond)
+        block = yield stmt.block
+        self._saida.append(self._enquanto_novo(stmt, cond, block))
+
+    def _proc_decl(self, stmt: ProcDecl) -> Generator:
+        body = yield stmt.body
+        self._saida.append(self._rotina_nova(stmt, body))
+
+    _func_decl = _proc_decl
+
+    def _expr(self, expr: Expr) -> Expr:
+        """`expr` reescrita; a mesma, se nada muda."""
+        return expr
+
+    # Nós novos
+    def _se_novo(
+        self,
+        stmt: If,
+        cond: Expr,
+        then_block: list[Stmt],
+        else_block: list[Stmt] | None,
+    ) -> If:
+        """`stmt` com as partes dadas, ou ele mesmo se são as dele."""
+        if (
+            cond is stmt.cond
+            and mesmos(then_block, stmt.then_block)
+            and mesmos(else_block, stmt.else_block)
+        ):
+            return stmt
+        return If(cond, then_block, else_block, nid=stmt.nid)
+
+    def _enquanto_novo(self, stmt: While, cond: Expr, block: list[Stmt]) -> While:
+        """`stmt` com as partes dadas, ou ele mesmo se são as dele."""
+        if cond is stmt.cond and mesmos(block, stmt.block):
+            return stmt
+        return While(cond, block, nid=stmt.nid)
+
+    def _rotina_nova(
+        self, stmt: ProcDecl | FuncDecl, body: list[Stmt]
+    ) -> ProcDecl | FuncDecl:
+        """`stmt` com o corpo `body`, ou ele mesmo se o corpo é o dele."""
+        if mesmos(body, stmt.body):
+            return stmt
+        if stmt.__class__ is ProcDecl:
+            return ProcDecl(stmt.nome, stmt.params, body, nid=stmt.nid)
+        # como no parser, o último 'retorne' do nível do corpo
+        ret = next(s for s in reversed(body) if s.__class__ is Return)
+        return FuncDecl(stmt.nome, stmt.params, body, ret, nid=stmt.nid)
+
+    def _novo_nid(self, sym: SimboloVar | SimboloRotina | None, tipo: str | None) -> int:
+        """nid para um nó novo, com o símbolo e o tipo dele nas listas."""
+        self.simbolos.append(sym)
+        self.tipos_expr.append(tipo)
+        return len(self.tipos_expr) - 1
+
+    def _temporaria(self, node: Expr, tipo: str) -> tuple[list[Stmt], VarRef]:
+        """
+        Uma variável nova do `tipo` Portugol, com um nome que o programa
+        não usa: a declaração e a atribuição de `node` a ela, e a leitura.
+        """
+        if self._usados is None:
+            self._usados = nomes_declarados(self._program.comandos)
+        while True:
+            self._temporarias += 1
+            nome = f"{self.PREFIXO_TEMPORARIAS}{self._temporarias}"
+            if nome not in self._usados:
+                break
+
+        sym = SimboloVar("var", nome, tipo)
+        atribuicao = [
+            VarDecl(tipo, nome, nid=self._novo_nid(sym, None)),
+            Assign(nome, node, nid=self._novo_nid(sym, None)),
+        ]
+        return atribuicao, VarRef(nome, nid=self._novo_nid(sym, tipo))
+
+
+def mesmos(a: list[Stmt] | None, b: list[Stmt] | None) -> bool:
+    """Se os blocos `a` e `b` têm os mesmos objetos, na mesma ordem."""
+    if a is None or b is None:
+        return a is b
+    return len(a) == len(b) and all(x is y for x, y in zip(a, b))
+
+
+def nomes_declarados(comandos: list[Stmt]) -> set[str]:
+    """Nomes declarados em `comandos`: variáveis, parâmetros e rotinas."""
+    nomes: set[str] = set()
+    pilha = list(comandos)
+    while pilha:
+        stmt = pilha.pop()
+        classe = stmt.__class__
+        if classe is VarDecl:
+            nomes.add(stmt.nome)
+        elif classe is ProcDecl or classe is FuncDecl:
+            nomes.add(stmt.nome)
+            nomes.update(p.nome for p in stmt.params)
+            pilha += stmt.body
+        elif classe is If:
+            pilha += stmt.then_block
+            if stmt.else_block is not None:
+                pilha += stmt.else_block
+        elif classe is While:
+            pilha += stmt.block
+    return nomes
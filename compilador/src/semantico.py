@@ -1,5 +1,11 @@
 from __future__ import annotations
 
+import gc
+import multiprocessing
+import sys
+from collections.abc import Callable, Generator, Iterable, Iterator, Sequence
+from typing import TypeVar
+
 from .ast_nodes import (
     Program,
     Stmt,
@@ -21,39 +27,297 @@ from .ast_nodes import (
     Compare,
     Call,
     Param,
+    RotinaEsboco,
 )
 from .erros import ErroCompilador
+from .grafo_chamadas import GrafoChamadas, chamadas
 from .tabela_simbolos import TabelaDeSimbolos, SimboloVar, SimboloRotina
+from .visitante import Visitante
 
 
 class ErroSemantico(ErroCompilador):
     pass
 
 
-class AnalisadorSemantico:
-    def __init__(self) -> None:
+# resultado da análise de uma rotina (ver _analisar_componente)
+T = TypeVar("T")
+
+
+# O que os processos de _rotinas_em_paralelo herdam do pai pelo fork:
+# (n_nos, rotinas, faixas de nids das rotinas, tabela com as rotinas
+# registradas)
+_HERANCA: tuple | None = None
+
+# Em cada processo filho, o analisador usado por todas as tarefas dele
+_ANALISADOR: AnalisadorSemantico | None = None
+
+
+class AnalisadorSemantico(Visitante):
+    def __init__(self, max_erros: int = 1, processos: int = 1) -> None:
         self.tabela = TabelaDeSimbolos()
-        self.tipos_expr: dict[int, str] = {}
-        self._ctx_func_retorno: str | None = (
-            None  # None quando não estamos dentro de função
-        )
+        # tipo de cada expressão, indexado pelo nid (ver ast_nodes.No)
+        self.tipos_expr: list[str | None] = []
+        # símbolo a que cada nó se refere (VarRef, Call, Assign) ou que ele
+        # declara (VarDecl, ProcDecl, FuncDecl), também pelo nid; com isso o
+        # gerador de código não precisa da tabela
+        self.simbolos: list[SimboloVar | SimboloRotina | None] = []
+        # os 'retorne' já analisados da função atual; None quando não
+        # estamos dentro de função
+        self._ctx_func_retorno: list[Return] | None = None
+
+        # Como no Parser: com max_erros > 1 os erros vão para `erros`, o
+        # comando que falhou é descartado e a análise segue no próximo. O
+        # erro de número max_erros é lançado.
+        self.max_erros = max_erros
+        self.erros: list[ErroSemantico] = []
+        # nids das declarações de rotina que não entraram na tabela (nome
+        # repetido): o retorno inferido delas não vai para a tabela
+        self._duplicadas: set[int] = set()
+        # nos processos de _rotinas_em_paralelo: a faixa de nids da rotina
+        # em análise, e os nids de fora dela que receberam tipo
+        self._faixa = (0, sys.maxsize)
+        self._fora_da_faixa: list[int] = []
+
+        # com processos > 1 os corpos das rotinas são analisados em paralelo
+        # (ver _rotinas_em_paralelo); o resultado é o mesmo
+        self.processos = processos
 
     def analisar(self, program: Program) -> None:
-        for stmt in program.comandos:
-            if isinstance(stmt, ProcDecl):
-                self._registrar_proc(stmt)
-            elif isinstance(stmt, FuncDecl):
-                self._registrar_func_stub(stmt)
+        self._reservar(program.n_nos)
 
-        for stmt in program.comandos:
-            if isinstance(stmt, (ProcDecl, FuncDecl)):
-                self._stmt(stmt)
+        rotinas = [s for s in program.comandos if isinstance(s, (ProcDecl, FuncDecl))]
+        self.registrar_rotinas(rotinas)
 
+        # os nós de um comando do programa têm os nids entre o do comando
+        # anterior e o dele (ver ast_nodes.No)
+        faixas: list[tuple[int, int]] = []
+        anterior = -1
         for stmt in program.comandos:
-            if not isinstance(stmt, (ProcDecl, FuncDecl)):
-                self._stmt(stmt)
+            if isinstance(stmt, (ProcDecl, FuncDecl)):
+                faixas.append((anterior + 1, stmt.nid + 1))
+            anterior = stmt.nid
+
+        if (
+            self.processos > 1
+            and len(rotinas) > 1
+            and not self.erros  # com nomes repetidos, só a análise serial
+            and "fork" in multiprocessing.get_all_start_methods()
+        ):
+            self._rotinas_em_paralelo(program, rotinas, faixas)
+        else:
+            self._rotinas(rotinas, faixas)
+        self._bloco(
+            [s for s in program.comandos if not isinstance(s, (ProcDecl, FuncDecl))]
+        )
 
-    def _registrar_proc(self, stmt: ProcDecl) -> None:
+    def _rotinas(
+        self, rotinas: list[ProcDecl | FuncDecl], faixas: list[tuple[int, int]]
+    ) -> None:
+        """
+        Analisa os corpos das rotinas. O retorno de uma função é inferido
+        do corpo dela, então as funções chamadas são analisadas antes de
+        quem as chama, na ordem das componentes fortemente conexas do grafo
+        de chamadas (ver _analisar_componente); assim a ordem das
+        declarações no fonte não importa. Os erros são registrados no fim,
+        na ordem das rotinas.
+        """
+        grafo = GrafoChamadas(rotinas)
+        erros: list[list[ErroSemantico]] = [[] for _ in rotinas]
+        for componente in grafo.componentes(so_funcoes=True):
+            recursiva = grafo.recursiva(componente)
+            for i, lista in self._analisar_componente(
+                rotinas,
+                componente,
+                recursiva,
+                lambda i: self._analisar_rotina(rotinas[i], faixas[i]),
+            ):
+                erros[i] = lista
+
+        for lista in erros:
+            for erro in lista:
+                self._registrar(erro)
+
+    def _analisar_componente(
+        self,
+        rotinas: list[ProcDecl | FuncDecl],
+        componente: list[int],
+        recursiva: bool,
+        analisar: Callable[[int], T],
+    ) -> list[tuple[int, T]]:
+        """
+        Analisa as rotinas da componente, com os retornos das funções que
+        ela chama de fora já definidos, e devolve o resultado de cada uma.
+        analisar(i) analisa rotinas[i], sem tipos nem símbolos de uma
+        análise anterior dela (a análise não percorre de novo um nó que já
+        tem tipo), e devolve o resultado.
+
+        Numa componente recursiva os retornos dependem uns dos outros: os
+        corpos são analisados de novo até os retornos pararem de mudar.
+        Na primeira passada uma chamada dentro da componente ainda não tem
+        tipo, e o 'retorne' que depende dela é descartado (ver _func_decl);
+        os que não dependem, como o caso base num 'se', dão os primeiros
+        retornos. A passada em que nada muda é a que vale.
+        """
+        if not recursiva:
+            return [(i, analisar(i)) for i in componente]
+
+        def retornos() -> list[str | None]:
+            return [self.tabela.buscar(rotinas[i].nome).retorno for i in componente]
+
+        # um retorno só muda de nenhum para um tipo, ou de inteiro para
+        # real, então isso basta quando a iteração converge; é só um limite
+        # para os casos que não convergem
+        for _ in range(3 * len(componente) + 1):
+            antes = retornos()
+            resultado = [(i, analisar(i)) for i in componente]
+            if retornos() == antes:
+                break
+        return resultado
+
+    def _analisar_rotina(
+        self, rotina: ProcDecl | FuncDecl, faixa: tuple[int, int]
+    ) -> list[ErroSemantico]:
+        """Analisa `rotina`, cujos nós têm os nids da `faixa`, e devolve os erros dela."""
+        lo, hi = faixa
+        self.tipos_expr[lo:hi] = self.simbolos[lo:hi] = [None] * (hi - lo)
+        return self._analisar_isolada([rotina])
+
+    def _analisar_isolada(self, stmts: list[Stmt]) -> list[ErroSemantico]:
+        """Analisa `stmts` e devolve os erros deles, sem registrá-los."""
+        erros, max_erros = self.erros, self.max_erros
+        self.erros, self.max_erros = [], sys.maxsize
+        try:
+            self._bloco(stmts)
+            return self.erros
+        finally:
+            self.erros, self.max_erros = erros, max_erros
+
+    def registrar_rotinas(
+        self, rotinas: Iterable[ProcDecl | FuncDecl | RotinaEsboco]
+    ) -> None:
+        """
+        Declara as rotinas na tabela global. Só os cabeçalhos são usados,
+        então os de Parser.esbocar servem sem o parse dos corpos.
+        """
+        for stmt in rotinas:
+            if isinstance(stmt, RotinaEsboco):
+                proc = stmt.kind == "proc"
+            else:
+                proc = isinstance(stmt, ProcDecl)
+
+            try:
+                if proc:
+                    self._registrar_proc(stmt)
+                else:
+                    self._registrar_func_stub(stmt)
+            except ErroSemantico as erro:
+                if not isinstance(stmt, RotinaEsboco):
+                    self._duplicadas.add(stmt.nid)
+                self._registrar(erro)
+
+    def _rotinas_em_paralelo(
+        self,
+        program: Program,
+        rotinas: list[ProcDecl | FuncDecl],
+        faixas: list[tuple[int, int]],
+    ) -> None:
+        """
+        Faz o mesmo que _rotinas num pool de processos, com o mesmo
+        resultado: tipos, símbolos, retornos e erros, na mesma ordem.
+
+        Uma componente do grafo de chamadas só depende dos retornos das
+        funções de outras componentes que ela chama. Por isso as componentes
+        são divididas em níveis: as do nível 0 não chamam funções de fora
+        delas, e as do nível k chamam alguma do nível k - 1. Cada nível é
+        analisado em paralelo com os retornos dos anteriores. No fim os
+        resultados são juntados na ordem das rotinas, e os erros passam por
+        _registrar nessa ordem.
+        """
+        global _HERANCA
+
+        n_partes = self.processos * 2
+        resultados: list[tuple] = [()] * len(rotinas)
+        extras: list[tuple[int, str]] = []
+
+        _HERANCA = (program.n_nos, rotinas, faixas, self.tabela)
+        # Sem o freeze, a primeira coleta em cada processo filho varreria a
+        # AST herdada inteira, copiando todas as páginas de memória dela.
+        gc.freeze()
+        try:
+            contexto = multiprocessing.get_context("fork")
+            with contexto.Pool(self.processos, _iniciar_processo) as pool:
+                nomes_chamados = [
+                    nomes
+                    for parte in pool.map(
+                        _chamadas_das_rotinas,
+                        _partes(range(len(rotinas)), n_partes),
+                    )
+                    for nomes in parte
+                ]
+                grafo = GrafoChamadas(rotinas, nomes_chamados)
+
+                # as componentes vêm depois das que elas chamam
+                funcao = [isinstance(r, FuncDecl) for r in rotinas]
+                nivel_de = [0] * len(rotinas)
+                niveis: list[list[tuple[list[int], bool]]] = []
+                for componente in grafo.componentes(so_funcoes=True):
+                    nivel = 1 + max(
+                        (
+                            nivel_de[j]
+                            for i in componente
+                            for j in grafo.arestas[i]
+                            if funcao[j] and j not in componente
+                        ),
+                        default=-1,
+                    )
+                    for i in componente:
+                        nivel_de[i] = nivel
+                    if nivel == len(niveis):
+                        niveis.append([])
+                    niveis[nivel].append((componente, grafo.recursiva(componente)))
+
+                retornos: list[tuple[str, str]] = []
+                for componentes in niveis:
+                    tarefas = [
+                        (parte, retornos) for parte in _partes(componentes, n_partes)
+                    ]
+                    novos = []
+                    for parte, extras_parte in pool.map(_analisar_rotinas, tarefas):
+                        extras += extras_parte
+                        for i, resultado in parte:
+                            resultados[i] = resultado
+                            if resultado[1] is not None:
+                                novos.append((rotinas[i].nome, resultado[1]))
+                    retornos = retornos + novos
+        finally:
+            _HERANCA = None
+            gc.unfreeze()
+
+        for i, (mensagens, retorno, tipos, simbolos) in enumerate(resultados):
+            lo, hi = faixas[i]
+            self.tipos_expr[lo:hi] = tipos
+            self.simbolos[lo:hi] = simbolos
+            if retorno is not None and funcao[i]:
+                self.simbolos[hi - 1] = self.tabela.definir_retorno(
+                    rotinas[i].nome, retorno
+                )
+            for mensagem in mensagens:
+                self._registrar(ErroSemantico(mensagem))
+
+        # subexpressões compartilhadas com nós de fora da rotina (só com
+        # Parser(compartilhar=True)); o tipo delas não depende de onde estão
+        for nid, tipo in extras:
+            self.tipos_expr[nid] = tipo
+
+    def _registrar(self, erro: ErroSemantico) -> None:
+        # um erro que já atingiu o limite só está subindo até quem chamou
+        if len(self.erros) >= self.max_erros:
+            raise erro
+        self.erros.append(erro)
+        if len(self.erros) >= self.max_erros:
+            raise erro
+
+    def _registrar_proc(self, stmt: ProcDecl | RotinaEsboco) -> None:
         tipos = [p.tipo for p in stmt.params]
         try:
             self.tabela.declarar_rotina(
@@ -62,7 +326,7 @@ class AnalisadorSemantico:
         except ValueError as e:
             raise ErroSemantico(str(e))
 
-    def _registrar_func_stub(self, stmt: FuncDecl) -> None:
+    def _registrar_func_stub(self, stmt: FuncDecl | RotinaEsboco) -> None:
         # retorno vai ser inferido do 'retorne' durante análise do corpo
         tipos = [p.tipo for p in stmt.params]
         try:
@@ -73,34 +337,64 @@ class AnalisadorSemantico:
             raise ErroSemantico(str(e))
 
     # Statements
-    def _stmt(self, stmt: Stmt) -> None:
-        if isinstance(stmt, VarDecl):
-            return self._var_decl(stmt)
-        if isinstance(stmt, Assign):
-            return self._assign(stmt)
-        if isinstance(stmt, Write):
-            return self._write(stmt)
-        if isinstance(stmt, If):
-            return self._if(stmt)
-        if isinstance(stmt, While):
-            return self._while(stmt)
-
-        if isinstance(stmt, ProcDecl):
-            return self._proc_decl(stmt)
-        if isinstance(stmt, FuncDecl):
-            return self._func_decl(stmt)
-        if isinstance(stmt, CallStmt):
-            return self._call_stmt(stmt)
-        if isinstance(stmt, Return):
-            return self._return(stmt)
-
-        raise ErroSemantico(f"Stmt não suportado: {type(stmt).__name__}")
+    def _bloco(self, stmts: list[Stmt]) -> None:
+        """
+        Analisa `stmts` e tudo o que estiver aninhado neles sem recursão.
+
+        Os comandos compostos (se, enquanto, rotinas) são tratados por
+        geradores que fazem `yield` de cada bloco interno e só continuam depois
+        que ele foi analisado. A pilha desses geradores fica aqui.
+
+        Um comando com erro é descartado (ver max_erros); se o erro vier de
+        um gerador, o escopo e o contexto de quando o comando começou são
+        restaurados.
+        """
+        tabela = self.tabela
+        pilha: list[tuple[Generator, Iterator[Stmt], int, str | None]] = []
+        gerador: Generator | None = None
+        comandos = iter(stmts)
+
+        while True:
+            for stmt in comandos:
+                try:
+                    sub = self.visitar(stmt)
+                except ErroSemantico as erro:
+                    self._registrar(erro)
+                    continue
+                if sub is not None:
+                    pilha.append(
+                        (gerador, comandos, tabela.nivel, self._ctx_func_retorno)
+                    )
+                    gerador = sub
+                    break
+
+            # o bloco acabou, ou um comando composto acabou de começar:
+            # o gerador do topo decide o próximo bloco
+            if gerador is None:
+                return
+            try:
+                bloco = next(gerador, None)
+            except ErroSemantico as erro:
+                self._registrar(erro)
+                bloco = None
+                tabela.voltar_para(pilha[-1][2])
+                self._ctx_func_retorno = pilha[-1][3]
+            if bloco is None:
+                gerador, comandos, _, _ = pilha.pop()
+            else:
+                comandos = iter(bloco)
+
+    # Um método por classe de comando, chamado por visitar(); os compostos
+    # devolvem o gerador dos seus blocos (ver _bloco)
+    def _nao_suportado(self, no: Stmt) -> None:
+        raise ErroSemantico(f"Stmt não suportado: {type(no).__name__}")
 
     def _var_decl(self, stmt: VarDecl) -> None:
         try:
-            self.tabela.declarar_var(stmt.nome, stmt.tipo)
+            sym = self.tabela.declarar_var(stmt.nome, stmt.tipo)
         except ValueError as e:
             raise ErroSemantico(str(e))
+        self._ligar(stmt, sym)
 
     def _assign(self, stmt: Assign) -> None:
         sym = self.tabela.buscar(stmt.nome)
@@ -114,27 +408,26 @@ class AnalisadorSemantico:
             raise ErroSemantico(
                 f"Atribuição incompatível: variável '{stmt.nome}' é {tipo_var}, expressão é {tipo_expr}."
             )
+        self._ligar(stmt, sym)
 
     def _write(self, stmt: Write) -> None:
         self._expr(stmt.expr)
 
-    def _if(self, stmt: If) -> None:
+    def _if(self, stmt: If) -> Generator:
         tipo_cond = self._expr(stmt.cond)
         if tipo_cond != "bool":
             raise ErroSemantico(f"Condição do 'se' deve ser bool, mas é {tipo_cond}.")
 
         self.tabela.push()
-        for s in stmt.then_block:
-            self._stmt(s)
+        yield stmt.then_block
         self.tabela.pop()
 
         if stmt.else_block is not None:
             self.tabela.push()
-            for s in stmt.else_block:
-                self._stmt(s)
+            yield stmt.else_block
             self.tabela.pop()
 
-    def _while(self, stmt: While) -> None:
+    def _while(self, stmt: While) -> Generator:
         tipo_cond = self._expr(stmt.cond)
         if tipo_cond != "bool":
             raise ErroSemantico(
@@ -142,43 +435,51 @@ class AnalisadorSemantico:
             )
 
         self.tabela.push()
-        for s in stmt.block:
-            self._stmt(s)
+        yield stmt.block
         self.tabela.pop()
 
-    def _proc_decl(self, stmt: ProcDecl) -> None:
+    def _proc_decl(self, stmt: ProcDecl) -> Generator:
+        self._ligar(stmt, self.tabela.buscar(stmt.nome))
+
         # novo escopo com parâmetros
         self.tabela.push()
-        for p in stmt.params:
-            self.tabela.declarar_var(p.nome, p.tipo)
+        self._declarar_params(stmt.params)
 
         # procedimento não pode ter return com valor
         old = self._ctx_func_retorno
         self._ctx_func_retorno = None
-        for s in stmt.body:
-            self._stmt(s)
+        yield stmt.body
         self._ctx_func_retorno = old
 
         self.tabela.pop()
 
-    def _func_decl(self, stmt: FuncDecl) -> None:
+    def _func_decl(self, stmt: FuncDecl) -> Generator:
         # novo escopo para parâmetros e variáveis locais da função
         self.tabela.push()
-        for p in stmt.params:
-            self.tabela.declarar_var(p.nome, p.tipo)
+        self._declarar_params(stmt.params)
 
         old = self._ctx_func_retorno
-        self._ctx_func_retorno = "func"  # estamos dentro de uma função
+        retornos = self._ctx_func_retorno = []
 
         retorno_inferido: str | None = None
+        descartado = False  # algum 'retorne' com erro já registrado
 
+        vistos = 0
         for s in stmt.body:
-            self._stmt(s)
+            # um comando por vez: o tipo dos 'retorne' dele, também os de
+            # dentro de se/enquanto, é conferido antes de seguir para o
+            # próximo comando
+            yield (s,)
 
-            if isinstance(s, Return):
-                t = self.tipos_expr.get(id(s.expr))
+            for r in retornos[vistos:]:
+                t = self.tipos_expr[r.expr.nid]
                 if t is None:
-                    raise ErroSemantico("Tipo do retorno não inferido (erro interno).")
+                    if not self.erros:
+                        raise ErroSemantico(
+                            "Tipo do retorno não inferido (erro interno)."
+                        )
+                    descartado = True
+                    continue
 
                 if retorno_inferido is None:
                     retorno_inferido = t
@@ -195,10 +496,24 @@ class AnalisadorSemantico:
                         raise ErroSemantico(
                             f"Retornos inconsistentes na função '{stmt.nome}': {retorno_inferido} vs {t}."
                         )
+            vistos = len(retornos)
 
         if retorno_inferido is None:
+            if descartado:
+                # o tipo do retorno não tem como ser inferido
+                self._ctx_func_retorno = old
+                self.tabela.pop()
+                return
             raise ErroSemantico(f"Função '{stmt.nome}' sem 'retorne'.")
 
+        if stmt.nid in self._duplicadas:
+            # o nome na tabela é de outra declaração
+            tipos = [p.tipo for p in stmt.params]
+            self._ligar(stmt, SimboloRotina("func", stmt.nome, tipos, retorno_inferido))
+            self._ctx_func_retorno = old
+            self.tabela.pop()
+            return
+
         # atualiza símbolo global da função com o tipo de retorno inferido
         sym = self.tabela.buscar(stmt.nome)
         if not isinstance(sym, SimboloRotina) or sym.kind != "func":
@@ -206,80 +521,149 @@ class AnalisadorSemantico:
                 f"Erro interno: símbolo da função '{stmt.nome}' não encontrado."
             )
 
-        self.tabela._scopes[0][stmt.nome] = SimboloRotina(
-            kind="func",
-            nome=stmt.nome,
-            params=sym.params,
-            retorno=retorno_inferido,
-        )
+        self._ligar(stmt, self.tabela.definir_retorno(stmt.nome, retorno_inferido))
 
         self._ctx_func_retorno = old
         self.tabela.pop()
 
+    def _declarar_params(self, params: list[Param]) -> None:
+        for p in params:
+            try:
+                self.tabela.declarar_var(p.nome, p.tipo)
+            except ValueError as e:
+                raise ErroSemantico(str(e))
+
     def _call_stmt(self, stmt: CallStmt) -> None:
         sym = self.tabela.buscar(stmt.call.nome)
         if not isinstance(sym, SimboloRotina):
             raise ErroSemantico(f"Rotina '{stmt.call.nome}' não declarada.")
 
         self._checar_args(stmt.call, sym)
+        self._ligar(stmt.call, sym)
 
     def _return(self, stmt: Return) -> None:
-        if self._ctx_func_retorno != "func":
+        if self._ctx_func_retorno is None:
             raise ErroSemantico("'retorne' só é permitido dentro de função.")
+        # antes da expressão: com erro nela, o tipo fica None (ver _func_decl)
+        self._ctx_func_retorno.append(stmt)
         self._expr(stmt.expr)
 
     # Expressions
     def _expr(self, expr: Expr) -> str:
-        if isinstance(expr, NumInt):
-            return self._set_tipo(expr, "inteiro")
-        if isinstance(expr, NumReal):
-            return self._set_tipo(expr, "real")
-        if isinstance(expr, StrLit):
-            return self._set_tipo(expr, "cadeia")
-
-        if isinstance(expr, VarRef):
-            sym = self.tabela.buscar(expr.nome)
-            if not isinstance(sym, SimboloVar):
-                raise ErroSemantico(f"Variável '{expr.nome}' usada antes de declarar.")
-            return self._set_tipo(expr, sym.tipo)
-
-        if isinstance(expr, Call):
-            return self._call_expr(expr)
-
-        if isinstance(expr, BinOp):
-            t1 = self._expr(expr.left)
-            t2 = self._expr(expr.right)
-            t = self._tipo_binop(expr.op, t1, t2)
-            return self._set_tipo(expr, t)
-
-        if isinstance(expr, Compare):
-            t1 = self._expr(expr.left)
-            t2 = self._expr(expr.right)
-            self._tipo_compare(expr.op, t1, t2)
-            return self._set_tipo(expr, "bool")
-
-        raise ErroSemantico(f"Expr não suportada: {type(expr).__name__}")
+        """
+        Tipo de `expr`, registrado em tipos_expr para ela e cada subexpressão.
+
+        Percorre a árvore em pós-ordem com uma pilha explícita. Além dos nós,
+        a pilha guarda marcas do que fazer depois que os filhos são
+        avaliados: (op,) combina os tipos dos dois lados de `op`;
+        (call, sym, i) confere o i-ésimo argumento; (call, sym) fecha a
+        chamada. Os tipos já avaliados ficam em `tipos`.
+
+        Um nó que já tem tipo em tipos_expr não é percorrido de novo: com
+        Parser(compartilhar=True) ele é uma subexpressão repetida, e a
+        FabricaNos só compartilha nós em que o tipo não muda.
+        """
+        # em pós-ordem, a raiz tem o maior nid da expressão
+        self._reservar(expr.nid + 1)
+        tipos_expr = self.tipos_expr
+        simbolos = self.simbolos
+        lo, hi = self._faixa
+        tipos: list[str] = []
+        pilha: list = [expr]
+
+        while pilha:
+            node = pilha.pop()
+            classe = node.__class__
+
+            if classe is VarRef:
+                t = tipos_expr[node.nid]
+                if t is None:
+                    sym = self.tabela.buscar(node.nome)
+                    if not isinstance(sym, SimboloVar):
+                        raise ErroSemantico(
+                            f"Variável '{node.nome}' usada antes de declarar."
+                        )
+                    simbolos[node.nid] = sym
+                    t = sym.tipo
+            elif classe is NumInt:
+                t = "inteiro"
+            elif classe is NumReal:
+                t = "real"
+            elif classe is StrLit:
+                t = "cadeia"
+
+            elif classe is BinOp or classe is Compare:
+                t = tipos_expr[node.nid]
+                if t is None:
+                    pilha.append((node,))
+                    pilha.append(node.right)
+                    pilha.append(node.left)
+                    continue
+
+            elif classe is Call:
+                t = tipos_expr[node.nid]
+                if t is None:
+                    sym = self.tabela.buscar(node.nome)
+                    if not isinstance(sym, SimboloRotina):
+                        raise ErroSemantico(f"Rotina '{node.nome}' não declarada.")
+                    self._checar_aridade(node, sym)
+                    simbolos[node.nid] = sym
+                    pilha.append((node, sym))
+                    for i in range(len(node.args), 0, -1):
+                        pilha.append((node, sym, i))
+                        pilha.append(node.args[i - 1])
+                    continue
+
+            elif classe is tuple:
+                if len(node) == 1:
+                    node = node[0]
+                    t2 = tipos.pop()
+                    t1 = tipos.pop()
+                    if node.__class__ is BinOp:
+                        t = self._tipo_binop(node.op, t1, t2)
+                    else:
+                        self._tipo_compare(node.op, t1, t2)
+                        t = "bool"
+                elif len(node) == 3:
+                    call, sym, i = node
+                    self._checar_arg(call, sym, i, tipos.pop())
+                    continue
+                else:
+                    node, sym = node
+                    t = self._tipo_chamada(node, sym)
+
+            else:
+                raise ErroSemantico(f"Expr não suportada: {classe.__name__}")
+
+            nid = node.nid
+            if not lo <= nid < hi:
+                self._fora_da_faixa.append(nid)
+            tipos_expr[nid] = t
+            tipos.append(t)
+
+        return tipos[0]
 
     def _checar_args(self, call: Call, sym: SimboloRotina) -> None:
+        self._checar_aridade(call, sym)
+        for i, arg_expr in enumerate(call.args, start=1):
+            self._checar_arg(call, sym, i, self._expr(arg_expr))
+
+    def _checar_aridade(self, call: Call, sym: SimboloRotina) -> None:
         if len(call.args) != len(sym.params):
             raise ErroSemantico(
                 f"Chamada de '{call.nome}' com {len(call.args)} args; esperado {len(sym.params)}."
             )
 
-        for i, (arg_expr, tipo_param) in enumerate(zip(call.args, sym.params), start=1):
-            tipo_arg = self._expr(arg_expr)
-            if not self._atribuicao_compativel(tipo_param, tipo_arg):
-                raise ErroSemantico(
-                    f"Arg {i} de '{call.nome}' incompatível: esperado {tipo_param}, veio {tipo_arg}."
-                )
-
-    def _call_expr(self, call: Call) -> str:
-        sym = self.tabela.buscar(call.nome)
-        if not isinstance(sym, SimboloRotina):
-            raise ErroSemantico(f"Rotina '{call.nome}' não declarada.")
-
-        self._checar_args(call, sym)
+    def _checar_arg(
+        self, call: Call, sym: SimboloRotina, i: int, tipo_arg: str
+    ) -> None:
+        tipo_param = sym.params[i - 1]
+        if not self._atribuicao_compativel(tipo_param, tipo_arg):
+            raise ErroSemantico(
+                f"Arg {i} de '{call.nome}' incompatível: esperado {tipo_param}, veio {tipo_arg}."
+            )
 
+    def _tipo_chamada(self, call: Call, sym: SimboloRotina) -> str:
         # procedimento
         if sym.kind == "proc":
             raise ErroSemantico(
@@ -292,11 +676,17 @@ class AnalisadorSemantico:
                 f"Tipo de retorno da função '{call.nome}' ainda não definido."
             )
 
-        return self._set_tipo(call, sym.retorno)
+        return sym.retorno
+
+    def _reservar(self, n_nos: int) -> None:
+        falta = n_nos - len(self.tipos_expr)
+        if falta > 0:
+            self.tipos_expr.extend([None] * falta)
+            self.simbolos.extend([None] * falta)
 
-    def _set_tipo(self, node: object, tipo: str) -> str:
-        self.tipos_expr[id(node)] = tipo
-        return tipo
+    def _ligar(self, node: Stmt, sym: SimboloVar | SimboloRotina) -> None:
+        self._reservar(node.nid + 1)
+        self.simbolos[node.nid] = sym
 
     # Regras de tipos
     def _atribuicao_compativel(self, tipo_var: str, tipo_expr: str) -> bool:
@@ -320,3 +710,94 @@ class AnalisadorSemantico:
             raise ErroSemantico(f"Comparação '{op}' não suportada para cadeia.")
         if t1 == "bool" or t2 == "bool":
             raise ErroSemantico(f"Comparação '{op}' não suportada para bool.")
+
+
+# Trabalho dos processos de AnalisadorSemantico._rotinas_em_paralelo
+def _partes(itens: Sequence, n: int) -> list[list]:
+    """Divide `itens` em até n partes contíguas de tamanho parecido."""
+    itens = list(itens)
+    n = min(n, len(itens))
+    return [itens[k * len(itens) // n : (k + 1) * len(itens) // n] for k in range(n)]
+
+
+def _chamadas_das_rotinas(indices: list[int]) -> list[set[str]]:
+    """Nomes das rotinas chamadas no corpo de cada rotina de `indices`."""
+    rotinas = _HERANCA[1]
+    return [chamadas(rotinas[i].body) for i in indices]
+
+
+def _iniciar_processo() -> None:
+    global _ANALISADOR
+    n_nos, _, _, tabela = _HERANCA
+    # a tabela herdada do pai já tem as rotinas, ainda sem retorno
+    _ANALISADOR = AnalisadorSemantico()
+    _ANALISADOR.tabela = tabela
+    _ANALISADOR._reservar(n_nos)
+
+
+def _analisar_rotinas(
+    tarefa: tuple[list[tuple[list[int], bool]], list[tuple[str, str]]],
+) -> tuple[list[tuple[int, tuple]], list[tuple[int, str]]]:
+    """
+    Analisa as `componentes` (rotinas, se é recursiva) com os `retornos`
+    (nome, retorno) das funções que elas chamam de fora. Devolve, para cada
+    rotina, (índice, (mensagens de erro, retorno, tipos da faixa, símbolos
+    da faixa)), e os tipos de nós de fora das faixas.
+
+    No fim o analisador do processo volta a como estava, para a próxima
+    tarefa: sem retornos na tabela e sem tipos nem símbolos.
+    """
+    componentes, retornos = tarefa
+    _, rotinas, faixas, tabela = _HERANCA
+    analisador = _ANALISADOR
+    tipos_expr = analisador.tipos_expr
+    simbolos = analisador.simbolos
+
+    def analisar(i: int) -> list[ErroSemantico]:
+        analisador._faixa = faixas[i]
+        return analisador._analisar_rotina(rotinas[i], faixas[i])
+
+    resultado = []
+    fora = analisador._fora_da_faixa = []
+    try:
+        for nome, retorno in retornos:
+            tabela.definir_retorno(nome, retorno)
+        for componente, recursiva in componentes:
+            for i, erros in analisador._analisar_componente(
+                rotinas, componente, recursiva, analisar
+            ):
+                lo, hi = faixas[i]
+                ligado = simbolos[hi - 1]
+                resultado.append(
+                    (
+                        i,
+                        (
+                            [erro.mensagem for erro in erros],
+                            None if ligado is None else ligado.retorno,
+                            tipos_expr[lo:hi],
+                            simbolos[lo:hi],
+                        ),
+                    )
+                )
+                tipos_expr[lo:hi] = simbolos[lo:hi] = [None] * (hi - lo)
+    finally:
+        analisador._ctx_func_retorno = None
+        analisador._faixa = (0, sys.maxsize)
+        tabela.voltar_para(0)
+        for componente, _ in componentes:
+            for i in componente:
+                if isinstance(rotinas[i], FuncDecl):
+                    tabela.definir_retorno(rotinas[i].nome, None)
+        for nome, _ in retornos:
+            tabela.definir_retorno(nome, None)
+
+    # os nós de fora das faixas são subexpressões compartilhadas (ver
+    # _rotinas_em_paralelo); um nó que está na faixa de outra rotina da
+    # tarefa já foi limpo com ela e não tem mais tipo
+    extras = []
+    for nid in fora:
+        t = tipos_expr[nid]
+        if t is not None:
+            extras.append((nid, t))
+            tipos_expr[nid] = None
+    return resultado, extras
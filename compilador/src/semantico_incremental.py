@@ -0,0 +1,579 @@
+from __future__ import annotations
+
+import hashlib
+import sys
+from bisect import bisect_right
+from collections.abc import Sequence
+from dataclasses import dataclass
+from heapq import heappop, heappush
+
+from .ast_nodes import FuncDecl, ProcDecl, Program, RotinaEsboco, VarDecl
+from .erros import ErroSintatico
+from .grafo_chamadas import GrafoChamadas, chamadas
+from .lexer import Lexer, Token, TokensCompactos
+from .parser import Parser
+from .posicoes import IndiceLinhas
+from .semantico import AnalisadorSemantico, ErroSemantico
+from .tabela_simbolos import SimboloRotina, SimboloVar
+from .tipos_token import (
+    KW_ENQUANTO,
+    KW_FIM,
+    KW_FIMENQUANTO,
+    KW_FIMSE,
+    KW_INICIO,
+    KW_SE,
+    SEMI,
+)
+
+# tokens depois dos quais começa um comando do programa principal
+_FIM_DE_COMANDO = {SEMI, KW_FIMSE, KW_FIMENQUANTO}
+
+
+@dataclass(frozen=True)
+class ResultadoRotina:
+    """
+    O que a semântica produz para uma rotina, ou para o programa principal:
+    tipos e símbolos indexados pelos nids de `arvore` (contados a partir de
+    0, só com os nós dela), os erros dela e, numa função, o retorno
+    inferido.
+    """
+
+    arvore: ProcDecl | FuncDecl | Program
+    tipos_expr: list[str | None]
+    simbolos: list[SimboloVar | SimboloRotina | None]
+    erros: list[ErroSemantico]
+    retorno: str | None
+
+
+@dataclass
+class _Versao:
+    """
+    A divisão da última versão do fonte em rotinas, que o caminho rápido de
+    AnaliseIncremental (ver _editar_corpo) atualiza no lugar. As listas
+    são indexadas pela posição da rotina no fonte.
+    """
+
+    codigo: str
+    n_tokens: int
+    # a tabela tem as rotinas registradas e os retornos da última versão
+    analisador: AnalisadorSemantico
+    rotinas: list[ProcDecl | FuncDecl]
+    impressoes: list[bytes]
+    chamados: list[set[str]]
+    esbocos: list[RotinaEsboco]
+    # tokens do 'procedimento'/'funcao' e do 'fim' de cada rotina
+    cabecalhos: list[int]
+    fins: list[int]
+    # o corpo de cada rotina no texto: do fim do 'inicio' ao começo do 'fim'
+    corpos_de: list[int]
+    corpos_ate: list[int]
+    grafo: GrafoChamadas | None = None
+    # componentes em ordem topológica reversa, a posição da componente de
+    # cada rotina e a chave de cada componente em _componentes
+    componentes: list[list[int]] | None = None
+    componente_de: list[int] | None = None
+    chaves: list[tuple] | None = None
+    # quem chama cada rotina, montado só quando um retorno muda
+    chamadores: list[list[int]] | None = None
+    # nomes de que o programa principal depende (ver _dividir)
+    dependencias: set[str] | None = None
+    # erros do registro das rotinas e dos corpos delas, em ordem
+    registro: list[ErroSemantico] | None = None
+    erros_rotinas: list[ErroSemantico] | None = None
+
+
+class AnaliseIncremental:
+    """
+    Análise semântica de um fonte que muda aos poucos (editor, modo watch),
+    refazendo a cada versão só o que a edição pode ter mudado.
+
+    Cada rotina é identificada pela impressão digital do seu texto (sha256,
+    do 'procedimento'/'funcao' ao 'fim'), com os limites achados por
+    Parser.delimitar; só uma rotina com texto novo passa pelo parse
+    (Parser.esbocar_rotina e Parser.corpo). O resultado de uma componente do grafo de
+    chamadas (ver AnalisadorSemantico._rotinas) fica guardado sob uma chave
+    com as impressões das rotinas dela e as assinaturas (com o retorno) das
+    rotinas de fora que ela usa; é reaproveitado enquanto a chave não muda.
+    O programa principal (o texto fora das rotinas) é uma unidade a mais,
+    que depende das rotinas que ele chama e dos nomes que declara.
+
+    Uma edição que fica dentro do corpo de uma rotina, sem mudar as rotinas
+    que ela chama, vai por um caminho rápido (ver _editar_corpo): a
+    divisão da versão anterior é atualizada no lugar, e o custo é o parse
+    e a análise da rotina (e de quem depende do retorno dela, se ele
+    mudou), mais comparar o texto novo com o anterior e deslocar as
+    posições das rotinas seguintes, que são operações sobre strings e
+    listas inteiras e não um passo de Python por rotina. Voltar a um texto
+    anterior (desfazer) acha a árvore e os resultados guardados.
+
+    As outras edições (no programa principal, num cabeçalho, ou que mudam
+    as chamadas de uma rotina) refazem a divisão: o texto de cada rotina é
+    comparado pela impressão, e o custo tem um piso linear no número de
+    rotinas (delimitar, registrar as assinaturas, montar o grafo), além da
+    análise do que mudou. Os resultados são os de AnalisadorSemantico sobre
+    Parser(tokens).parse(), com os nids de cada rotina contados do começo
+    dela e os do programa principal na mesma ordem, sem os das rotinas; os
+    erros saem na mesma ordem e com o mesmo limite.
+
+    Se o fonte tem um erro de sintaxe, ou uma rotina dentro de 'se' ou
+    'enquanto' do programa principal, o programa inteiro passa pelo parse
+    e pela análise de uma vez (o erro de sintaxe é lançado como no Parser),
+    e o resultado fica todo em `principal`.
+    """
+
+    def __init__(self, lexer: Lexer | None = None, max_erros: int = 1) -> None:
+        self.lexer = lexer or Lexer()
+        self.max_erros = max_erros
+
+        self.erros: list[ErroSemantico] = []
+        self.rotinas: list[ResultadoRotina] = []
+        self.principal: ResultadoRotina | None = None
+        # unidades (rotinas e programa principal) analisadas na última versão
+        self.analisadas = 0
+
+        # impressão do texto de uma rotina -> (esboço, árvore, nomes que ela chama)
+        self._arvores: dict[
+            bytes, tuple[RotinaEsboco, ProcDecl | FuncDecl, set[str]]
+        ] = {}
+        # chave de uma componente -> resultados das rotinas dela
+        self._componentes: dict[tuple, list[ResultadoRotina]] = {}
+        # impressão do programa principal -> (árvore, nomes de que depende)
+        self._arvore_principal: tuple[bytes, Program, list[str]] | None = None
+        # chave do programa principal -> resultado dele, só para a árvore atual
+        self._principais: dict[tuple, ResultadoRotina] = {}
+        # a divisão da última versão, se ela se dividiu em rotinas
+        self._versao: _Versao | None = None
+
+    def analisar(self, codigo: str, tokens: Sequence[Token] | None = None) -> None:
+        """
+        Analisa a nova versão do fonte. `tokens`, se dado, é o resultado de
+        tokenizar `codigo` (por exemplo, de DocumentoLexico). Como em
+        AnalisadorSemantico.analisar, o erro de número max_erros é lançado.
+        """
+        if tokens is None:
+            tokens = self.lexer.tokenizar_compacto(codigo)
+        if self._versao is not None and self._editar_corpo(self._versao, codigo, tokens):
+            return
+
+        self._versao = None
+        if isinstance(tokens, TokensCompactos):
+            tipos = tokens.tipos.tobytes()
+        else:
+            tipos = bytes(tok.tipo for tok in tokens)
+
+        try:
+            versao = self._dividir(codigo, tokens, tipos)
+        except ErroSintatico:
+            versao = None
+        if versao is None:
+            self._analisar_tudo(codigo, tokens)
+            return
+
+        analisador = versao.analisador
+        analisador.registrar_rotinas(versao.esbocos)
+        versao.registro = analisador.erros
+        self.analisadas = 0
+
+        resultados = self._rotinas(versao)
+        self._principal(versao)
+
+        self.rotinas = resultados
+        versao.erros_rotinas = [e for r in resultados for e in r.erros]
+        self._versao = versao
+        self._limitar(versao.registro + versao.erros_rotinas + self.principal.erros)
+
+    def _dividir(self, codigo: str, tokens: Sequence[Token], tipos: bytes):
+        """
+        Separa as rotinas e o programa principal, com o parse só do que
+        mudou. None se o fonte não se divide assim.
+        """
+        parser = Parser(tokens)
+        limites = parser.delimitar()
+        if isinstance(tokens, TokensCompactos):
+            inicios, fins = tokens.inicios, tokens.fins
+        else:
+            inicios = [tok.inicio for tok in tokens]
+            fins = [tok.fim for tok in tokens]
+
+        arvores_antes, self._arvores = self._arvores, {}
+        versao = _Versao(
+            codigo,
+            len(tipos),
+            AnalisadorSemantico(max_erros=sys.maxsize),
+            [],
+            [],
+            [],
+            [],
+            [cabecalho for cabecalho, _ in limites],
+            [fim for _, fim in limites],
+            [],
+            [],
+        )
+        # trechos de tokens e de texto do programa principal
+        trechos: list[tuple[int, int]] = []
+        resumo = hashlib.sha256()
+        anterior = 0  # primeiro token depois da rotina anterior
+        abertos = 0  # 'se' e 'enquanto' abertos no programa principal
+
+        for cabecalho, fim in limites:
+            abertos += (
+                tipos.count(KW_SE, anterior, cabecalho)
+                - tipos.count(KW_FIMSE, anterior, cabecalho)
+                + tipos.count(KW_ENQUANTO, anterior, cabecalho)
+                - tipos.count(KW_FIMENQUANTO, anterior, cabecalho)
+            )
+            # a rotina precisa ser um comando do nível de fora do programa
+            if abertos or (
+                cabecalho > anterior and tipos[cabecalho - 1] not in _FIM_DE_COMANDO
+            ):
+                return None
+
+            inicio = inicios[cabecalho]
+            impressao = hashlib.sha256(codigo[inicio : fins[fim]].encode()).digest()
+            rotina = self._arvores.get(impressao) or arvores_antes.get(impressao)
+            if rotina is None:
+                # só o texto novo passa pelo parse, com o cabeçalho
+                esboco = parser.esbocar_rotina(cabecalho)
+                arvore = Parser(tokens).corpo(esboco)
+                rotina = (esboco, arvore, chamadas(arvore.body))
+            self._arvores[impressao] = rotina
+            versao.esbocos.append(rotina[0])
+            versao.rotinas.append(rotina[1])
+            versao.chamados.append(rotina[2])
+            versao.impressoes.append(impressao)
+            versao.corpos_de.append(fins[tipos.index(KW_INICIO, cabecalho)])
+            versao.corpos_ate.append(inicios[fim])
+
+            trechos.append((anterior, cabecalho))
+            resumo.update(codigo[inicios[anterior] : inicio].encode())
+            resumo.update(b"\0")
+            anterior = fim + 1
+
+        trechos.append((anterior, len(tipos)))
+        resumo.update(codigo[inicios[anterior] :].encode())
+        impressao = resumo.digest()
+
+        if self._arvore_principal is None or self._arvore_principal[0] != impressao:
+            principal = Parser(_sem_rotinas(tokens, trechos)).parse()
+            # além das chamadas, as declarações globais dependem das rotinas:
+            # um nome de rotina não pode ser redeclarado
+            nomes = chamadas(principal.comandos)
+            nomes.update(s.nome for s in principal.comandos if s.__class__ is VarDecl)
+            self._arvore_principal = (impressao, principal, sorted(nomes))
+            self._principais = {}
+        versao.dependencias = set(self._arvore_principal[2])
+        return versao
+
+    def _rotinas(self, versao: _Versao) -> list[ResultadoRotina]:
+        """
+        Resultados das rotinas, na ordem delas, analisando como em
+        AnalisadorSemantico._rotinas só as componentes cuja chave mudou.
+        """
+        rotinas = versao.rotinas
+        grafo = versao.grafo = GrafoChamadas(rotinas, versao.chamados)
+        versao.componentes = grafo.componentes(so_funcoes=True)
+        versao.componente_de = [0] * len(rotinas)
+        versao.chaves = []
+        resultados: list[ResultadoRotina | None] = [None] * len(rotinas)
+        componentes_antes, self._componentes = self._componentes, {}
+
+        for c, componente in enumerate(versao.componentes):
+            chave = self._chave(versao, componente)
+            guardados = self._componente(versao, componente, componentes_antes.get(chave))
+            self._componentes[chave] = guardados
+            versao.chaves.append(chave)
+            for i, resultado in zip(componente, guardados):
+                resultados[i] = resultado
+                versao.componente_de[i] = c
+
+        return resultados
+
+    def _chave(self, versao: _Versao, componente: list[int]) -> tuple:
+        """
+        A chave de `componente` em _componentes: as impressões das rotinas
+        dela e o símbolo, como está na tabela agora, dos nomes que ela usa e
+        que não são de rotinas dela.
+        """
+        rotinas, indice = versao.rotinas, versao.grafo.indice
+        membros = set(componente)
+        usados: set[str] = set()
+        for i in componente:
+            usados |= versao.chamados[i]
+            usados.add(rotinas[i].nome)
+        externos = sorted(n for n in usados if indice.get(n) not in membros)
+        buscar = versao.analisador.tabela.buscar
+        return (
+            tuple(versao.impressoes[i] for i in componente),
+            tuple((nome, _assinatura(buscar(nome))) for nome in externos),
+        )
+
+    def _componente(
+        self,
+        versao: _Versao,
+        componente: list[int],
+        guardados: list[ResultadoRotina] | None,
+    ) -> list[ResultadoRotina]:
+        """
+        Os resultados das rotinas de `componente`: os `guardados`, com os
+        retornos que a análise teria posto na tabela, ou os de uma análise
+        nova, como em AnalisadorSemantico._rotinas mas com tipos e símbolos
+        novos para cada rotina em cada análise.
+        """
+        analisador, rotinas, grafo = versao.analisador, versao.rotinas, versao.grafo
+        if guardados is not None:
+            for i, resultado in zip(componente, guardados):
+                if resultado.retorno is not None and grafo.indice[rotinas[i].nome] == i:
+                    analisador.tabela.definir_retorno(rotinas[i].nome, resultado.retorno)
+            return guardados
+
+        return [
+            resultado
+            for _, resultado in analisador._analisar_componente(
+                rotinas,
+                componente,
+                grafo.recursiva(componente),
+                lambda i: self._analisar(
+                    analisador, rotinas[i], grafo.indice[rotinas[i].nome] != i
+                ),
+            )
+        ]
+
+    def _principal(self, versao: _Versao) -> None:
+        """
+        O resultado do programa principal, analisado de novo só se mudou o
+        símbolo de um nome de que ele depende.
+        """
+        _, principal, dependencias = self._arvore_principal
+        buscar = versao.analisador.tabela.buscar
+        chave = tuple((nome, _assinatura(buscar(nome))) for nome in dependencias)
+        resultado = self._principais.get(chave)
+        if resultado is None:
+            resultado = self._principais[chave] = self._analisar(
+                versao.analisador, principal, False
+            )
+        self.principal = resultado
+
+    def _editar_corpo(
+        self, versao: _Versao, codigo: str, tokens: Sequence[Token]
+    ) -> bool:
+        """
+        O caminho rápido de analisar(): se `codigo` só difere da versão
+        anterior dentro do corpo de uma rotina, e a rotina continua com o
+        mesmo cabeçalho e chamando as mesmas rotinas, refaz o parse dela, a
+        análise da componente dela e a das componentes e do programa
+        principal que dependem de um retorno que mudou. Devolve False, sem
+        mudar nada, se a edição não é desse tipo.
+        """
+        # as entradas guardadas só crescem por aqui; de vez em quando o
+        # caminho completo as refaz só com as da versão atual
+        if (
+            len(self._componentes) > 2 * len(versao.componentes) + 64
+            or len(self._arvores) > 2 * len(versao.rotinas) + 64
+            or len(self._principais) > 64
+        ):
+            return False
+
+        antigo = versao.codigo
+        de = _prefixo_comum(antigo, codigo)
+        if de == len(antigo) == len(codigo):
+            self.analisadas = 0
+            self._limitar(versao.registro + versao.erros_rotinas + self.principal.erros)
+            return True
+        # [de, ate) é o trecho do texto anterior que mudou
+        ate = len(antigo) - _sufixo_comum(antigo, codigo, min(len(antigo), len(codigo)) - de)
+        k = bisect_right(versao.corpos_de, de) - 1
+        if k < 0 or ate > versao.corpos_ate[k]:
+            return False
+
+        # A partir do começo de um token, o lexer só depende do texto dali
+        # em diante. Se o 'inicio' e o 'fim' da rotina continuam onde
+        # estavam, os tokens de fora do corpo são os mesmos de antes,
+        # deslocados depois dele.
+        delta_tokens = len(tokens) - versao.n_tokens
+        delta = len(codigo) - len(antigo)
+        cabecalho, fim = versao.cabecalhos[k], versao.fins[k] + delta_tokens
+        esboco = versao.esbocos[k]
+        if not 0 < fim < len(tokens):
+            return False
+        tok_fim = tokens[fim]
+        if tok_fim.tipo != KW_FIM or tok_fim.inicio != versao.corpos_ate[k] + delta:
+            return False
+        try:
+            novo = Parser(tokens).esbocar_rotina(cabecalho)
+            if tokens[novo.inicio - 1].fim != versao.corpos_de[k] or novo.fim != fim:
+                return False
+            if (novo.kind, novo.nome, novo.params) != (esboco.kind, esboco.nome, esboco.params):
+                return False
+            impressao = hashlib.sha256(
+                codigo[tokens[cabecalho].inicio : tok_fim.fim].encode()
+            ).digest()
+            rotina = self._arvores.get(impressao)
+            if rotina is None:
+                arvore = Parser(tokens).corpo(novo)
+                rotina = self._arvores[impressao] = (novo, arvore, chamadas(arvore.body))
+        except ErroSintatico:
+            return False
+        if rotina[2] != versao.chamados[k]:
+            return False
+
+        versao.codigo, versao.n_tokens = codigo, len(tokens)
+        versao.rotinas[k], versao.esbocos[k], versao.impressoes[k] = rotina[1], novo, impressao
+        versao.fins[k] = fim
+        versao.corpos_ate[k] += delta
+        if delta_tokens:
+            for lista in (versao.cabecalhos, versao.fins):
+                lista[k + 1 :] = [i + delta_tokens for i in lista[k + 1 :]]
+        if delta:
+            for lista in (versao.corpos_de, versao.corpos_ate):
+                lista[k + 1 :] = [i + delta for i in lista[k + 1 :]]
+
+        self.analisadas = 0
+        resultados = list(self.rotinas)
+        recontar = False  # se a lista de erros das rotinas muda
+        mudaram: set[str] = set()  # funções com outro retorno
+
+        rotinas, grafo = versao.rotinas, versao.grafo
+        tabela = versao.analisador.tabela
+        pendentes = [versao.componente_de[k]]
+        while pendentes:
+            c = heappop(pendentes)
+            componente = versao.componentes[c]
+            # como numa análise do começo, os retornos da componente ainda
+            # não estão definidos (os das componentes chamadas já estão)
+            retornos = {}
+            for i in componente:
+                nome = rotinas[i].nome
+                if rotinas[i].__class__ is FuncDecl and grafo.indice[nome] == i:
+                    retornos[nome] = (i, tabela.buscar(nome).retorno)
+                    tabela.definir_retorno(nome, None)
+
+            chave = versao.chaves[c] = self._chave(versao, componente)
+            guardados = self._componente(versao, componente, self._componentes.get(chave))
+            self._componentes[chave] = guardados
+            for i, resultado in zip(componente, guardados):
+                recontar = recontar or bool(resultados[i].erros or resultado.erros)
+                resultados[i] = resultado
+
+            for nome, (i, retorno) in retornos.items():
+                if tabela.buscar(nome).retorno == retorno:
+                    continue
+                mudaram.add(nome)
+                if versao.chamadores is None:
+                    versao.chamadores = [[] for _ in rotinas]
+                    for quem, chamados in enumerate(grafo.arestas):
+                        for j in chamados:
+                            versao.chamadores[j].append(quem)
+                for quem in versao.chamadores[i]:
+                    proxima = versao.componente_de[quem]
+                    if proxima != c and proxima not in pendentes:
+                        heappush(pendentes, proxima)
+
+        if mudaram & versao.dependencias:
+            self._principal(versao)
+
+        self.rotinas = resultados
+        if recontar:
+            versao.erros_rotinas = [e for r in resultados for e in r.erros]
+        self._limitar(versao.registro + versao.erros_rotinas + self.principal.erros)
+        return True
+
+    def _analisar(
+        self,
+        analisador: AnalisadorSemantico,
+        arvore: ProcDecl | FuncDecl | Program,
+        duplicada: bool,
+    ) -> ResultadoRotina:
+        """Analisa uma rotina, ou o programa principal, com a tabela como está."""
+        self.analisadas += 1
+        principal = isinstance(arvore, Program)
+        if principal:
+            n_nos, stmts = arvore.n_nos, arvore.comandos
+        else:
+            n_nos, stmts = arvore.nid + 1, [arvore]
+        analisador.tipos_expr = [None] * n_nos
+        analisador.simbolos = [None] * n_nos
+        # os nids das árvores se repetem entre rotinas: só a desta conta
+        analisador._duplicadas = {arvore.nid} if duplicada else set()
+        tabela = analisador.tabela
+        globais = tabela.globais() if principal else None
+        erros = analisador._analisar_isolada(stmts)
+        if principal:
+            # a tabela volta a ter só as rotinas: elas e o programa principal
+            # podem ser analisados de novo nela depois (ver _editar_corpo)
+            tabela.retirar_globais(tabela.globais() - globais)
+
+        retorno = None
+        if isinstance(arvore, FuncDecl) and analisador.simbolos[arvore.nid] is not None:
+            retorno = analisador.simbolos[arvore.nid].retorno
+        return ResultadoRotina(
+            arvore, analisador.tipos_expr, analisador.simbolos, erros, retorno
+        )
+
+    def _analisar_tudo(self, codigo: str, tokens: Sequence[Token]) -> None:
+        self._versao = None
+        self._arvores = {}
+        self._componentes = {}
+        self._arvore_principal = None
+        self._principais = {}
+        self.rotinas = []
+        self.principal = None
+        self.analisadas = 1
+
+        program = Parser(tokens, IndiceLinhas(codigo)).parse()
+        analisador = AnalisadorSemantico(max_erros=sys.maxsize)
+        analisador.analisar(program)
+        self.principal = ResultadoRotina(
+            program, analisador.tipos_expr, analisador.simbolos, analisador.erros, None
+        )
+        self._limitar(analisador.erros)
+
+    def _limitar(self, erros: list[ErroSemantico]) -> None:
+        self.erros = erros[: self.max_erros]
+        if len(self.erros) >= self.max_erros:
+            raise self.erros[-1]
+
+
+def _prefixo_comum(a: str, b: str) -> int:
+    """Tamanho do maior prefixo comum de a e b, numa busca binária que compara fatias."""
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        meio = (lo + hi + 1) // 2
+        if a[lo:meio] == b[lo:meio]:
+            lo = meio
+        else:
+            hi = meio - 1
+    return lo
+
+
+def _sufixo_comum(a: str, b: str, limite: int) -> int:
+    """Tamanho do maior sufixo comum de a e b, até `limite`, como em _prefixo_comum."""
+    lo, hi = 0, limite
+    na, nb = len(a), len(b)
+    while lo < hi:
+        meio = (lo + hi + 1) // 2
+        if a[na - meio : na - lo] == b[nb - meio : nb - lo]:
+            lo = meio
+        else:
+            hi = meio - 1
+    return lo
+
+
+def _assinatura(sym: object) -> tuple | None:
+    # o que uma rotina que usa o nome vê dele
+    if not isinstance(sym, SimboloRotina):
+        return None
+    return (sym.kind, tuple(sym.params), sym.retorno)
+
+
+def _sem_rotinas(
+    tokens: Sequence[Token], trechos: list[tuple[int, int]]
+) -> Sequence[Token]:
+    """Os tokens dos `trechos` [de, ate), em ordem; o último vai até o EOF."""
+    if isinstance(tokens, TokensCompactos):
+        principal = TokensCompactos(tokens.codigo)
+        for de, ate in trechos:
+            principal.tipos += tokens.tipos[de:ate]
+            principal.inicios += tokens.inicios[de:ate]
+            principal.fins += tokens.fins[de:ate]
+        return principal
+    return [tok for de, ate in trechos for tok in tokens[de:ate]]
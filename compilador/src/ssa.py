@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+from .ir import CADEIA, Bloco, FuncaoIR, Instr, ProgramaIR, Variavel
+
+
+def construir_ssa(programa: ProgramaIR) -> None:
+    """
+    Põe cada função de `programa` em SSA, no lugar: cada atribuição a uma
+    variável do programa (inteiro ou real) cria uma versão nova dela, e os
+    blocos em que versões diferentes se encontram ganham instruções phi.
+    As temporárias da tradução já têm uma definição só, e as cadeias, que
+    são vetores em C, ficam como estão.
+
+    É a construção clássica: dominadores pelo algoritmo iterativo de
+    Cooper, Harvey e Kennedy, phis nas fronteiras de dominância iteradas
+    dos blocos que atribuem cada variável, só onde ela está viva na entrada
+    (SSA podada, com a vivacidade calculada por fluxo de dados) e
+    renomeação em pré-ordem na árvore de dominadores, com uma
+    pilha explícita. A versão de antes de qualquer atribuição é a própria
+    variável (o parâmetro, ou a variável ainda sem valor).
+    """
+    reservados = {f.nome for f in programa.rotinas}
+    for funcao in programa.rotinas + [programa.principal]:
+        if not funcao.ssa:
+            _construir(funcao, reservados)
+
+
+def desfazer_ssa(programa: ProgramaIR) -> None:
+    """
+    Tira de SSA as funções de `programa` que estão nela: cada phi vira
+    cópias no fim dos predecessores do bloco, numa aresta nova quando o
+    predecessor também desvia para outro lugar. Com mais de uma phi no
+    bloco as cópias passam por temporárias, porque as phis de um bloco
+    acontecem todas ao mesmo tempo (uma pode ler o que outra define); sem
+    isso, vão direto.
+    """
+    reservados = {f.nome for f in programa.rotinas}
+    for funcao in programa.rotinas + [programa.principal]:
+        if funcao.ssa:
+            _desfazer(funcao, reservados)
+
+
+class _Nomes:
+    """Nomes novos para as variáveis de uma função, sem repetir nenhum."""
+
+    def __init__(self, funcao: FuncaoIR, reservados: set[str]) -> None:
+        self._usados = reservados | {v.nome for v in funcao.variaveis}
+        self._contadores: dict[str, int] = {}
+
+    def novo(self, base: str) -> str:
+        n = self._contadores.get(base, 0) + 1
+        while f"{base}{n}" in self._usados:
+            n += 1
+        self._contadores[base] = n
+        nome = f"{base}{n}"
+        self._usados.add(nome)
+        return nome
+
+
+def _construir(funcao: FuncaoIR, reservados: set[str]) -> None:
+    blocos = funcao.blocos
+    variaveis = funcao.variaveis
+    preds = funcao.predecessores()
+    idom = _dominadores(funcao, preds)
+
+    # fronteiras de dominância
+    fronteira: list[set[int]] = [set() for _ in blocos]
+    for b, ps in enumerate(preds):
+        if len(ps) < 2:
+            continue
+        for p in ps:
+            while p != idom[b]:
+                fronteira[p].add(b)
+                p = idom[p]
+
+    n_originais = len(variaveis)
+    elegivel = [not v.temporaria and v.tipo != CADEIA for v in variaveis]
+    definicoes: dict[int, set[int]] = {}
+    for b, bloco in enumerate(blocos):
+        for instr in bloco.instrs:
+            if instr.dest is not None and elegivel[instr.dest]:
+                definicoes.setdefault(instr.dest, set()).add(b)
+
+    vivas = _vivas_na_entrada(funcao, elegivel)
+
+    # phis: índice da variável original de cada uma, pelo id da instrução
+    origem: dict[int, int] = {}
+    phis: list[list[Instr]] = [[] for _ in blocos]
+    for v, blocos_def in definicoes.items():
+        com_phi: set[int] = set()
+        pendentes = list(blocos_def)
+        while pendentes:
+            for y in fronteira[pendentes.pop()]:
+                if y in com_phi or not vivas[y] >> v & 1:
+                    continue
+                com_phi.add(y)
+                phi = Instr("phi", v, [v] * len(preds[y]))
+                origem[id(phi)] = v
+                phis[y].append(phi)
+                if y not in blocos_def:
+                    pendentes.append(y)
+    for b, bloco in enumerate(blocos):
+        if phis[b]:
+            bloco.instrs[:0] = phis[b]
+
+    # renomeação
+    filhos: list[list[int]] = [[] for _ in blocos]
+    for b in range(1, len(blocos)):
+        filhos[idom[b]].append(b)
+    nomes = _Nomes(funcao, reservados)
+    atual = list(range(n_originais))
+    # (variável, versão anterior), para voltar ao sair de um bloco
+    desfazer: list[tuple[int, int]] = []
+
+    def renomear(x):
+        if x.__class__ is int and x < n_originais and elegivel[x]:
+            return atual[x]
+        return x
+
+    # (bloco, None) para entrar nele; (bloco, marca) para sair
+    pilha: list[tuple[int, int | None]] = [(0, None)]
+    while pilha:
+        b, marca = pilha.pop()
+        if marca is not None:
+            while len(desfazer) > marca:
+                v, anterior = desfazer.pop()
+                atual[v] = anterior
+            continue
+
+        pilha.append((b, len(desfazer)))
+        bloco = blocos[b]
+        for instr in bloco.instrs:
+            if instr.op != "phi":
+                instr.args = [renomear(a) for a in instr.args]
+            dest = instr.dest
+            if dest is not None and dest < n_originais and elegivel[dest]:
+                original = variaveis[dest]
+                variaveis.append(
+                    Variavel(nomes.novo(original.nome + "_"), original.tipo, True)
+                )
+                desfazer.append((dest, atual[dest]))
+                atual[dest] = instr.dest = len(variaveis) - 1
+
+        fim = bloco.fim
+        if fim[0] == "se":
+            bloco.fim = ("se", renomear(fim[1]), fim[2], fim[3])
+        elif fim[0] == "retorne" and fim[1] is not None:
+            bloco.fim = ("retorne", renomear(fim[1]))
+
+        for s in set(funcao.sucessores(b)):
+            for j, p in enumerate(preds[s]):
+                if p == b:
+                    for phi in phis[s]:
+                        phi.args[j] = atual[origem[id(phi)]]
+        for f in reversed(filhos[b]):
+            pilha.append((f, None))
+
+    funcao.ssa = True
+
+
+def _vivas_na_entrada(funcao: FuncaoIR, elegivel: list[bool]) -> list[int]:
+    """
+    Para cada bloco, as variáveis elegíveis vivas na entrada dele (lidas
+    antes de serem atribuídas em algum caminho a partir dali), como um
+    inteiro com o bit de cada índice. É o fluxo de dados para trás de
+    sempre, até não mudar.
+    """
+    blocos = funcao.blocos
+    n = len(blocos)
+    usa = [0] * n
+    define = [0] * n
+    for b, bloco in enumerate(blocos):
+        lidas = definidas = 0
+        fim = bloco.fim
+        operandos = [fim[1]] if fim[0] != "vai" and fim[1] is not None else []
+        for instr in bloco.instrs:
+            for a in instr.args:
+                if a.__class__ is int and elegivel[a] and not definidas >> a & 1:
+                    lidas |= 1 << a
+            if instr.dest is not None and elegivel[instr.dest]:
+                definidas |= 1 << instr.dest
+        for a in operandos:
+            if a.__class__ is int and elegivel[a] and not definidas >> a & 1:
+                lidas |= 1 << a
+        usa[b], define[b] = lidas, definidas
+
+    preds = funcao.predecessores()
+    vivas = [0] * n
+    # lista de trabalho: um bloco volta para ela quando a entrada de um
+    # sucessor muda; do fim para o começo, cada bloco vê os de depois antes
+    pendentes = list(range(n))
+    na_lista = [True] * n
+    while pendentes:
+        b = pendentes.pop()
+        na_lista[b] = False
+        saida = 0
+        for s in funcao.sucessores(b):
+            saida |= vivas[s]
+        entrada = usa[b] | (saida & ~define[b])
+        if entrada != vivas[b]:
+            vivas[b] = entrada
+            for p in preds[b]:
+                if not na_lista[p]:
+                    na_lista[p] = True
+                    pendentes.append(p)
+    return vivas
+
+
+def _dominadores(funcao: FuncaoIR, preds: list[list[int]]) -> list[int]:
+    """
+    Dominador imediato de cada bloco (o da entrada é ela mesma), pelo
+    algoritmo iterativo de Cooper, Harvey e Kennedy sobre a pós-ordem.
+    Todos os blocos são alcançáveis da entrada (ver TradutorIR).
+    """
+    n = len(funcao.blocos)
+    # pós-ordem com pilha explícita: (bloco, próximo sucessor a visitar)
+    ordem: list[int] = []
+    visto = [False] * n
+    visto[0] = True
+    pilha: list[tuple[int, int]] = [(0, 0)]
+    while pilha:
+        b, k = pilha.pop()
+        sucessores = funcao.sucessores(b)
+        if k < len(sucessores):
+            pilha.append((b, k + 1))
+            s = sucessores[k]
+            if not visto[s]:
+                visto[s] = True
+                pilha.append((s, 0))
+        else:
+            ordem.append(b)
+    posicao = [0] * n
+    for i, b in enumerate(ordem):
+        posicao[b] = i
+
+    idom = [-1] * n
+    idom[0] = 0
+    mudou = True
+    while mudou:
+        mudou = False
+        for b in reversed(ordem):
+            if b == 0:
+                continue
+            novo = -1
+            for p in preds[b]:
+                if idom[p] == -1:
+                    continue
+                if novo == -1:
+                    novo = p
+                    continue
+                # interseção: sobe pelos dominadores até se encontrarem
+                a, c = p, novo
+                while a != c:
+                    while posicao[a] < posicao[c]:
+                        a = idom[a]
+                    while posicao[c] < posicao[a]:
+                        c = idom[c]
+                novo = a
+            if idom[b] != novo:
+                idom[b] = novo
+                mudou = True
+    return idom
+
+
+def _desfazer(funcao: FuncaoIR, reservados: set[str]) -> None:
+    blocos = funcao.blocos
+    variaveis = funcao.variaveis
+    preds = funcao.predecessores()
+    nomes = _Nomes(funcao, reservados)
+
+    for b in range(len(blocos)):
+        instrs = blocos[b].instrs
+        k = 0
+        while k < len(instrs) and instrs[k].op == "phi":
+            k += 1
+        if not k:
+            continue
+        phis = instrs[:k]
+        del instrs[:k]
+
+        for j, p in enumerate(preds[b]):
+            if len(funcao.sucessores(p)) > 1:
+                # aresta crítica: as cópias vão num bloco novo no meio dela
+                blocos.append(Bloco([], ("vai", b)))
+                novo = len(blocos) - 1
+                _, cond, entao, senao = blocos[p].fim
+                if entao == b:
+                    blocos[p].fim = ("se", cond, novo, senao)
+                else:
+                    blocos[p].fim = ("se", cond, entao, novo)
+                p = novo
+
+            copias = blocos[p].instrs
+            pares = [(phi.dest, phi.args[j]) for phi in phis if phi.args[j] != phi.dest]
+            destinos = {dest for dest, _ in pares}
+            if not any(valor in destinos for _, valor in pares):
+                # nenhuma cópia lê o que outra escreve: vão direto
+                for dest, valor in pares:
+                    copias.append(Instr("copia", dest, [valor]))
+                continue
+            temporarias = []
+            for dest, valor in pares:
+                tipo = variaveis[dest].tipo
+                variaveis.append(Variavel(nomes.novo("_c"), tipo, True))
+                temporarias.append(len(variaveis) - 1)
+                copias.append(Instr("copia", temporarias[-1], [valor]))
+            for (dest, _), t in zip(pares, temporarias):
+                copias.append(Instr("copia", dest, [t]))
+
+    funcao.ssa = False
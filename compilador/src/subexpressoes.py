@@ -0,0 +1,423 @@
+from __future__ import annotations
+
+from collections.abc import Generator
+
+from .ast_nodes import (
+    Program,
+    Stmt,
+    VarDecl,
+    Assign,
+    Write,
+    If,
+    While,
+    ProcDecl,
+    FuncDecl,
+    CallStmt,
+    Return,
+    Expr,
+    NumInt,
+    NumReal,
+    VarRef,
+    BinOp,
+    Compare,
+    Call,
+)
+from .propagacao_constantes import BOOL, CADEIA, DOUBLE, FLOAT, INT, tipo_comum
+from .reescrita import Reescrita
+from .tabela_simbolos import SimboloRotina, SimboloVar
+
+# operadores em que trocar os lados não muda o resultado no C
+_COMUTATIVOS = ("+", "*")
+
+# tipo Portugol de variável ou retorno -> tipo C do valor
+_TIPOS_C = {"inteiro": INT, "real": FLOAT}
+
+
+class EliminacaoSubexpressoes(Reescrita):
+    """
+    Elimina as subexpressões comuns de cada bloco básico: numa sequência
+    de comandos simples (até o próximo 'se' ou 'enquanto', com a condição
+    do 'se', que é calculada logo depois deles), uma operação que se
+    repete com os mesmos operandos, sem que nenhuma variável que ela lê
+    tenha sido atribuída no meio, é calculada uma vez só.
+
+    Se o valor já está numa variável (`x = a * b; escreva(a * b);`), a
+    repetição lê a variável; senão a primeira ocorrência vai para uma
+    temporária nova, declarada e atribuída logo antes do comando dela, e
+    as outras leem a temporária. Só contam operações (BinOp) sem chamadas
+    dentro e de tipo C int ou float, o das variáveis que o gerador
+    declara (ver MovimentoInvariantes).
+
+    As chamadas não mudam as variáveis de quem chama (os argumentos vão
+    por valor e não há globais), então não atrapalham; mas a temporária é
+    calculada antes das chamadas do comando, e por isso, num comando com
+    chamadas, uma divisão inteira que pode falhar fica onde está.
+
+    É numeração de valores: cada operação ganha o número da sua forma
+    (operador e números dos operandos, na mesma ordem para + e *), e cada
+    atribuição dá à variável o número do valor que ela recebe, então
+    comparar duas operações custa O(1). A sequência é percorrida duas
+    vezes, a primeira só contando as formas que se repetem, para saber
+    quais primeiras ocorrências viram temporárias.
+
+    `relatorio` ganha uma linha com quantas operações foram eliminadas no
+    programa principal, uma por rotina em que alguma foi, e o total. Os nós novos ganham nids a
+    partir de Program.n_nos, como em MovimentoInvariantes.
+    """
+
+    PREFIXO_TEMPORARIAS = "_sub"
+
+    def __init__(
+        self,
+        simbolos: list[SimboloVar | SimboloRotina | None],
+        tipos_expr: list[str | None],
+    ) -> None:
+        super().__init__(simbolos, tipos_expr)
+        self.relatorio: list[str] = []
+        # nome da rotina (None no programa principal) -> eliminadas
+        self._eliminadas: dict[str | None, int] = {}
+        self._rotina: str | None = None
+        # comandos simples ainda não escritos em _saida: a sequência atual
+        self._sequencia: list[Stmt] = []
+
+        # estado de uma passada por uma sequência (ver _percorrer)
+        self._formas: dict[tuple, int] = {}
+        # id do símbolo -> número do valor da variável
+        self._valor_de: dict[int, int] = {}
+        # número -> (símbolo, nome) da variável que guarda esse valor, e
+        # nome -> número, o inverso
+        self._guardado_em: dict[int, tuple[SimboloVar, str]] = {}
+        self._guarda: dict[str, int] = {}
+        # número -> quantas vezes a forma é calculada na sequência, e
+        # quantas operações a primeira passada achou já calculadas
+        self._contagem: dict[int, int] = {}
+        self._repetidas = 0
+        # número -> leitura da temporária (ou variável) com o valor
+        self._leituras: dict[int, VarRef] = {}
+        self._refs: dict[int, VarRef] = {}
+        self._antes: list[Stmt] = []
+
+    def _comandos(self, program: Program) -> list[Stmt]:
+        self._eliminadas = {None: 0}
+        self._rotina = None
+        comandos = self._bloco(program.comandos)
+
+        for rotina, n in self._eliminadas.items():
+            if n or rotina is None:
+                nome = "programa principal" if rotina is None else f"rotina {rotina}"
+                self.relatorio.append(f"{nome}: {n} subexpressões comuns eliminadas")
+        total = sum(self._eliminadas.values())
+        self.relatorio.append(f"{total} subexpressões comuns eliminadas no total")
+        return comandos
+
+    def _resultado(self) -> list[Stmt]:
+        # o bloco acabou: a última sequência dele também
+        self._fechar()
+        return self._saida
+
+    # Um método por classe de comando, chamado por visitar(): os simples
+    # entram na sequência atual; os compostos a fecham e fazem o resto
+    # como em Reescrita
+    def _var_decl(self, stmt: VarDecl) -> None:
+        self._sequencia.append(stmt)
+
+    _assign = _write = _call_stmt = _return = _var_decl
+
+    def _if(self, stmt: If) -> Generator:
+        # a condição é calculada logo depois da sequência que vem antes
+        cond = self._fechar(stmt.cond)
+        then_block = yield stmt.then_block
+        else_block = None
+        if stmt.else_block is not None:
+            else_block = yield stmt.else_block
+        self._saida.append(self._se_novo(stmt, cond, then_block, else_block))
+
+    def _while(self, stmt: While) -> Generator:
+        # a condição é calculada a cada volta: fica fora da sequência
+        self._fechar()
+        block = yield stmt.block
+        self._saida.append(self._enquanto_novo(stmt, stmt.cond, block))
+
+    def _proc_decl(self, stmt: ProcDecl | FuncDecl) -> Generator:
+        self._fechar()
+        self._rotina = stmt.nome
+        self._eliminadas[stmt.nome] = 0
+        body = yield stmt.body
+        self._rotina = None
+        self._saida.append(self._rotina_nova(stmt, body))
+
+    _func_decl = _proc_decl
+
+    # Sequências
+    def _fechar(self, cond: Expr | None = None) -> Expr | None:
+        """
+        Escreve em _saida a sequência atual, sem as subexpressões comuns,
+        e devolve `cond` (a condição do 'se' que a fecha) do mesmo jeito.
+        """
+        sequencia, self._sequencia = self._sequencia, []
+        if not sequencia and cond is None:
+            return None
+
+        # a primeira passada só conta; a segunda reescreve
+        self._contagem = {}
+        self._repetidas = 0
+        self._percorrer(sequencia, cond, False)
+        if not self._repetidas:
+            self._saida += sequencia
+            return cond
+        return self._percorrer(sequencia, cond, True)
+
+    def _percorrer(
+        self, sequencia: list[Stmt], cond: Expr | None, reescrever: bool
+    ) -> Expr | None:
+        self._formas, self._valor_de = {}, {}
+        self._guardado_em, self._guarda = {}, {}
+        self._leituras, self._refs = {}, {}
+        simbolos = self.simbolos
+
+        for stmt in sequencia:
+            self._antes = []
+            classe = stmt.__class__
+            novo = stmt
+            if classe is VarDecl:
+                # o nome passa a ser de outra variável
+                numero = self._guarda.pop(stmt.nome, None)
+                if numero is not None:
+                    del self._guardado_em[numero]
+            elif classe is Assign:
+                sym = simbolos[stmt.nid]
+                expr, numero, tipo = self._numerar(stmt.expr, reescrever)
+                if sym.tipo != "cadeia":
+                    self._atribuir(sym, stmt.nome, numero, tipo)
+                if expr is not stmt.expr:
+                    novo = Assign(stmt.nome, expr, nid=stmt.nid)
+            elif classe is Write:
+                expr = self._numerar(stmt.expr, reescrever)[0]
+                if expr is not stmt.expr:
+                    novo = Write(expr, nid=stmt.nid)
+            elif classe is CallStmt:
+                call = self._numerar(stmt.call, reescrever)[0]
+                if call is not stmt.call:
+                    novo = CallStmt(call, nid=stmt.nid)
+            else:
+                expr = self._numerar(stmt.expr, reescrever)[0]
+                if expr is not stmt.expr:
+                    novo = Return(expr, nid=stmt.nid)
+            if reescrever:
+                self._saida += self._antes
+                self._saida.append(novo)
+
+        if cond is not None:
+            self._antes = []
+            cond = self._numerar(cond, reescrever)[0]
+            if reescrever:
+                self._saida += self._antes
+        return cond
+
+    def _atribuir(self, sym: SimboloVar, nome: str, numero: int, tipo: int) -> None:
+        """`nome` passa a guardar o valor `numero`, de tipo C `tipo`."""
+        antigo = self._guarda.pop(nome, None)
+        if antigo is not None:
+            del self._guardado_em[antigo]
+        if tipo != (INT if sym.tipo == "inteiro" else FLOAT):
+            # a atribuição converte: é outro valor
+            numero = self._formas[("=", len(self._formas))] = len(self._formas)
+        self._valor_de[id(sym)] = numero
+        if numero not in self._guardado_em:
+            self._guardado_em[numero] = (sym, nome)
+            self._guarda[nome] = numero
+
+    # Expressões
+    def _numerar(self, expr: Expr, reescrever: bool) -> tuple[Expr, int, int]:
+        """
+        `expr` com as operações repetidas trocadas por leituras (se
+        `reescrever`; senão só conta), o número do valor dela e o tipo C.
+
+        Primeiro numera a árvore em pós-ordem, com uma pilha explícita:
+        `info` guarda, por nó, (número, tipo C, sem chamada, seguro), em
+        que seguro é não ter divisão inteira que possa falhar. Só se
+        alguma operação se repete (ou, ao reescrever, vira temporária)
+        desce de novo, sem entrar nas operações que já têm o valor
+        guardado em algum lugar, e monta os nós novos na volta (a marca
+        (node,) combina os filhos, que estão no topo de `resultados`).
+        """
+        simbolos = self.simbolos
+        formas = self._formas
+        valor_de = self._valor_de
+        info: dict[int, tuple[int, int, bool, bool]] = {}
+        operacoes: list[tuple[int, int, bool, bool]] = []
+        # o mesmo nó (FabricaNos) mais de uma vez no comando
+        repetido = False
+        pilha: list = [expr]
+        while pilha:
+            node = pilha.pop()
+            classe = node.__class__
+            if classe is tuple:
+                node = node[0]
+                classe = node.__class__
+                if classe is Call:
+                    # cada chamada dá um valor diferente
+                    tipo = _TIPOS_C.get(simbolos[node.nid].retorno, CADEIA)
+                    numero = formas[("()", len(formas))] = len(formas)
+                    info[id(node)] = (numero, tipo, False, True)
+                    continue
+                n_esq, t_esq, sem_esq, seg_esq = info[id(node.left)]
+                n_dir, t_dir, sem_dir, seg_dir = info[id(node.right)]
+                seguro = seg_esq and seg_dir
+                if classe is Compare:
+                    tipo = BOOL
+                else:
+                    tipo = tipo_comum(t_esq, t_dir)
+                    if node.op == "/" and tipo == INT:
+                        divisor = node.right
+                        # x / 0 e INT_MIN / -1 param o programa
+                        if divisor.__class__ is not NumInt or divisor.valor in (0, -1):
+                            seguro = False
+                if n_dir < n_esq and node.op in _COMUTATIVOS:
+                    n_esq, n_dir = n_dir, n_esq
+                forma = (node.op, tipo, n_esq, n_dir)
+                numero = formas.get(forma)
+                if numero is None:
+                    numero = formas[forma] = len(formas)
+                info[id(node)] = dados = (numero, tipo, sem_esq and sem_dir, seguro)
+                if classe is BinOp:
+                    operacoes.append(dados)
+            elif id(node) in info:
+                repetido = repetido or classe is BinOp
+            elif classe is VarRef:
+                sym = simbolos[node.nid]
+                numero = valor_de.get(id(sym))
+                if numero is None:
+                    # o valor que ela tem ao começar a sequência
+                    numero = valor_de[id(sym)] = formas[("v", id(sym))] = len(formas)
+                info[id(node)] = (numero, _TIPOS_C.get(sym.tipo, CADEIA), True, True)
+            elif classe is BinOp or classe is Compare:
+                pilha.append((node,))
+                pilha.append(node.right)
+                pilha.append(node.left)
+            elif classe is Call:
+                pilha.append((node,))
+                pilha += node.args
+            else:
+                # literal: o número é o do valor
+                if classe is NumInt:
+                    forma, tipo = ("i", node.valor), INT
+                elif classe is NumReal:
+                    forma, tipo = ("r", node.valor), DOUBLE
+                else:
+                    forma, tipo = ("s", node.valor), CADEIA
+                numero = formas.get(forma)
+                if numero is None:
+                    numero = formas[forma] = len(formas)
+                info[id(node)] = (numero, tipo, True, True)
+
+        numero, tipo, sem_chamada, _ = info[id(expr)]
+        # a temporária é calculada antes das chamadas do comando: com
+        # alguma, só sai do lugar o que não pode falhar
+        exige_seguro = not sem_chamada
+
+        def elegivel(dados: tuple[int, int, bool, bool]) -> bool:
+            _, tipo_c, sem_chamadas, seguro = dados
+            return (
+                (tipo_c == INT or tipo_c == FLOAT)
+                and sem_chamadas
+                and (seguro or not exige_seguro)
+            )
+
+        contagem = self._contagem
+        if not repetido:
+            numeros = [dados[0] for dados in operacoes if elegivel(dados)]
+            if reescrever:
+                mexe = any(
+                    n in self._leituras or n in self._guardado_em or contagem.get(n, 0) > 1
+                    for n in numeros
+                )
+            else:
+                mexe = len(set(numeros)) < len(numeros) or any(
+                    n in self._guardado_em or n in contagem for n in numeros
+                )
+            if not mexe:
+                # nenhuma repetição: a descida só contaria cada uma
+                if not reescrever:
+                    for n in numeros:
+                        contagem[n] = 1
+                return expr, numero, tipo
+
+        resultados: list[Expr] = []
+        pilha = [expr]
+        while pilha:
+            node = pilha.pop()
+            classe = node.__class__
+
+            if classe is tuple:
+                original = node = node[0]
+                classe = node.__class__
+                n = len(node.args) if classe is Call else 2
+                novos = resultados[len(resultados) - n :]
+                del resultados[len(resultados) - n :]
+                if classe is Call:
+                    if any(a is not b for a, b in zip(novos, node.args)):
+                        node = Call(node.nome, novos, nid=node.nid)
+                elif novos[0] is not node.left or novos[1] is not node.right:
+                    node = classe(node.op, novos[0], novos[1], nid=node.nid)
+                if reescrever and classe is BinOp:
+                    dados = info[id(original)]
+                    if elegivel(dados) and contagem.get(dados[0], 0) > 1:
+                        # primeira de várias: vai para uma temporária
+                        node = self._guardar(node, dados[1], dados[0])
+                resultados.append(node)
+                continue
+
+            if classe is BinOp:
+                dados = info[id(node)]
+                if elegivel(dados):
+                    valor = dados[0]
+                    if reescrever:
+                        leitura = self._leitura(valor)
+                        if leitura is not None:
+                            self._eliminadas[self._rotina] += 1
+                            resultados.append(leitura)
+                            continue
+                    elif valor in self._guardado_em or valor in contagem:
+                        # já calculada: não conta o que está dentro dela
+                        self._repetidas += 1
+                        if valor not in self._guardado_em:
+                            contagem[valor] += 1
+                        resultados.append(node)
+                        continue
+                    else:
+                        contagem[valor] = 1
+            if classe is BinOp or classe is Compare:
+                pilha.append((node,))
+                pilha.append(node.right)
+                pilha.append(node.left)
+            elif classe is Call:
+                pilha.append((node,))
+                pilha += reversed(node.args)
+            else:
+                resultados.append(node)
+
+        return resultados[0], numero, tipo
+
+    def _leitura(self, valor: int) -> VarRef | None:
+        """Leitura da temporária ou variável que já tem o valor `valor`, se houver."""
+        leitura = self._leituras.get(valor)
+        if leitura is not None:
+            return leitura
+        guardado = self._guardado_em.get(valor)
+        if guardado is None:
+            return None
+        sym, nome = guardado
+        leitura = self._refs.get(id(sym))
+        if leitura is None:
+            leitura = self._refs[id(sym)] = VarRef(
+                nome, nid=self._novo_nid(sym, sym.tipo)
+            )
+        return leitura
+
+    def _guardar(self, node: Expr, tipo: int, valor: int) -> VarRef:
+        """Atribui `node` a uma temporária nova antes do comando atual e devolve a leitura dela."""
+        atribuicao, leitura = self._temporaria(node, "inteiro" if tipo == INT else "real")
+        self._antes += atribuicao
+        self._leituras[valor] = leitura
+        return leitura
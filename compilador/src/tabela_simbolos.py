@@ -18,35 +18,91 @@ class SimboloRotina:
 
 
 class TabelaDeSimbolos:
+    """
+    Escopos aninhados, com um dicionário nome -> pilha de símbolos: o topo
+    da pilha é a declaração visível, então buscar() não depende da
+    profundidade. Cada escopo com declarações guarda os nomes que declarou
+    (o log para desfazer), e pop() tira só esses.
+    """
+
     def __init__(self) -> None:
-        self._scopes: list[dict[str, object]] = [dict()]
+        self._simbolos: dict[str, list[object]] = {}
+        # (nível, nomes declarados nele), só para os níveis com declarações;
+        # o primeiro é o escopo global
+        self._desfazer: list[tuple[int, set[str]]] = [(0, set())]
+        self._nivel = 0
+
+    @property
+    def nivel(self) -> int:
+        return self._nivel
 
     def push(self) -> None:
-        self._scopes.append(dict())
+        self._nivel += 1
 
     def pop(self) -> None:
-        if len(self._scopes) == 1:
+        if self._nivel == 0:
             raise RuntimeError("Não é permitido remover o escopo global.")
-        self._scopes.pop()
+        if self._desfazer[-1][0] == self._nivel:
+            simbolos = self._simbolos
+            for nome in self._desfazer.pop()[1]:
+                pilha = simbolos[nome]
+                pilha.pop()
+                if not pilha:
+                    del simbolos[nome]
+        self._nivel -= 1
+
+    def voltar_para(self, nivel: int) -> None:
+        """Fecha os escopos abertos depois de `nivel`."""
+        while self._nivel > nivel:
+            self.pop()
 
-    def declarar_var(self, nome: str, tipo: str) -> None:
-        atual = self._scopes[-1]
-        if nome in atual:
+    def declarar_var(self, nome: str, tipo: str) -> SimboloVar:
+        if self._desfazer[-1][0] != self._nivel:
+            self._desfazer.append((self._nivel, set()))
+        nomes = self._desfazer[-1][1]
+        if nome in nomes:
             raise ValueError(f"Identificador '{nome}' já declarado neste escopo.")
-        atual[nome] = SimboloVar(kind="var", nome=nome, tipo=tipo)
+        nomes.add(nome)
+        sym = SimboloVar(kind="var", nome=nome, tipo=tipo)
+        self._simbolos.setdefault(nome, []).append(sym)
+        return sym
 
     def declarar_rotina(
         self, nome: str, kind: str, params: list[str], retorno: str | None
     ) -> None:
-        atual = self._scopes[0]
-        if nome in atual:
+        globais = self._desfazer[0][1]
+        if nome in globais:
             raise ValueError(f"Rotina '{nome}' já declarada.")
-        atual[nome] = SimboloRotina(
-            kind=kind, nome=nome, params=params, retorno=retorno
+        globais.add(nome)
+        # as declarações globais ficam no fundo das pilhas
+        self._simbolos.setdefault(nome, []).insert(
+            0, SimboloRotina(kind=kind, nome=nome, params=params, retorno=retorno)
         )
 
+    def definir_retorno(self, nome: str, retorno: str | None) -> SimboloRotina:
+        """Fixa o tipo de retorno da rotina global `nome`; devolve o símbolo novo."""
+        pilha = self._simbolos[nome]
+        sym = pilha[0]
+        # sem dataclasses.replace, que é bem mais lento
+        pilha[0] = SimboloRotina(sym.kind, sym.nome, sym.params, retorno)
+        return pilha[0]
+
+    def globais(self) -> set[str]:
+        """Os nomes declarados no escopo global, rotinas e variáveis."""
+        return set(self._desfazer[0][1])
+
+    def retirar_globais(self, nomes: set[str]) -> None:
+        """Desfaz as declarações de variáveis globais `nomes` (ver declarar_var)."""
+        globais = self._desfazer[0][1]
+        for nome in nomes:
+            globais.remove(nome)
+            pilha = self._simbolos[nome]
+            pilha.pop()
+            if not pilha:
+                del self._simbolos[nome]
+
     def buscar(self, nome: str):
-        for scope in reversed(self._scopes):
-            if nome in scope:
-                return scope[nome]
+        pilha = self._simbolos.get(nome)
+        if pilha:
+            return pilha[-1]
         return None
@@ -0,0 +1,96 @@
+"""
+Tipos de token como inteiros pequenos. A ordem segue Lexer.TOKEN_SPECS,
+depois Lexer.KEYWORDS e por fim EOF; NOMES[tipo] dá o nome do tipo.
+"""
+
+NOMES = (
+    # especiais (descartados pelo lexer)
+    "NEWLINE",
+    "SKIP",
+    "COMMENT",
+    # literais
+    "STRING",
+    "NUM_REAL",
+    "NUM_INT",
+    # operadores
+    "EQ",
+    "NE",
+    "LE",
+    "GE",
+    "LT",
+    "GT",
+    "ASSIGN",
+    "PLUS",
+    "MINUS",
+    "MUL",
+    "DIV",
+    # delimitadores
+    "SEMI",
+    "COMMA",
+    "LPAREN",
+    "RPAREN",
+    # identificadores
+    "IDENT",
+    # palavras-chave
+    "KW_INTEIRO",
+    "KW_REAL",
+    "KW_CADEIA",
+    "KW_SE",
+    "KW_ENTAO",
+    "KW_SENAO",
+    "KW_FIMSE",
+    "KW_ENQUANTO",
+    "KW_FACA",
+    "KW_FIMENQUANTO",
+    "KW_PROCEDIMENTO",
+    "KW_FUNCAO",
+    "KW_INICIO",
+    "KW_FIM",
+    "KW_RETORNE",
+    "KW_ESCREVA",
+    "EOF",
+)
+
+(
+    NEWLINE,
+    SKIP,
+    COMMENT,
+    STRING,
+    NUM_REAL,
+    NUM_INT,
+    EQ,
+    NE,
+    LE,
+    GE,
+    LT,
+    GT,
+    ASSIGN,
+    PLUS,
+    MINUS,
+    MUL,
+    DIV,
+    SEMI,
+    COMMA,
+    LPAREN,
+    RPAREN,
+    IDENT,
+    KW_INTEIRO,
+    KW_REAL,
+    KW_CADEIA,
+    KW_SE,
+    KW_ENTAO,
+    KW_SENAO,
+    KW_FIMSE,
+    KW_ENQUANTO,
+    KW_FACA,
+    KW_FIMENQUANTO,
+    KW_PROCEDIMENTO,
+    KW_FUNCAO,
+    KW_INICIO,
+    KW_FIM,
+    KW_RETORNE,
+    KW_ESCREVA,
+    EOF,
+) = range(len(NOMES))
+
+TIPO_ID = {nome: tipo for tipo, nome in enumerate(NOMES)}
@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+from collections.abc import Generator, Iterator
+
+from .ast_nodes import (
+    Program,
+    Stmt,
+    VarDecl,
+    Assign,
+    Write,
+    If,
+    While,
+    ProcDecl,
+    FuncDecl,
+    CallStmt,
+    Return,
+    Param,
+    Expr,
+    NumInt,
+    NumReal,
+    StrLit,
+    VarRef,
+    BinOp,
+    Compare,
+    Call,
+)
+from .ir import (
+    CADEIA,
+    DOUBLE,
+    FLOAT,
+    INT,
+    Bloco,
+    Const,
+    FuncaoIR,
+    Instr,
+    Operando,
+    ProgramaIR,
+    Variavel,
+)
+from .tabela_simbolos import SimboloRotina, SimboloVar
+from .visitante import Visitante
+
+# Tipo C de cada tipo de Portugol, como em GeradorC
+TIPOS_C = {"inteiro": INT, "real": FLOAT, "cadeia": CADEIA}
+
+
+class TradutorIR(Visitante):
+    """
+    Traduz a AST analisada para a IR de três endereços de ir.py: cada
+    rotina e o programa principal viram uma FuncaoIR com blocos básicos,
+    'se' e 'enquanto' viram desvios entre blocos e cada operador ou chamada
+    dentro de uma expressão ganha uma variável temporária.
+
+    O tipo C de cada temporária é o que a subexpressão tem no C de
+    GeradorC (float com float dá float, com um literal real dá double), e
+    as conversões acontecem nos mesmos pontos, então o C gerado a partir da
+    IR calcula os mesmos valores. A ordem de avaliação é sempre da esquerda
+    para a direita, dentro do que o C deixa em aberto.
+
+    Como todas as variáveis de uma rotina ficam no mesmo nível, uma
+    declaração que esconde outra de mesmo nome ganha um nome novo. Os
+    blocos que não são alcançados a partir da entrada (o que vem depois de
+    um 'retorne') são descartados.
+    """
+
+    def __init__(
+        self,
+        simbolos: list[SimboloVar | SimboloRotina | None],
+        tipos_expr: list[str | None],
+    ) -> None:
+        # ambos vêm de AnalisadorSemantico, indexados pelo nid dos nós
+        self.simbolos = simbolos
+        self.tipos_expr = tipos_expr
+        self._funcao: FuncaoIR | None = None
+        self._atual = 0
+        # id do símbolo -> índice da variável na função atual
+        self._vars: dict[int, int] = {}
+        self._params: dict[str, int] = {}
+        # nomes já usados na função atual (e os das rotinas)
+        self._nomes: set[str] = set()
+        # nomes declarados que ainda não foram usados por uma variável
+        self._livres: set[str] = set()
+        # prefixo -> último número usado num nome novo
+        self._contadores: dict[str, int] = {}
+        self._rotinas: set[str] = set()
+
+    def traduzir(self, program: Program) -> ProgramaIR:
+        rotinas = [s for s in program.comandos if isinstance(s, (ProcDecl, FuncDecl))]
+        self._rotinas = {s.nome for s in rotinas}
+
+        funcoes = []
+        for stmt in rotinas:
+            sym = self.simbolos[stmt.nid]
+            retorno = TIPOS_C[sym.retorno] if isinstance(stmt, FuncDecl) else None
+            funcoes.append(self._traduzir(stmt.nome, retorno, stmt.params, stmt.body))
+
+        principal = self._traduzir(
+            None,
+            INT,
+            [],
+            [s for s in program.comandos if not isinstance(s, (ProcDecl, FuncDecl))],
+        )
+        return ProgramaIR(funcoes, principal)
+
+    def _traduzir(
+        self,
+        nome: str | None,
+        retorno: str | None,
+        params: list[Param],
+        corpo: list[Stmt],
+    ) -> FuncaoIR:
+        funcao = self._funcao = FuncaoIR(nome, retorno, [], [], [Bloco()])
+        self._atual = 0
+        self._vars = {}
+        # a primeira declaração de cada nome fica com ele; as temporárias e
+        # as declarações que escondem outra ganham nomes que evitam todos
+        declaradas = _declaradas(corpo)
+        self._livres = declaradas - {p.nome for p in params}
+        self._nomes = self._rotinas | declaradas | {p.nome for p in params}
+        self._contadores = {}
+
+        self._params = {}
+        for p in params:
+            funcao.variaveis.append(Variavel(p.nome, TIPOS_C[p.tipo]))
+            funcao.params.append(len(funcao.variaveis) - 1)
+            self._params[p.nome] = len(funcao.variaveis) - 1
+
+        self._bloco(corpo)
+        # o programa principal termina com 0; numa função o 'retorne' do fim
+        # do corpo já fechou o bloco, que fica sem predecessores
+        self._terminar(("retorne", Const(INT, 0) if nome is None else None))
+        funcao.blocos = _alcancaveis(funcao.blocos)
+        self._funcao = None
+        return funcao
+
+    def _bloco(self, stmts: list[Stmt]) -> None:
+        """
+        Traduz `stmts` e os blocos aninhados neles sem recursão: comandos
+        compostos são geradores que fazem `yield` de cada bloco interno e
+        continuam depois que ele foi traduzido.
+        """
+        visitar = self.visitar
+        pilha: list[tuple[Generator | None, Iterator[Stmt]]] = []
+        gerador: Generator | None = None
+        comandos = iter(stmts)
+
+        while True:
+            for stmt in comandos:
+                sub = visitar(stmt)
+                if sub is not None:
+                    pilha.append((gerador, comandos))
+                    gerador = sub
+                    break
+
+            if gerador is None:
+                return
+            bloco = next(gerador, None)
+            if bloco is None:
+                gerador, comandos = pilha.pop()
+            else:
+                comandos = iter(bloco)
+
+    def _novo_bloco(self) -> int:
+        self._funcao.blocos.append(Bloco())
+        return len(self._funcao.blocos) - 1
+
+    def _terminar(self, fim: tuple) -> None:
+        self._funcao.blocos[self._atual].fim = fim
+
+    def _emitir(self, instr: Instr) -> None:
+        self._funcao.blocos[self._atual].instrs.append(instr)
+
+    def _nova_variavel(self, nome: str, tipo: str, temporaria: bool = False) -> int:
+        variaveis = self._funcao.variaveis
+        variaveis.append(Variavel(nome, tipo, temporaria))
+        return len(variaveis) - 1
+
+    def _temporaria(self, tipo: str) -> int:
+        """Índice de uma temporária nova do tipo C `tipo`."""
+        n = self._contadores.get("_t", 0) + 1
+        nomes = self._nomes
+        while f"_t{n}" in nomes:
+            n += 1
+        self._contadores["_t"] = n
+        variaveis = self._funcao.variaveis
+        variaveis.append(Variavel(f"_t{n}", tipo, True))
+        return len(variaveis) - 1
+
+    def _nome_livre(self, base: str) -> str:
+        n = self._contadores.get(base, 0) + 1
+        while f"{base}{n}" in self._nomes:
+            n += 1
+        self._contadores[base] = n
+        nome = f"{base}{n}"
+        self._nomes.add(nome)
+        return nome
+
+    def _variavel(self, nid: int) -> int:
+        """Índice da variável a que se refere o nó `nid`."""
+        sym = self.simbolos[nid]
+        indice = self._vars.get(id(sym))
+        if indice is None:
+            # só os parâmetros não passam por um VarDecl
+            indice = self._vars[id(sym)] = self._params[sym.nome]
+        return indice
+
+    # Um método por classe de comando, chamado por visitar(): os simples
+    # emitem as suas instruções no bloco atual; os compostos devolvem o
+    # gerador dos seus blocos
+    def _nao_suportado(self, no: Stmt) -> None:
+        raise ValueError(f"Stmt não suportado na IR: {type(no).__name__}")
+
+    def _var_decl(self, stmt: VarDecl) -> None:
+        nome = stmt.nome
+        if nome in self._livres:
+            self._livres.discard(nome)
+        else:
+            nome = self._nome_livre(nome + "_")
+        sym = self.simbolos[stmt.nid]
+        self._vars[id(sym)] = self._nova_variavel(nome, TIPOS_C[stmt.tipo])
+
+    def _assign(self, stmt: Assign) -> None:
+        valor = self._expr(stmt.expr)
+        self._emitir(Instr("copia", self._variavel(stmt.nid), [valor]))
+
+    def _write(self, stmt: Write) -> None:
+        self._emitir(Instr("escreva", None, [self._expr(stmt.expr)]))
+
+    def _call_stmt(self, stmt: CallStmt) -> None:
+        call = stmt.call
+        args = [self._expr(arg) for arg in call.args]
+        self._emitir(Instr("chamada", None, args, call.nome))
+
+    def _return(self, stmt: Return) -> None:
+        self._terminar(("retorne", self._expr(stmt.expr)))
+        # o que vier depois no mesmo bloco não é alcançado
+        self._atual = self._novo_bloco()
+
+    def _if(self, stmt: If) -> Generator:
+        cond = self._expr(stmt.cond)
+        entao = self._novo_bloco()
+        senao = self._novo_bloco() if stmt.else_block is not None else None
+        depois = self._novo_bloco()
+        self._terminar(("se", cond, entao, depois if senao is None else senao))
+
+        self._atual = entao
+        yield stmt.then_block
+        self._terminar(("vai", depois))
+
+        if senao is not None:
+            self._atual = senao
+            yield stmt.else_block
+            self._terminar(("vai", depois))
+        self._atual = depois
+
+    def _while(self, stmt: While) -> Generator:
+        teste = self._novo_bloco()
+        self._terminar(("vai", teste))
+        self._atual = teste
+        cond = self._expr(stmt.cond)
+        corpo = self._novo_bloco()
+        depois = self._novo_bloco()
+        self._terminar(("se", cond, corpo, depois))
+
+        self._atual = corpo
+        yield stmt.block
+        self._terminar(("vai", teste))
+        self._atual = depois
+
+    # Expressões
+    def _expr(self, expr: Expr) -> Operando:
+        """
+        Emite as instruções que calculam `expr` e devolve o operando com o
+        seu valor, em pós-ordem com uma pilha explícita; o marcador
+        `(node,)` combina os operandos dos filhos, que estão no topo de
+        `valores`.
+        """
+        variaveis = self._funcao.variaveis
+        # a expressão inteira fica no bloco atual
+        instrs = self._funcao.blocos[self._atual].instrs
+        temporaria = self._temporaria
+        valores: list[Operando] = []
+        pilha: list = [expr]
+
+        while pilha:
+            node = pilha.pop()
+            classe = node.__class__
+
+            if classe is tuple:
+                node = node[0]
+                classe = node.__class__
+                if classe is Call:
+                    n = len(node.args)
+                    args = valores[len(valores) - n :]
+                    del valores[len(valores) - n :]
+                    dest = temporaria(TIPOS_C[self.simbolos[node.nid].retorno])
+                    instrs.append(Instr("chamada", dest, args, node.nome))
+                else:
+                    direita = valores.pop()
+                    esquerda = valores.pop()
+                    if classe is Compare:
+                        tipo = INT
+                    else:
+                        tipo = _tipo_comum(
+                            esquerda.tipo if esquerda.__class__ is Const else variaveis[esquerda].tipo,
+                            direita.tipo if direita.__class__ is Const else variaveis[direita].tipo,
+                        )
+                    dest = temporaria(tipo)
+                    instrs.append(Instr(node.op, dest, [esquerda, direita]))
+                valores.append(dest)
+            elif classe is VarRef:
+                valores.append(self._variavel(node.nid))
+            elif classe is NumInt:
+                valores.append(Const(INT, node.valor))
+            elif classe is NumReal:
+                valores.append(Const(DOUBLE, node.valor))
+            elif classe is StrLit:
+                valores.append(Const(CADEIA, node.valor))
+            elif classe is BinOp or classe is Compare:
+                pilha.append((node,))
+                pilha.append(node.right)
+                pilha.append(node.left)
+            elif classe is Call:
+                pilha.append((node,))
+                pilha += reversed(node.args)
+            else:
+                raise ValueError(f"Expr não suportada: {classe.__name__}")
+
+        return valores[0]
+
+
+def _tipo_comum(a: str, b: str) -> str:
+    """Tipo C de `a op b` para um operador aritmético."""
+    if a == DOUBLE or b == DOUBLE:
+        return DOUBLE
+    if a == FLOAT or b == FLOAT:
+        return FLOAT
+    return INT
+
+
+def _declaradas(stmts: list[Stmt]) -> set[str]:
+    """Nomes declarados em `stmts` e nos blocos aninhados neles."""
+    nomes: set[str] = set()
+    pilha = list(stmts)
+    while pilha:
+        stmt = pilha.pop()
+        classe = stmt.__class__
+        if classe is VarDecl:
+            nomes.add(stmt.nome)
+        elif classe is If:
+            pilha += stmt.then_block
+            if stmt.else_block is not None:
+                pilha += stmt.else_block
+        elif classe is While:
+            pilha += stmt.block
+    return nomes
+
+
+def _alcancaveis(blocos: list[Bloco]) -> list[Bloco]:
+    """`blocos` sem os que não se alcançam da entrada, renumerados."""
+    novo = {0: 0}
+    ordem = [0]
+    pilha = [0]
+    while pilha:
+        fim = blocos[pilha.pop()].fim
+        destinos = (fim[1],) if fim[0] == "vai" else fim[2:] if fim[0] == "se" else ()
+        for d in destinos:
+            if d not in novo:
+                novo[d] = len(ordem)
+                ordem.append(d)
+                pilha.append(d)
+
+    # mantém a ordem original, que segue a do código
+    ordem.sort()
+    novo = {b: i for i, b in enumerate(ordem)}
+    saida = []
+    for b in ordem:
+        bloco = blocos[b]
+        fim = bloco.fim
+        if fim[0] == "vai":
+            bloco.fim = ("vai", novo[fim[1]])
+        elif fim[0] == "se":
+            bloco.fim = ("se", fim[1], novo[fim[2]], novo[fim[3]])
+        saida.append(bloco)
+    return saida
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import re
+from collections.abc import Callable
+from typing import Any
+
+from .ast_nodes import No
+
+
+class Visitante:
+    """
+    Base das fases que percorrem a AST. visitar(no) chama o método da fase
+    para a classe exata de `no`: `_` seguido do nome da classe em snake_case
+    (VarDecl -> _var_decl, If -> _if), ou _nao_suportado se a fase não o
+    tiver.
+
+    O método de cada classe é procurado uma vez só e guardado em
+    `_metodos`, um dicionário por fase; depois disso cada visita custa uma
+    busca pela classe, em vez de uma cadeia de isinstance em que os últimos
+    tipos pagam pelos testes de todos os anteriores.
+
+    visitar() só despacha: percorrer os filhos (e sem recursão, nas fases
+    que precisam aguentar aninhamento profundo) fica com a fase.
+    """
+
+    # classe do nó -> função (não ligada) que a trata; cada subclasse tem o seu
+    _metodos: dict[type, Callable[[Any, No], Any]] = {}
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._metodos = {}
+
+    def visitar(self, no: No) -> Any:
+        try:
+            metodo = self._metodos[no.__class__]
+        except KeyError:
+            metodo = self._resolver(no.__class__)
+        return metodo(self, no)
+
+    @classmethod
+    def _resolver(cls, classe: type) -> Callable[[Any, No], Any]:
+        metodo = getattr(cls, nome_metodo(classe), None)
+        if metodo is None or not issubclass(classe, No):
+            metodo = cls._nao_suportado
+        cls._metodos[classe] = metodo
+        return metodo
+
+    def _nao_suportado(self, no: No) -> Any:
+        raise TypeError(f"Nó não suportado: {type(no).__name__}")
+
+
+def nome_metodo(classe: type) -> str:
+    """Nome do método que trata `classe` numa fase: CallStmt -> _call_stmt."""
+    return "_" + re.sub(r"(?<!^)(?=[A-Z])", "_", classe.__name__).lower()
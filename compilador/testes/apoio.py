@@ -0,0 +1,73 @@
+"""Funções comuns dos testes: compilar Portugol até o C e executar o C."""
+
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from src.ast_nodes import Program
+from src.gerador_c import GeradorC
+from src.gerador_c_ir import GeradorCIR
+from src.intervalos import AnaliseIntervalos, TiposC
+from src.lexer import Lexer
+from src.otimizador import otimizar
+from src.parser import Parser
+from src.semantico import AnalisadorSemantico
+from src.traducao_ir import TradutorIR
+
+
+def compilar(fonte: str, nivel: int = 1, ir: bool = False) -> str:
+    """O C que o main geraria para `fonte` com -O `nivel` (e --ir)."""
+    arvore, semantica = _otimizar(fonte, nivel)
+    if ir:
+        programa = TradutorIR(semantica.simbolos, semantica.tipos_expr).traduzir(arvore)
+        return GeradorCIR().gerar(programa)
+    # no -O2 os tipos C das variáveis saem da análise de intervalos
+    tipos = None
+    if nivel >= 2:
+        tipos = AnaliseIntervalos(semantica.simbolos, semantica.tipos_expr).analisar(arvore)
+    return GeradorC(semantica.simbolos, semantica.tipos_expr, tipos).gerar(arvore)
+
+
+def tipos_c(fonte: str) -> TiposC:
+    """Os tipos C que o main usaria para `fonte` com -O2 (e --explicar-tipos)."""
+    arvore, semantica = _otimizar(fonte, 2)
+    return AnaliseIntervalos(semantica.simbolos, semantica.tipos_expr).analisar(arvore)
+
+
+def _otimizar(fonte: str, nivel: int) -> tuple[Program, AnalisadorSemantico]:
+    lexer = Lexer()
+    arvore = Parser(lexer.tokenizar(fonte), lexer.indice).parse()
+    semantica = AnalisadorSemantico()
+    semantica.analisar(arvore)
+    arvore = otimizar(arvore, semantica.simbolos, semantica.tipos_expr, nivel)
+    return arvore, semantica
+
+
+def executar(codigo_c: str) -> str:
+    """
+    Compila `codigo_c` com o cc do sistema e devolve a saída do programa.
+    Sem compilador C, o teste é pulado.
+    """
+    cc = shutil.which("cc") or shutil.which("gcc")
+    if cc is None:
+        raise unittest.SkipTest("sem compilador C")
+    with tempfile.TemporaryDirectory() as pasta:
+        fonte = os.path.join(pasta, "programa.c")
+        binario = os.path.join(pasta, "programa")
+        with open(fonte, "w", encoding="utf-8") as arquivo:
+            arquivo.write(codigo_c)
+        # -fwrapv: o estouro de inteiro dá o mesmo resultado em todo nível
+        compilado = subprocess.run(
+            [cc, "-w", "-fwrapv", "-o", binario, fonte, "-lm"],
+            capture_output=True,
+            text=True,
+        )
+        if compilado.returncode:
+            raise AssertionError(f"o C gerado não compila:\n{compilado.stderr}")
+        return subprocess.run(
+            [binario], capture_output=True, text=True, timeout=10, check=True
+        ).stdout
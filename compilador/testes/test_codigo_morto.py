@@ -0,0 +1,44 @@
+import unittest
+
+from testes.apoio import compilar, executar
+
+# o 'retorne' do fim do corpo lê uma variável declarada depois de um 'se'
+# em que os dois caminhos retornam, e a declaração sai com o código morto
+RETORNO_DEPOIS_DE_SE = """
+funcao f(inteiro a)
+inicio
+  se (a > 0) entao
+    retorne 1;
+  senao
+    retorne 2;
+  fimse
+  inteiro v;
+  v = a;
+  retorne v;
+fim
+escreva(f(3));
+escreva(f(0));
+"""
+
+
+class TestCodigoMorto(unittest.TestCase):
+    def test_retorne_depois_de_se_que_retorna(self):
+        for nivel in (0, 1, 2):
+            for ir in (False, True):
+                with self.subTest(nivel=nivel, ir=ir):
+                    c = compilar(RETORNO_DEPOIS_DE_SE, nivel, ir)
+                    self.assertEqual(executar(c), "12")
+
+    def test_retorne_inalcancavel_do_tipo_da_funcao(self):
+        fonte = (
+            RETORNO_DEPOIS_DE_SE.replace("retorne 1;", "retorne 1.5;")
+            .replace("inteiro v;", "real v;")
+            .replace("v = a;", "v = a / 2.0;")
+        )
+        c = compilar(fonte, 1)
+        self.assertNotIn("return v;", c)
+        self.assertEqual(executar(c), executar(compilar(fonte, 0)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from src.intervalos import explicar
+from testes.apoio import compilar, executar, tipos_c
+
+# um contador em [0, 40], um inteiro que passa de 32 bits mas cabe em 64 e
+# um real acima de 2^24, todos com limites que a análise prova
+FONTE = """
+inteiro i;
+inteiro grande;
+real r;
+i = 0;
+enquanto (i < 40) faca
+  grande = (i + 1000) * 5000000;
+  r = (i + 1) * 20000000.5;
+  escreva(grande); escreva(" "); escreva(r); escreva("\\n");
+  i = i + 1;
+fimenquanto
+escreva(i); escreva("\\n");
+"""
+
+
+class TestAnaliseIntervalos(unittest.TestCase):
+    def test_explicar(self):
+        linhas = explicar(tipos_c(FONTE)).splitlines()
+        self.assertIn("  inteiro i: [0, 40] -> signed char (cabe em 8 bits)", linhas)
+        self.assertIn(
+            "  inteiro grande: [5000000000, 5195000000] -> long long "
+            "(passa de 32 bits, estouraria o int)",
+            linhas,
+        )
+        self.assertIn(
+            "  real r: [20000000.5, 800000020.0] -> double "
+            "(passa de 2^24, o float perderia dígitos)",
+            linhas,
+        )
+        self.assertIn("1 operações inteiras calculadas em long long", linhas)
+
+    def test_tipos_no_c(self):
+        codigo = compilar(FONTE, 2)
+        self.assertIn("signed char i;", codigo)
+        self.assertIn("long long grande;", codigo)
+        self.assertIn("double r;", codigo)
+        self.assertIn('printf("%lld", grande);', codigo)
+
+        # sem -O2 os tipos são os de sempre
+        codigo = compilar(FONTE, 1)
+        self.assertIn("int i;", codigo)
+        self.assertIn("int grande;", codigo)
+        self.assertIn("float r;", codigo)
+
+    def test_saida(self):
+        esperado = "".join(
+            f"{(i + 1000) * 5000000} {(i + 1) * 20000000.5:f}\n" for i in range(40)
+        )
+        self.assertEqual(executar(compilar(FONTE, 2)), esperado + "40\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
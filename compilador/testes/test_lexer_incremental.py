@@ -0,0 +1,73 @@
+import random
+import unittest
+
+from src.erros import ErroLexico
+from src.lexer import Lexer
+from src.lexer_incremental import DocumentoLexico
+
+FONTE = """
+funcao f(inteiro a, real b)
+inicio
+  retorne a * 3 + b / 2.5; // comentario
+fim
+inteiro x;
+cadeia s;
+x = 10;
+s = "texto";
+se (x >= 1.5) entao
+  escreva(f(x, 0.5));
+fimse
+"""
+
+# trechos que as edições inserem: juntam e partem números, nomes e
+# palavras-chave, abrem e fecham cadeias e comentários
+TRECHOS = [
+    " ", "\n", "x", "fim", "inicio", "1", "2", ".", ".5", "e", "_",
+    '"', '"ab"', "//", "// c\n", "=", "==", "<", "(", ")", ";", "@",
+]
+
+
+class TestDocumentoLexico(unittest.TestCase):
+    def test_edicoes_aleatorias(self):
+        for backend in ("regex", "dfa"):
+            rnd = random.Random(3)
+            lexer = Lexer(backend)
+            documento = DocumentoLexico(FONTE, lexer)
+            for passo in range(400):
+                codigo = documento.codigo
+                inicio = rnd.randint(0, len(codigo))
+                removidos = rnd.choice([0, 0, 1, 2, 5])
+                removidos = min(removidos, len(codigo) - inicio)
+                inserido = "".join(rnd.choices(TRECHOS, k=rnd.randint(0, 3)))
+                novo = codigo[:inicio] + inserido + codigo[inicio + removidos :]
+
+                with self.subTest(backend=backend, passo=passo):
+                    try:
+                        esperado = lexer.tokenizar(novo)
+                    except ErroLexico:
+                        # o documento fica como estava
+                        antes = documento.tokens()
+                        with self.assertRaises(ErroLexico):
+                            documento.editar(inicio, removidos, inserido)
+                        self.assertEqual(documento.codigo, codigo)
+                        self.assertEqual(documento.tokens(), antes)
+                        continue
+                    documento.editar(inicio, removidos, inserido)
+                    self.assertEqual(documento.codigo, novo)
+                    self.assertEqual(documento.tokens(), esperado)
+
+    def test_erro_lexico_nao_muda_o_documento(self):
+        documento = DocumentoLexico(FONTE)
+        antes = documento.tokens()
+        aspas = FONTE.index('"texto"')
+        with self.assertRaises(ErroLexico):
+            documento.editar(aspas + 6, 1, "")  # tira o fecha-aspas
+        self.assertEqual(documento.codigo, FONTE)
+        self.assertEqual(documento.tokens(), antes)
+        # e as edições seguintes partem do texto anterior
+        documento.editar(0, 0, "x = 1;")
+        self.assertEqual(documento.tokens(), Lexer().tokenizar("x = 1;" + FONTE))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+
+from testes.apoio import compilar, executar
+
+# cada programa exercita um passo de otimizar(); o C de todos os níveis
+# precisa fazer o mesmo que o de -O0
+PROGRAMAS = {
+    # propagação e dobra de constantes, com ramos que viram constantes
+    "constantes": """
+inteiro a;
+inteiro b;
+real r;
+a = 2 * 3;
+b = a + 4;
+r = b / 4.0;
+se (a > 5) entao
+  b = b * a - 1;
+senao
+  b = 0;
+fimse
+escreva(a); escreva(" "); escreva(b); escreva(" "); escreva(r); escreva("\\n");
+a = b / 7;
+escreva(a - 20 / 3); escreva("\\n");
+""",
+    # expressões invariantes num 'enquanto', com uma que deixa de ser
+    # invariante porque o corpo muda a variável
+    "invariantes": """
+inteiro i;
+inteiro n;
+inteiro k;
+real x;
+i = 0;
+n = 5;
+k = 3;
+x = 0.5;
+enquanto (i < n) faca
+  x = x + (k * 2.5) / (n + 1);
+  escreva(i * (k + n)); escreva(" ");
+  se (i == 2) entao
+    k = k + 1;
+  fimse
+  i = i + 1;
+fimenquanto
+escreva(x); escreva("\\n");
+""",
+    # funções pequenas expandidas no lugar da chamada, e uma recursiva que
+    # não pode ser
+    "expansao": """
+funcao dobro(inteiro a)
+inicio
+  retorne a * 2;
+fim
+funcao media(real a, real b)
+inicio
+  retorne (a + b) / 2;
+fim
+funcao fat(inteiro n)
+inicio
+  se (n <= 1) entao
+    retorne 1;
+  fimse
+  retorne n * fat(n - 1);
+fim
+inteiro i;
+i = 0;
+enquanto (i < 4) faca
+  escreva(dobro(i + 1) + fat(i)); escreva(" ");
+  escreva(media(i, dobro(i))); escreva(" ");
+  i = i + 1;
+fimenquanto
+escreva("\\n");
+""",
+    # subexpressões comuns, com uma atribuição no meio que mata uma delas
+    "subexpressoes": """
+inteiro a;
+inteiro b;
+inteiro c;
+a = 7;
+b = 3;
+c = (a + b) * (a + b) - (a - b);
+escreva(c); escreva(" ");
+a = a + 1;
+c = (a + b) * 2 + (a - b) * (a + b);
+escreva(c); escreva(" ");
+escreva((a + b) / (a - b)); escreva("\\n");
+""",
+    # código morto depois de 'retorne' e variáveis que ninguém lê
+    "codigo_morto": """
+funcao sinal(inteiro a)
+inicio
+  inteiro lixo;
+  lixo = a * 3;
+  se (a < 0) entao
+    retorne 0 - 1;
+  fimse
+  se (a == 0) entao
+    retorne 0;
+  fimse
+  retorne 1;
+  escreva("nunca");
+fim
+procedimento mostra(inteiro a)
+inicio
+  escreva(sinal(a)); escreva(" ");
+fim
+mostra(0 - 5);
+mostra(0);
+mostra(8);
+escreva("\\n");
+""",
+    # intervalos: um contador que cabe em signed char no -O2 e valores sem
+    # limite provado, que ficam int e float (os que passam a long long ou
+    # double mudam a saída do -O0, e estão em test_intervalos)
+    "intervalos": """
+inteiro i;
+inteiro grande;
+real soma;
+i = 0;
+grande = 1;
+soma = 0.0;
+enquanto (i < 40) faca
+  grande = grande * 3 + i;
+  soma = soma + i / 3.0;
+  i = i + 1;
+fimenquanto
+escreva(i); escreva(" "); escreva(grande); escreva(" "); escreva(soma); escreva("\\n");
+""",
+}
+
+
+class TestNiveisDeOtimizacao(unittest.TestCase):
+    def test_mesma_saida_em_todo_nivel(self):
+        for nome, fonte in PROGRAMAS.items():
+            esperado = executar(compilar(fonte, 0))
+            for nivel in (0, 1, 2):
+                for ir in (False, True):
+                    with self.subTest(programa=nome, nivel=nivel, ir=ir):
+                        self.assertEqual(executar(compilar(fonte, nivel, ir)), esperado)
+
+
+if __name__ == "__main__":
+    unittest.main()
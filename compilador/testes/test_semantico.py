@@ -0,0 +1,97 @@
+import unittest
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.semantico import AnalisadorSemantico, ErroSemantico
+from testes.apoio import compilar, executar
+
+FATORIAL = """
+funcao fat(inteiro n)
+inicio
+  se (n <= 1) entao
+    retorne 1;
+  fimse
+  retorne n * fat(n - 1);
+fim
+escreva(fat(5));
+"""
+
+# recursão mútua, com o caso base de 'par' num 'enquanto'
+PAR_IMPAR = """
+funcao par(inteiro n)
+inicio
+  enquanto (n == 0) faca
+    retorne 1;
+  fimenquanto
+  retorne impar(n - 1);
+fim
+funcao impar(inteiro n)
+inicio
+  se (n == 0) entao
+    retorne 0;
+  fimse
+  retorne par(n - 1);
+fim
+escreva(par(7));
+escreva(impar(7));
+"""
+
+
+def analisar(fonte: str, processos: int = 1) -> AnalisadorSemantico:
+    lexer = Lexer()
+    arvore = Parser(lexer.tokenizar(fonte), lexer.indice).parse()
+    semantica = AnalisadorSemantico(max_erros=20, processos=processos)
+    try:
+        semantica.analisar(arvore)
+    except ErroSemantico:
+        pass
+    return semantica
+
+
+def retorno(semantica: AnalisadorSemantico, nome: str) -> str | None:
+    return semantica.tabela.buscar(nome).retorno
+
+
+class TestRetornoRecursivo(unittest.TestCase):
+    def test_fatorial(self):
+        for processos in (1, 2):
+            with self.subTest(processos=processos):
+                semantica = analisar(FATORIAL, processos)
+                self.assertEqual(semantica.erros, [])
+                self.assertEqual(retorno(semantica, "fat"), "inteiro")
+        self.assertEqual(executar(compilar(FATORIAL)), "120")
+
+    def test_recursao_mutua(self):
+        semantica = analisar(PAR_IMPAR)
+        self.assertEqual(semantica.erros, [])
+        self.assertEqual(retorno(semantica, "par"), "inteiro")
+        self.assertEqual(executar(compilar(PAR_IMPAR)), "01")
+
+    def test_promocao_pela_recursao(self):
+        fonte = FATORIAL.replace("retorne n * fat", "retorne 0.5 * fat")
+        semantica = analisar(fonte)
+        self.assertEqual(semantica.erros, [])
+        self.assertEqual(retorno(semantica, "fat"), "real")
+
+    def test_so_retornos_recursivos(self):
+        semantica = analisar(
+            "funcao f(inteiro n) inicio retorne f(n); fim escreva(f(1));"
+        )
+        self.assertIn(
+            "Tipo de retorno da função 'f' ainda não definido.",
+            [erro.mensagem for erro in semantica.erros],
+        )
+
+    def test_retornos_aninhados_inconsistentes(self):
+        semantica = analisar(
+            'funcao f(inteiro n) inicio se (n > 0) entao retorne "a"; fimse'
+            " retorne n; fim escreva(f(1));"
+        )
+        self.assertEqual(
+            semantica.erros[0].mensagem,
+            "Retornos inconsistentes na função 'f': cadeia vs inteiro.",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
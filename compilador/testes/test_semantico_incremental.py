@@ -0,0 +1,130 @@
+import random
+import unittest
+
+from src.ast_nodes import FuncDecl
+from src.lexer import Lexer
+from src.parser import Parser
+from src.semantico import AnalisadorSemantico, ErroSemantico
+from src.semantico_incremental import AnaliseIncremental
+
+# corpos que as edições sorteiam: mudam o retorno, as chamadas ou os erros
+CORPOS = [
+    "  retorne a + 1;",
+    "  retorne a * 2.5;",
+    "  retorne g0(a) + 1;",
+    "  retorne g0(a) * 0.5;",
+    "  inteiro t;\n  t = a;\n  retorne t;",
+    "  retorne z;",
+    '  retorne "texto";',
+    "  se (a > 0) entao\n    retorne a;\n  fimse\n  retorne fat(a);",
+    "  escreva(a); // so um comentario\n  retorne a;",
+]
+
+PROGRAMA = """
+funcao g0(inteiro a)
+inicio
+{g0}
+fim
+funcao g1(inteiro a)
+inicio
+{g1}
+fim
+funcao g2(inteiro a)
+inicio
+  retorne g1(a) + g0(a);
+fim
+funcao fat(inteiro n)
+inicio
+  se (n <= 1) entao
+    retorne 1;
+  fimse
+  retorne n * fat(n - 1);
+fim
+procedimento p(inteiro a)
+inicio
+{p}
+fim
+inteiro x;
+x = {x};
+escreva(g2(x));
+p(x);
+"""
+
+
+def completa(fonte: str) -> tuple[list[str], dict[str, str | None]]:
+    lexer = Lexer()
+    arvore = Parser(lexer.tokenizar(fonte), lexer.indice).parse()
+    semantica = AnalisadorSemantico(max_erros=50)
+    try:
+        semantica.analisar(arvore)
+    except ErroSemantico:
+        pass
+    retornos = {
+        s.nome: semantica.tabela.buscar(s.nome).retorno
+        for s in arvore.comandos
+        if isinstance(s, FuncDecl)
+    }
+    return [str(e) for e in semantica.erros], retornos
+
+
+def incremental(analise: AnaliseIncremental, fonte: str):
+    try:
+        analise.analisar(fonte)
+    except ErroSemantico:
+        pass
+    retornos = {
+        r.arvore.nome: r.retorno for r in analise.rotinas if isinstance(r.arvore, FuncDecl)
+    }
+    return [str(e) for e in analise.erros], retornos
+
+
+class TestAnaliseIncremental(unittest.TestCase):
+    def test_edicoes_aleatorias(self):
+        rnd = random.Random(7)
+        for semente in range(5):
+            analise = AnaliseIncremental(max_erros=50)
+            partes = {"g0": CORPOS[0], "g1": CORPOS[2], "p": "  escreva(a);", "x": "1"}
+            anteriores = []
+            for passo in range(40):
+                if anteriores and rnd.random() < 0.2:
+                    # desfazer
+                    partes = rnd.choice(anteriores)
+                else:
+                    anteriores.append(dict(partes))
+                    partes = dict(partes)
+                    alvo = rnd.choice(["g0", "g1", "g1", "p", "x"])
+                    if alvo == "x":
+                        partes["x"] = rnd.choice(["1", "2.5", "g1(3)"])
+                    elif alvo == "p":
+                        partes["p"] = rnd.choice(
+                            ["  escreva(a);", "  escreva(g1(a));", "  escreva(w);"]
+                        )
+                    else:
+                        partes[alvo] = rnd.choice(CORPOS)
+                fonte = PROGRAMA.format(**partes)
+                with self.subTest(semente=semente, passo=passo):
+                    self.assertEqual(incremental(analise, fonte), completa(fonte))
+
+    def test_edicao_no_corpo(self):
+        fonte = PROGRAMA.format(g0=CORPOS[0], g1=CORPOS[2], p="  escreva(a);", x="1")
+        analise = AnaliseIncremental()
+        analise.analisar(fonte)
+
+        # o retorno de g0 não muda: só ela é analisada de novo
+        editado = fonte.replace("retorne a + 1;", "retorne a + 2;")
+        analise.analisar(editado)
+        self.assertEqual(analise.analisadas, 1)
+
+        # o retorno muda: g1 e g2 também, e o programa principal que chama g2
+        promovido = fonte.replace("retorne a + 1;", "retorne a + 1.5;")
+        self.assertEqual(incremental(analise, promovido), completa(promovido))
+        self.assertEqual(analise.analisadas, 4)
+
+        # voltar ao texto anterior acha os resultados guardados
+        analise.analisar(fonte)
+        self.assertEqual(analise.analisadas, 0)
+        self.assertEqual(incremental(analise, fonte), completa(fonte))
+
+
+if __name__ == "__main__":
+    unittest.main()